@@ -206,14 +206,15 @@ def run_fill_one():
     return {"status": "success", "message": "JSON files filled and validated."}
 
 # Vectorisation
+# Incrémentale par défaut (seules les sources ajoutées/modifiées/supprimées), full_rebuild=true pour tout reconstruire
 @router.post("/vectorization")
-def run_vectorization():
-    result = vectorisation_chunk_dev.build_vectorstore()
+def run_vectorization(full_rebuild: bool = False):
+    result = vectorisation_chunk_dev.build_vectorstore(full_rebuild=full_rebuild)
     return result
 
 # Pipeline de traitement et vectorisation
 @router.post("/process_and_vectorize")
-def run_processing_and_vectorizing(background_tasks: BackgroundTasks):
+def run_processing_and_vectorizing(background_tasks: BackgroundTasks, full_rebuild: bool = False):
 
     def run_full_pipeline():
         try:
@@ -224,7 +225,7 @@ def run_processing_and_vectorizing(background_tasks: BackgroundTasks):
             time.sleep(0.5)
 
             cp.print_info("Démarrage de la vectorisation...")
-            vectorisation_chunk_dev.build_vectorstore()
+            vectorisation_chunk_dev.build_vectorstore(full_rebuild=full_rebuild)
             cp.print_success("Vectorisation terminée !")
         except Exception as e:
             cp.print_error(f"Erreur dans le pipeline : {e}")
@@ -0,0 +1,192 @@
+"""
+Ordonnanceur d'embeddings de la vectorisation
+Plusieurs lots embeddés en parallèle (EMBEDDING_MAX_IN_FLIGHT), budgets par minute en tokens et en
+requêtes partagés entre les lots, nouvelle tentative avec backoff sur les 429, et résultats rendus
+dans l'ordre des lots pour une insertion Chroma ordonnée.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Iterator, Callable
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Configuration (variables d'environnement) ; un budget à 0 est illimité
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))  # lots embeddés en parallèle
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "1000000"))  # tokens par minute (quota du compte OpenAI)
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "3000"))  # requêtes par minute
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))  # nouvelles tentatives après un 429
+EMBEDDING_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_SECONDS", "1.0"))  # premier délai, doublé à chaque 429
+EMBEDDING_BACKOFF_MAX_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_MAX_SECONDS", "60"))
+EMBEDDING_TOKENIZER = "cl100k_base"  # encodage des modèles text-embedding-*
+
+def _load_encoding():
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding(EMBEDDING_TOKENIZER)
+    except Exception as e:
+        logging.warning("Encodage tiktoken indisponible (%s) : estimation à 3 caractères par token", e)
+        return None
+
+_encoding = _load_encoding()
+
+def count_tokens(text: str) -> int:
+    """Tokens facturés pour le texte (estimation prudente si tiktoken est absent)"""
+    if _encoding is None:
+        return len(text) // 3 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+# ================================
+# BUDGETS ET 429
+# ================================
+
+class _MinuteBudget:
+    """Seau à jetons rempli en continu, de capacité égale au budget par minute (thread-safe)"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float) -> float:
+        """Prélève `amount` en attendant le remplissage si besoin ; retourne le temps d'attente"""
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)  # un lot plus gros que le budget passe seul, seau plein
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self.capacity / 60)
+                self._updated = now
+                if self._available >= amount:
+                    self._available -= amount
+                    return waited
+                wait = (amount - self._available) * 60 / self.capacity
+            time.sleep(wait)
+            waited += wait
+
+def _is_rate_limited(exc: Exception) -> bool:
+    """429 d'OpenAI (openai.RateLimitError porte status_code) ou erreur équivalente d'un client intermédiaire"""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    return "429" in str(exc) or "rate limit" in str(exc).lower()
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Délai demandé par l'en-tête Retry-After de la réponse 429, s'il est présent"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Enveloppe des appels d'embeddings de documents : budgets TPM/RPM partagés par tous les threads
+    et nouvelles tentatives avec backoff exponentiel (ou Retry-After) sur les 429.
+    Les requêtes de recherche passent directement (vectorstore installé dans le backend).
+    """
+
+    def __init__(self, underlying: Embeddings, tokens_per_minute: int = EMBEDDING_TPM,
+                 requests_per_minute: int = EMBEDDING_RPM, max_retries: int = EMBEDDING_MAX_RETRIES):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self.max_retries = max_retries
+        self._tokens = _MinuteBudget(tokens_per_minute)
+        self._requests = _MinuteBudget(requests_per_minute)
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "tokens": 0, "rate_limited": 0, "throttled_seconds": 0.0, "backoff_seconds": 0.0}
+
+    def _count(self, **values):
+        with self._stats_lock:
+            for name, value in values.items():
+                self._stats[name] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 2)
+        stats["backoff_seconds"] = round(stats["backoff_seconds"], 2)
+        return stats
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(count_tokens(text) for text in texts)
+        throttled = self._requests.acquire(1) + self._tokens.acquire(tokens)
+        self._count(requests=1, tokens=tokens, throttled_seconds=throttled)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.underlying.embed_documents(texts)
+            except Exception as exc:
+                if not _is_rate_limited(exc) or attempt == self.max_retries:
+                    raise
+                delay = _retry_after(exc) or EMBEDDING_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+                delay = min(delay, EMBEDDING_BACKOFF_MAX_SECONDS)
+                self._count(rate_limited=1, backoff_seconds=delay)
+                logging.warning("⏳ 429 sur un lot de %s textes, nouvelle tentative dans %.1fs (%s/%s)",
+                                len(texts), delay, attempt + 1, self.max_retries)
+                time.sleep(delay)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+# ================================
+# ORDONNANCEMENT
+# ================================
+
+class EmbeddingScheduler:
+    """
+    Embedde des lots de textes avec `max_in_flight` lots en parallèle et les rend dans l'ordre.
+    L'avance est bornée (2 × max_in_flight lots embeddés non encore consommés) : la mémoire reste
+    constante quand l'insertion est plus lente que l'embedding.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT,
+                 on_embedded: Optional[Callable[[int, int], None]] = None):
+        self.embeddings = embeddings
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_embedded = on_embedded  # appelé avec (lots embeddés, total) à chaque lot terminé
+        self._embedded = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: List[str], total: int) -> List[List[float]]:
+        vectors = self.embeddings.embed_documents(texts)
+        with self._lock:
+            self._embedded += 1
+            embedded = self._embedded
+        if self.on_embedded:
+            self.on_embedded(embedded, total)
+        return vectors
+
+    def map(self, batches: List[List[str]]) -> Iterator[List[List[float]]]:
+        """Vecteurs de chaque lot, dans l'ordre des lots ; une erreur d'un lot est relevée à son tour"""
+        total = len(batches)
+        pending = deque()
+        next_index = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embedding") as executor:
+            try:
+                while next_index < total or pending:
+                    while next_index < total and len(pending) < 2 * self.max_in_flight:
+                        pending.append(executor.submit(self._embed, batches[next_index], total))
+                        next_index += 1
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,254 @@
+"""
+Cache disque des embeddings de la vectorisation (SQLite, adressé par contenu)
+Clé : modèle d'embeddings + hash du texte normalisé du chunk. Une reconstruction complète ne
+paie l'API que pour le texte nouveau ; la taille est suivie et l'éviction se fait en ligne de commande
+(ou automatiquement après chaque vectorisation avec EMBEDDING_STORE_MAX_MB).
+
+Usage (depuis la racine du dépôt) :
+    python -m Document_handler.new_filler.Vectorisation.embedding_store stats
+    python -m Document_handler.new_filler.Vectorisation.embedding_store evict --max-mb 200
+    python -m Document_handler.new_filler.Vectorisation.embedding_store evict --older-than-days 90
+    python -m Document_handler.new_filler.Vectorisation.embedding_store evict --model text-embedding-ada-002
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from color_utils import cp
+from Fastapi.backend.app.embedding_cache import normalize_text
+
+# Configuration (variables d'environnement)
+# Hors du dossier du vectorstore : le cache survit aux reconstructions complètes et aux backups
+EMBEDDING_STORE_PATH = Path(os.getenv("EMBEDDING_STORE_PATH", str(Path(__file__).parent / "embedding_cache.sqlite3")))
+EMBEDDING_STORE_MAX_MB = float(os.getenv("EMBEDDING_STORE_MAX_MB", "0"))  # 0 = pas de limite
+SQLITE_MAX_VARIABLES = 500  # taille des clauses IN (limite de variables SQLite)
+
+def text_hash(text: str) -> str:
+    """Hash du texte normalisé (même normalisation que le cache d'embeddings du backend)"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def _batched(items: List[str], size: int = SQLITE_MAX_VARIABLES) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# ================================
+# STOCKAGE
+# ================================
+
+class EmbeddingStore:
+    """Table SQLite (modèle, hash du texte) → vecteur float32, avec date de dernier usage pour l'éviction LRU"""
+
+    def __init__(self, path: Path = EMBEDDING_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "created_at REAL NOT NULL, last_used_at REAL NOT NULL, PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used_at)")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Vecteurs connus parmi les hashes demandés ; leur date de dernier usage est rafraîchie"""
+        found: Dict[str, np.ndarray] = {}
+        now = time.time()
+        with self._lock, self._connection:
+            for batch in _batched(sorted(set(hashes))):
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model, *batch)
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used_at = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key, _ in rows]
+                )
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (model, key, int(vector.shape[0]), vector.astype(np.float32).tobytes(), now, now)
+                    for key, vector in vectors.items()
+                ]
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Nombre d'entrées et octets de vecteurs par modèle, taille des fichiers SQLite"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT model, COUNT(*), SUM(LENGTH(vector)), MIN(last_used_at), MAX(last_used_at) "
+                "FROM embeddings GROUP BY model ORDER BY model"
+            ).fetchall()
+        models = {
+            model: {"entries": entries, "vector_bytes": vector_bytes or 0, "oldest_use": oldest, "latest_use": latest}
+            for model, entries, vector_bytes, oldest, latest in rows
+        }
+        file_bytes = sum(
+            path.stat().st_size
+            for path in (self.path, Path(f"{self.path}-wal"), Path(f"{self.path}-shm"))
+            if path.exists()
+        )
+        return {
+            "path": str(self.path),
+            "entries": sum(info["entries"] for info in models.values()),
+            "vector_bytes": sum(info["vector_bytes"] for info in models.values()),
+            "file_bytes": file_bytes,
+            "models": models,
+        }
+
+    def evict(self, max_bytes: Optional[int] = None, older_than_days: Optional[float] = None,
+              model: Optional[str] = None) -> int:
+        """
+        Supprime des entrées et retourne leur nombre :
+        - `older_than_days` : entrées non utilisées depuis ce délai ;
+        - `max_bytes` : les moins récemment utilisées jusqu'à repasser sous ce volume de vecteurs ;
+        - `model` seul : toutes les entrées du modèle (sinon, restreint les deux critères à ce modèle).
+        """
+        scope, params = ("WHERE model = ?", [model]) if model else ("", [])
+        removed = 0
+        with self._lock, self._connection:
+            if older_than_days is not None:
+                condition = f"{scope} {'AND' if scope else 'WHERE'} last_used_at < ?"
+                removed += self._connection.execute(
+                    f"DELETE FROM embeddings {condition}", (*params, time.time() - older_than_days * 86400)
+                ).rowcount
+            if max_bytes is not None:
+                total = self._connection.execute(f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings {scope}", params).fetchone()[0]
+                victims = []
+                for victim_model, key, size in self._connection.execute(
+                    f"SELECT model, text_hash, LENGTH(vector) FROM embeddings {scope} ORDER BY last_used_at", params
+                ):
+                    if total <= max_bytes:
+                        break
+                    victims.append((victim_model, key))
+                    total -= size
+                self._connection.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+                removed += len(victims)
+            if model and older_than_days is None and max_bytes is None:
+                removed += self._connection.execute("DELETE FROM embeddings WHERE model = ?", (model,)).rowcount
+        if removed:
+            with self._lock:
+                self._connection.execute("VACUUM")  # rend la place au disque
+        return removed
+
+# ================================
+# EMBEDDINGS
+# ================================
+
+class PersistentEmbeddings(Embeddings):
+    """
+    Enveloppe d'embeddings pour la vectorisation : les documents passent d'abord par le cache disque,
+    seuls les textes inconnus (dédupliqués) sont envoyés au modèle sous-jacent. Les requêtes ne sont pas
+    mises en cache disque (le vectorstore installé dans le backend les délègue au modèle sous-jacent).
+    """
+
+    def __init__(self, underlying: Embeddings, store: EmbeddingStore):
+        self.underlying = underlying
+        self.store = store
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self._stats_lock = threading.Lock()  # lots embeddés en parallèle (EmbeddingScheduler)
+        self._stats = {"hits": 0, "misses": 0, "embedded_texts": 0, "embedded_chars": 0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.store.get_many(self.model, hashes)
+
+        # Textes inconnus, une seule fois chacun (chunks identiques entre sources)
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            embedded = self.underlying.embed_documents(list(missing.values()))
+            new_vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, embedded)}
+            self.store.put_many(self.model, new_vectors)
+            vectors.update(new_vectors)
+
+        hits = sum(1 for key in hashes if key not in missing)
+        with self._stats_lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(texts) - hits
+            self._stats["embedded_texts"] += len(missing)
+            self._stats["embedded_chars"] += sum(len(text) for text in missing.values())
+        return [vectors[key].tolist() for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
+
+    def report(self) -> Dict[str, Any]:
+        """Bilan de la vectorisation : taux de succès du cache disque et texte réellement envoyé à l'API"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "model": self.model,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+# ================================
+# LIGNE DE COMMANDE
+# ================================
+
+def _print_stats(store: EmbeddingStore):
+    stats = store.stats()
+    cp.print_info(f"[EmbeddingStore] {stats['path']}")
+    cp.print_info(
+        f"[EmbeddingStore] {stats['entries']} entrées, {stats['vector_bytes'] / 1e6:.1f} Mo de vecteurs, "
+        f"{stats['file_bytes'] / 1e6:.1f} Mo sur disque"
+    )
+    for model, info in stats["models"].items():
+        cp.print_info(f"  - {model} : {info['entries']} entrées, {info['vector_bytes'] / 1e6:.1f} Mo")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache disque des embeddings de la vectorisation")
+    parser.add_argument("--path", type=Path, default=EMBEDDING_STORE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Taille du cache par modèle")
+    evict_parser = commands.add_parser("evict", help="Supprime des entrées (LRU, ancienneté ou modèle)")
+    evict_parser.add_argument("--max-mb", type=float, help="Volume de vecteurs à ne pas dépasser (éviction LRU)")
+    evict_parser.add_argument("--older-than-days", type=float, help="Entrées non utilisées depuis N jours")
+    evict_parser.add_argument("--model", help="Restreint l'éviction à ce modèle (seul : supprime tout le modèle)")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.path)
+    try:
+        if args.command == "evict":
+            if args.max_mb is None and args.older_than_days is None and args.model is None:
+                parser.error("evict : préciser --max-mb, --older-than-days ou --model")
+            max_bytes = int(args.max_mb * 1e6) if args.max_mb is not None else None
+            removed = store.evict(max_bytes=max_bytes, older_than_days=args.older_than_days, model=args.model)
+            cp.print_success(f"[EmbeddingStore] {removed} entrées supprimées")
+        _print_stats(store)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,37 @@
 import os
+import re
 import json
 import uuid
+import shutil
+import hashlib
 import logging
+import argparse
+import tempfile
 import threading
+import time
 from pathlib import Path
 from datetime import datetime
-import shutil
 
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
+import chromadb
+from chromadb.config import Settings
 
 from ..logic.chunck_syll import chunk_syllabus_for_rag
-from ..config import OPENAI_API_KEY, VALID_DIR, PROGRESS_DIR
+from ..config import VALID_DIR, PROGRESS_DIR, INPUT_MAPS
+from ..preprocessing.build_map import compute_file_hash
+from ..preprocessing.update_map import load_map, save_map
 
 from color_utils import cp
 from Fastapi.backend.app import llmm
+from Fastapi.backend.app.lexical_index import build_lexical_index, LEXICAL_INDEX_FILENAME
+from .embedding_store import EmbeddingStore, PersistentEmbeddings, EMBEDDING_STORE_PATH, EMBEDDING_STORE_MAX_MB
+from .embedding_scheduler import EmbeddingScheduler, RateLimitedEmbeddings
 
 progress_lock = threading.Lock()
+build_lock = threading.Lock()  # une seule vectorisation à la fois (la mise à jour incrémentale modifie le store actif)
 
 def save_progress(current: int, total: int, status: str):
     """Sauvegarde l'état d'avancement du scraping dans un fichier JSON"""
@@ -57,6 +69,13 @@ CHUNK_SIZE = 1500
 CHUNK_OVERLAP = 150
 BATCH_SIZE = 100  # nombre de Documents par lot lors de l'insertion Chroma
 
+# Manifeste du vectorstore : JSON validé → hash de son contenu, chemin et ids de ses chunks (base de la mise à jour incrémentale)
+MANIFEST_FILENAME = "vectorisation_manifest.json"
+MANIFEST_VERSION = 2  # 2 : hash du JSON validé (la version 1 gardait le hash INPUT_MAPS de la source amont)
+
+# Semestre extrait de metadata.niveau ("Semestre 5") et indexé en entier (metadata.semestre)
+SEMESTER_PATTERN = re.compile(r"semestre\s*(\d+)", re.IGNORECASE)
+
 # ---------------------------------------------------------------------------
 # Nb de vectorestore conserver
 # ---------------------------------------------------------------------------
@@ -111,28 +130,105 @@ def _backup_existing_vectorstore():
 # Chargement / conversion des documents -------------------------------------
 # ---------------------------------------------------------------------------
 
-def _load_json_docs():
-    docs = []
+def _source_files() -> dict[str, tuple[Path, str]]:
+    """Fichiers validés à vectoriser : nom relatif à NORMALIZED_DIR → (chemin, "json" ou "syllabus")."""
+    files = {}
     for json_file in NORMALIZED_DIR.glob("*.json"):
-        if "syllabus" in json_file.name:
+        if "syllabus" not in json_file.name:
+            files[json_file.name] = (json_file, "json")
+    for json_file in NORMALIZED_DIR.glob("**/syllabus*.json*"):
+        files[json_file.relative_to(NORMALIZED_DIR).as_posix()] = (json_file, "syllabus")
+    return files
+
+
+def _tracked_sources() -> dict[str, dict]:
+    """
+    Sources suivies par INPUT_MAPS ({"hash", "path"}), indexées par le nom du JSON validé
+    qu'elles produisent (même règle de nommage que save_node : .pdf → .json).
+    """
+    tracked = {}
+    for map_file in INPUT_MAPS.glob("*.json"):
+        for fname, info in load_map(map_file).items():
+            tracked[Path(fname).with_suffix(".json").name] = info
+    return tracked
+
+
+def _current_sources(manifest: dict) -> dict[str, dict]:
+    """
+    Empreinte des fichiers validés présents : hash du JSON validé, c'est-à-dire du contenu réellement
+    découpé (les maps sont rafraîchies au scraping, avant le traitement : leur hash peut précéder le
+    nouveau JSON, et une correction manuelle du JSON ne le change pas). La source amont d'après
+    INPUT_MAPS est gardée à titre d'information ("upstream").
+    Un JSON validé dont la source a quitté INPUT_MAPS (suivie au manifeste, ou déjà retirée)
+    n'est plus vectorisé, même s'il traîne encore dans VALID_DIR.
+    """
+    tracked = _tracked_sources()
+    previous = manifest.get("sources", {})
+    retired = set(manifest.get("retired", []))
+    sources = {}
+    for name, (path, kind) in _source_files().items():
+        info = tracked.get(Path(name).name)
+        if info is None and (previous.get(name, {}).get("tracked") or name in retired):
             continue
-        try:
-            with open(json_file, "r", encoding="utf-8") as f:
-                docs.append(json.load(f))
-        except json.JSONDecodeError as exc:
-            logging.warning("⚠️  JSONDecodeError %s: %s", json_file.name, exc)
-    return docs
+        sources[name] = {
+            "kind": kind,
+            "hash": compute_file_hash(path),
+            "path": str(path),
+            "tracked": info is not None,
+            "upstream": {"hash": info["hash"], "path": info["path"]} if info else None,
+        }
+    return sources
+
+
+def _load_source_chunks(name: str, kind: str) -> list[Document]:
+    json_file = NORMALIZED_DIR / name
+    try:
+        with open(json_file, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except json.JSONDecodeError as exc:
+        logging.warning("⚠️  JSONDecodeError %s: %s", json_file.name, exc)
+        return []
+    if kind == "syllabus":
+        return _syllabus_to_lc_docs([raw])
+    return _chunk_raw_docs([raw])
 
 
-def _load_syllabus_json_docs():
-    syllabus_docs = []
-    for json_file in NORMALIZED_DIR.glob("**/syllabus*.json*"):
-        try:
-            with open(json_file, "r", encoding="utf-8") as f:
-                syllabus_docs.append(json.load(f))
-        except json.JSONDecodeError as exc:
-            logging.warning("⚠️  JSONDecodeError %s: %s", json_file.name, exc)
-    return syllabus_docs
+def _chunk_id(source_name: str, source_hash: str, chunk_index: int) -> str:
+    """Identifiant Chroma déterministe : même source, même hash, même position → même id."""
+    digest = hashlib.sha1(f"{source_name}\0{source_hash}".encode("utf-8")).hexdigest()[:20]
+    return f"{digest}-{chunk_index}"
+
+
+def _chunk_sources(sources: dict) -> tuple[list[Document], list[str]]:
+    """Chunks et ids des sources données ; les ids sont reportés dans chaque entrée du manifeste."""
+    lc_docs: list[Document] = []
+    ids: list[str] = []
+    for name, info in sources.items():
+        chunks = _load_source_chunks(name, info["kind"])
+        info["ids"] = [_chunk_id(name, info["hash"], index) for index in range(len(chunks))]
+        lc_docs.extend(chunks)
+        ids.extend(info["ids"])
+    return lc_docs, ids
+
+
+def _metadata_value(value):
+    """Chroma accepte str, int, float et bool : ces types sont conservés pour les filtres `where`."""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, list):
+        return ", ".join(map(str, value))
+    return str(value)
+
+
+def _add_filter_fields(flat: dict) -> dict:
+    """Normalise les champs utilisés par les filtres de recherche (spécialité, code, semestre)."""
+    for key in ("metadata.specialite", "metadata.code"):
+        if isinstance(flat.get(key), str):
+            flat[key] = flat[key].strip().upper()
+    semester_match = SEMESTER_PATTERN.search(str(flat.get("metadata.niveau", "")))
+    if semester_match:
+        flat["metadata.semestre"] = int(semester_match.group(1))
+    return flat
 
 
 def _flatten_metadata(md: dict) -> dict:
@@ -140,12 +236,11 @@ def _flatten_metadata(md: dict) -> dict:
     for key, value in md.items():
         if isinstance(value, dict):
             for sub_key, sub_val in value.items():
-                flat[f"{key}.{sub_key}"] = str(sub_val)
-        elif isinstance(value, list):
-            flat[key] = ", ".join(map(str, value))
-        else:
-            flat[key] = str(value)
-    return flat
+                if sub_val is not None:
+                    flat[f"{key}.{sub_key}"] = _metadata_value(sub_val)
+        elif value is not None:
+            flat[key] = _metadata_value(value)
+    return _add_filter_fields(flat)
 
 
 def _ensure_polytech_structure(doc: dict) -> dict:
@@ -173,8 +268,8 @@ def _ensure_polytech_structure(doc: dict) -> dict:
     }
 
 
-def _chunk_raw_docs(raw_docs: list[dict]) -> list[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+def _chunk_raw_docs(raw_docs: list[dict], chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> list[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     lc_docs: list[Document] = []
     for doc in raw_docs:
         content = doc.get("content", "").strip()
@@ -182,8 +277,9 @@ def _chunk_raw_docs(raw_docs: list[dict]) -> list[Document]:
             continue
         normalized = _ensure_polytech_structure(doc)
         flat_md = _flatten_metadata({k: v for k, v in normalized.items() if k != "content"})
-        for chunk in splitter.split_text(content):
-            lc_docs.append(Document(page_content=chunk, metadata=flat_md))
+        # chunk_index : position du chunk dans sa source (fusion des chunks adjacents au moment de la génération)
+        for chunk_index, chunk in enumerate(splitter.split_text(content)):
+            lc_docs.append(Document(page_content=chunk, metadata={**flat_md, "chunk_index": chunk_index}))
     return lc_docs
 
 
@@ -203,93 +299,315 @@ def _syllabus_to_lc_docs(syllabus_raw: list[dict]) -> list[Document]:
 # Pipeline principal ---------------------------------------------------------
 # ---------------------------------------------------------------------------
 
-def build_vectorstore() -> dict:
-    """Construit le vectorstore Chroma à partir des JSON + syllabus."""
-
-    save_progress(0, 1, "2/2 - Initialisation vectorisation")
+def _chunking_signature() -> dict:
+    """Paramètres de découpage : s'ils changent, les ids du manifeste ne décrivent plus les chunks."""
+    return {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
+
+
+def _save_manifest(directory: Path, sources: dict, report: dict):
+    """Écrit le manifeste ; les JSON validés présents mais écartés (source retirée) y sont notés comme tels."""
+    save_map(directory / MANIFEST_FILENAME, {
+        "version": MANIFEST_VERSION,
+        "chunking": _chunking_signature(),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+        "last_build": report,
+        "sources": sources,
+        "retired": sorted(name for name in _source_files() if name not in sources),
+    })
+
+
+_embedding_store = None
+
+def _vectorisation_embeddings() -> PersistentEmbeddings:
+    """
+    Embeddings de la vectorisation : cache disque (modèle + hash du texte) devant l'instance partagée
+    du backend (LRU, Redis, API). Seul le texte jamais embeddé part à l'API, même en reconstruction complète,
+    sous les budgets TPM/RPM de RateLimitedEmbeddings.
+    """
+    global _embedding_store
+    if _embedding_store is None:
+        _embedding_store = EmbeddingStore(EMBEDDING_STORE_PATH)
+    return PersistentEmbeddings(RateLimitedEmbeddings(llmm.embeddings), _embedding_store)
+
+
+def _embedding_report(embeddings: PersistentEmbeddings) -> dict:
+    """Bilan du cache disque pour ce build (journalisé, renvoyé et gardé dans le manifeste)."""
+    report = embeddings.report()
+    report["api"] = embeddings.underlying.get_stats()  # requêtes, tokens, 429 et attentes des budgets
+    if EMBEDDING_STORE_MAX_MB > 0:
+        report["evicted"] = embeddings.store.evict(max_bytes=int(EMBEDDING_STORE_MAX_MB * 1e6))
+    stats = embeddings.store.stats()
+    report["store_entries"] = stats["entries"]
+    report["store_mb"] = round(stats["file_bytes"] / 1e6, 2)
+    logging.info(
+        "🧠 Cache d'embeddings : %s/%s chunks déjà connus (%.0f %%), %s textes (%s caractères) envoyés au modèle",
+        report["hits"], report["hits"] + report["misses"], report["hit_rate"] * 100,
+        report["embedded_texts"], report["embedded_chars"],
+    )
+    return report
+
+
+def _add_in_batches(db: Chroma, embeddings: PersistentEmbeddings, lc_docs: list[Document], ids: list[str]):
+    """
+    Upsert batché (les ids existants sont remplacés) avec suivi de progression.
+    Les lots sont embeddés en parallèle par l'EmbeddingScheduler (budgets TPM/RPM, backoff sur 429)
+    et insérés dans Chroma dans l'ordre, pendant que les lots suivants sont embeddés.
+    """
+    batches = list(zip(_split_list(lc_docs, BATCH_SIZE), _split_list(ids, BATCH_SIZE)))
+    total_batches = len(batches)
+
+    def on_embedded(embedded: int, total: int):
+        save_progress(200 + int(embedded / total * 50), 400, f"2/2 - Embedding batch {embedded}/{total}")
+
+    scheduler = EmbeddingScheduler(embeddings, on_embedded=on_embedded)
+    texts = [[doc.page_content for doc in batch] for batch, _ in batches]
+    for i, vectors in enumerate(scheduler.map(texts), start=1):
+        batch, batch_ids = batches[i - 1]
+        logging.info("➕ Ajout batch %s/%s (%s docs)…", i, total_batches, len(batch))
+        # Vecteurs déjà calculés : upsert direct dans la collection (ce que fait Chroma.add_documents après embedding)
+        db._collection.upsert(
+            ids=batch_ids,
+            embeddings=vectors,
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch],
+        )
 
+        progress_ratio = i / total_batches
+        current_progress = 2.5 + progress_ratio / 2
+        save_progress(int(current_progress * 100), 400, f"2/2 - Vectorisation batch {i}/{total_batches}")
+
+
+def _live_client():
+    """
+    Client Chroma du store actif. Dans le process du backend, llmm.persistent_client est déjà ouvert
+    sur ce chemin avec Settings(allow_reset=True) : chromadb refuse un second client du même chemin
+    avec d'autres réglages, on réutilise donc celui-là (ou les mêmes réglages si llmm pointe ailleurs).
+    Après une reconstruction complète, llmm.open_vectorstore l'a rouvert sur le nouveau dossier.
+    """
+    if Path(llmm.persist_directory).resolve() == VECTORSTORE_DIR.resolve():
+        return llmm.persistent_client
+    return chromadb.PersistentClient(path=str(VECTORSTORE_DIR), settings=Settings(allow_reset=True))
+
+
+def _rebuild_lexical_index(db: Chroma, directory: Path):
+    """
+    Reconstruit l'index FTS5 depuis les chunks stockés dans Chroma (aucun appel d'embedding),
+    dans un dossier temporaire puis remplacement atomique : le backend ne lit jamais un index partiel.
+    """
+    stored = db.get(include=["documents", "metadatas"])
+    lc_docs = [
+        Document(page_content=content, metadata=metadata or {}, id=chunk_id)
+        for chunk_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+    ]
+    tmp_dir = Path(tempfile.mkdtemp(dir=directory, prefix=".lexical_"))
     try:
+        build_lexical_index(lc_docs, tmp_dir)
+        tmp_index = tmp_dir / LEXICAL_INDEX_FILENAME
+        if tmp_index.exists():
+            os.replace(tmp_index, directory / LEXICAL_INDEX_FILENAME)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _rebuild_vectorstore(manifest: dict) -> dict:
+    """Reconstruction complète : nouveau store dans un dossier de build, puis bascule et backup de l'ancien."""
+
+    # on donne un nom unique au dossier de construction
+    _BUILD_DIR = VECTORSTORE_DIR.parent / f"vectorstore_Syllabus_Construct_{uuid.uuid4().hex}"
+    logging.info("🔨 Construction du vectorstore dans %s", _BUILD_DIR)
+    _ensure_dir(_BUILD_DIR)
+    _check_write_permissions(_BUILD_DIR)
+
+    # 1) Chargement & conversion -------------------------------------------------
+    logging.info("📄 Chargement des documents JSON normalisés…")
+    save_progress(0, 4, "2/2 - Chargement des documents")
+
+    sources = _current_sources(manifest)
+
+    save_progress(1, 4, "2/2 - Conversion en chunks")
+    lc_docs, ids = _chunk_sources(sources)
+    logging.info("✅ %s chunks prêts à être vectorisés.", len(lc_docs))
+
+    if not lc_docs:
+        return {"status": "error", "message": "Aucun document à vectoriser."}
+
+    _check_write_permissions(_BUILD_DIR)
+    _BUILD_DIR.chmod(0o777)
+    for file in _BUILD_DIR.glob("*"):
+        file.chmod(0o777)
+
+    # 2) EmbeddingFunction unique (une seule instance) ---------------------------
+    # Cache disque devant l'instance partagée avec le backend : les chunks dont le texte
+    # n'a pas changé ne sont pas ré-embeddés, et le vectorstore installé via
+    # llmm.set_vectorstore délègue les requêtes au cache des requêtes du backend.
+    embeddings = _vectorisation_embeddings()
+
+    # 3) Insertion batchée --------------------------------------------------------
+    # ids déterministes (hash de la source + position) : une mise à jour incrémentale
+    # ultérieure sait quels chunks remplacer ou supprimer
+    save_progress(2, 4, "2/2 - Création base vectorielle")
+    logging.info("💾 Création de la base Chroma (%s docs)…", len(lc_docs))
+    db = Chroma(
+        collection_name=llmm.LANGCHAIN_DEFAULT_COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory=str(_BUILD_DIR),
+    )
+    _add_in_batches(db, embeddings, lc_docs, ids)
+
+    # Index lexical (FTS5) des mêmes chunks, déplacé avec le vectorstore
+    logging.info("🔤 Construction de l'index lexical…")
+    for doc, chunk_id in zip(lc_docs, ids):
+        doc.id = chunk_id
+    build_lexical_index(lc_docs, _BUILD_DIR)
+    report = _embedding_report(embeddings)
+    _save_manifest(_BUILD_DIR, sources, report)
+
+    # 4) Persist & permissions ----------------------------------------------------
+    # db.persist()
+    llmm.set_vectorstore(db)  # prévient les caches/index dépendant du vectorstore
+    save_progress(100, 100, "2/2 - Sauvegarde vectorstore")
+
+    # Donne les droits d’écriture sur le nouveau vectorstore
+    _check_write_permissions(_BUILD_DIR)
+    _BUILD_DIR.chmod(0o777)
+    for file in _BUILD_DIR.glob("*"):
+        file.chmod(0o777)
+
+    _backup_existing_vectorstore()
+
+    # Renomme _BUILD_DIR (nouveau) en VECTORSTORE_DIR (chemin officiel)
+    _BUILD_DIR.rename(VECTORSTORE_DIR)
+    logging.info("✅ Vectorstore construit et sauvegardé ⟶ %s", VECTORSTORE_DIR)
+
+    # Le client du build décrit un dossier renommé (écritures refusées par chromadb) et celui de
+    # llmm le dossier parti en backup : le store actif est rouvert sur VECTORSTORE_DIR
+    llmm.open_vectorstore(VECTORSTORE_DIR)
+
+    # Redonne les permissions sur le nouveau dossier (renommé)
+    _check_write_permissions(VECTORSTORE_DIR)
+    VECTORSTORE_DIR.chmod(0o777)
+    for file in VECTORSTORE_DIR.glob("*"):
+        file.chmod(0o777)
+
+    cp.print_success("Répertoire de persistance rechargé avec succès.")
+    cp.print_debug(f"Persist directory: {VECTORSTORE_DIR}")
+
+    save_progress(100, 100, "2/2 - Vectorisation terminée")
 
-        # on donne un nom unique au dossier de construction
-        _BUILD_DIR = VECTORSTORE_DIR.parent / f"vectorstore_Syllabus_Construct_{uuid.uuid4().hex}"
-        logging.info("🔨 Construction du vectorstore dans %s", _BUILD_DIR)
-        _ensure_dir(_BUILD_DIR)
-        _check_write_permissions(_BUILD_DIR)
-
-        # 1) Chargement & conversion -------------------------------------------------
-        logging.info("📄 Chargement des documents JSON normalisés…")
-        save_progress(0, 4, "2/2 - Chargement des documents")
-
-        raw_docs = _load_json_docs()
-        syllabus_raw = _load_syllabus_json_docs()
-
-        save_progress(1, 4, "2/2 - Conversion en chunks")
-        lc_docs = _chunk_raw_docs(raw_docs) + _syllabus_to_lc_docs(syllabus_raw)
-        logging.info("✅ %s chunks prêts à être vectorisés.", len(lc_docs))
-
-        if not lc_docs:
-            return {"status": "error", "message": "Aucun document à vectoriser."}
-        
-        _check_write_permissions(_BUILD_DIR)
-        _BUILD_DIR.chmod(0o777)
-        for file in _BUILD_DIR.glob("*"):
-            file.chmod(0o777)
-
-        # 2) EmbeddingFunction unique (une seule instance) ---------------------------
-        embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
-
-        # 3) Insertion batchée --------------------------------------------------------
-        batches = list(_split_list(lc_docs, BATCH_SIZE))
-        first_batch, *rest = batches
-
-        save_progress(2, 4, "2/2 - Création base vectorielle")
-        logging.info("💾 Création de la base Chroma (%s docs)…", len(first_batch))
-        db = Chroma.from_documents(
-            documents=first_batch,
-            embedding=embeddings,
-            persist_directory=str(_BUILD_DIR),
-        )
-
-        total_batches = len(batches)
-        for i, batch in enumerate(rest, start=2):
-            logging.info("➕ Ajout batch %s/%s (%s docs)…", i, total_batches, len(batch))
-            # ids uniques impératifs si on fournit ids → ici on laisse Chroma gérer UUID
-            db.add_documents(batch)
+    return {
+        "status": "success",
+        "message": "Vectorstore sauvegardé avec succès.",
+        "mode": "full",
+        "chunks": len(lc_docs),
+        "embedding_cache": report,
+    }
 
-            progress_ratio = (i - 1) / (total_batches - 1) if total_batches > 1 else 1
-            current_progress = 3 + progress_ratio
-            save_progress(int(current_progress * 100), 400, f"2/2 - Vectorisation batch {i}/{total_batches}")
 
-        # 4) Persist & permissions ----------------------------------------------------
-        # db.persist()
-        llmm.db = db
-        save_progress(100, 100, "2/2 - Sauvegarde vectorstore")
+def _update_vectorstore(manifest: dict) -> dict:
+    """
+    Mise à jour incrémentale du store actif : seules les sources ajoutées ou modifiées
+    (hash du JSON validé différent du manifeste) sont re-découpées et ré-embeddées ;
+    les chunks des sources modifiées ou retirées sont supprimés.
+    """
+    save_progress(0, 4, "2/2 - Détection des changements")
+    previous = manifest["sources"]
+    sources = _current_sources(manifest)
+
+    added = [name for name in sources if name not in previous]
+    changed = [name for name in sources if name in previous and sources[name]["hash"] != previous[name]["hash"]]
+    removed = [name for name in previous if name not in sources]
+    logging.info("🔍 Sources : %s ajoutée(s), %s modifiée(s), %s supprimée(s)", len(added), len(changed), len(removed))
+
+    if not (added or changed or removed):
+        clear_progress("2/2 - Vectorstore déjà à jour")
+        return {"status": "success", "message": "Vectorstore déjà à jour.", "mode": "incremental", "added": 0, "changed": 0, "removed": 0}
+
+    # Les sources inchangées gardent leurs ids, les autres sont re-découpées
+    for name in sources:
+        if name not in added and name not in changed:
+            sources[name]["ids"] = previous[name]["ids"]
+
+    save_progress(1, 4, "2/2 - Conversion en chunks")
+    lc_docs, ids = _chunk_sources({name: sources[name] for name in added + changed})
+    logging.info("✅ %s chunks à (ré)vectoriser.", len(lc_docs))
+
+    _check_write_permissions(VECTORSTORE_DIR)
+    embeddings = _vectorisation_embeddings()
+    db = Chroma(
+        client=_live_client(),
+        collection_name=llmm.LANGCHAIN_DEFAULT_COLLECTION_NAME,
+        embedding_function=embeddings,
+    )
+
+    # Ajout avant suppression : une source modifiée n'est jamais absente du store.
+    # Un chunk dont l'id ne change pas (source déplacée, même hash) est simplement remplacé.
+    save_progress(2, 4, "2/2 - Mise à jour base vectorielle")
+    if lc_docs:
+        _add_in_batches(db, embeddings, lc_docs, ids)
+    stale_ids = {chunk_id for name in changed + removed for chunk_id in previous[name]["ids"]} - set(ids)
+    if stale_ids:
+        logging.info("🗑️  Suppression de %s chunks obsolètes…", len(stale_ids))
+        db.delete(ids=sorted(stale_ids))
+
+    logging.info("🔤 Reconstruction de l'index lexical…")
+    _rebuild_lexical_index(db, VECTORSTORE_DIR)
+    report = _embedding_report(embeddings)
+    _save_manifest(VECTORSTORE_DIR, sources, report)
+
+    llmm.set_vectorstore(db)  # prévient les caches/index dépendant du vectorstore
+    save_progress(100, 100, "2/2 - Vectorisation terminée")
+    cp.print_success(f"Vectorstore mis à jour : +{len(added)} ~{len(changed)} -{len(removed)} sources")
 
-        # Donne les droits d’écriture sur le nouveau vectorstore
-        _check_write_permissions(_BUILD_DIR)
-        _BUILD_DIR.chmod(0o777)
-        for file in _BUILD_DIR.glob("*"):
-            file.chmod(0o777)
+    return {
+        "status": "success",
+        "message": "Vectorstore mis à jour avec succès.",
+        "mode": "incremental",
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "chunks": len(lc_docs),
+        "embedding_cache": report,
+    }
 
-        _backup_existing_vectorstore()
 
-        # Renomme _BUILD_DIR (nouveau) en VECTORSTORE_DIR (chemin officiel)
-        _BUILD_DIR.rename(VECTORSTORE_DIR)
-        logging.info("✅ Vectorstore construit et sauvegardé ⟶ %s", VECTORSTORE_DIR)
+def _load_manifest() -> dict:
+    """Manifeste du store actif ({} si absent)."""
+    if not (VECTORSTORE_DIR / MANIFEST_FILENAME).exists():
+        return {}
+    return load_map(VECTORSTORE_DIR / MANIFEST_FILENAME)
 
-        # Redonne les permissions sur le nouveau dossier (renommé)
-        _check_write_permissions(VECTORSTORE_DIR)
-        VECTORSTORE_DIR.chmod(0o777)
-        for file in VECTORSTORE_DIR.glob("*"):
-            file.chmod(0o777)
 
-        cp.print_success("Répertoire de persistance rechargé avec succès.")
-        cp.print_debug(f"Persist directory: {VECTORSTORE_DIR}")
+def _supports_incremental(manifest: dict) -> bool:
+    """Le manifeste décrit-il les chunks du store actif (même version, même découpage) ?"""
+    return (
+        (VECTORSTORE_DIR / "chroma.sqlite3").exists()
+        and manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("chunking") == _chunking_signature()
+    )
 
 
-        save_progress(100, 100, "2/2 - Vectorisation terminée")
+def build_vectorstore(full_rebuild: bool = False) -> dict:
+    """
+    Vectorise les JSON validés + syllabus.
+    Par défaut, met à jour le store existant à partir de son manifeste ; reconstruction complète
+    si `full_rebuild` est demandé ou si le store n'a pas de manifeste exploitable (store absent,
+    construit avant le manifeste ou avec d'autres paramètres de découpage).
+    """
+    if not build_lock.acquire(blocking=False):
+        return {"status": "error", "message": "Une vectorisation est déjà en cours."}
 
-        return {"status": "success", "message": "Vectorstore sauvegardé avec succès."}
+    try:
+        save_progress(0, 1, "2/2 - Initialisation vectorisation")
+        start = time.perf_counter()
+        manifest = _load_manifest()
+        if not full_rebuild and _supports_incremental(manifest):
+            result = _update_vectorstore(manifest)
+        else:
+            if not full_rebuild:
+                logging.info("ℹ️  Pas de manifeste exploitable, reconstruction complète du vectorstore.")
+            result = _rebuild_vectorstore(manifest)
+        result["elapsed_seconds"] = round(time.perf_counter() - start, 2)
+        return result
 
     except PermissionError as exc:
         logging.error("PermissionError: %s", exc)
@@ -297,10 +615,16 @@ def build_vectorstore() -> dict:
     except Exception as exc:
         logging.exception("Erreur inattendue")
         return {"status": "error", "message": str(exc)}
+    finally:
+        build_lock.release()
 
 
 if __name__ == "__main__":
-    res = build_vectorstore()
+    parser = argparse.ArgumentParser(description="Vectorisation des JSON validés et des syllabus")
+    parser.add_argument("--full", action="store_true", help="Reconstruction complète au lieu de la mise à jour incrémentale")
+    args = parser.parse_args()
+
+    res = build_vectorstore(full_rebuild=args.full)
     if res["status"] == "success":
         print(res["message"])
     else:
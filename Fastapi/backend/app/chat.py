@@ -5,17 +5,26 @@
 # Imports des bibliothèques nécessaires
 from fastapi import APIRouter, Depends, Cookie
 from sqlmodel import Session, select
-from typing import List
+from sqlalchemy import func
+from collections import OrderedDict
+from typing import List, Dict, Any
+import threading
 import json
+import os
 from color_utils import cp
 
 # Imports des modèles et outils
 from .database.models import Conversation, Message as DBMessage, ChatMessage
 from .database.database import get_session
+from .database.write_behind import write_behind
 
 # Initialisation du routeur API
 router = APIRouter()
 
+# Fenêtre d'historique chargée côté serveur (derniers messages d'une conversation)
+HISTORY_WINDOW_MESSAGES = int(os.getenv("HISTORY_WINDOW_MESSAGES", "12"))
+HISTORY_CACHE_ENTRIES = int(os.getenv("HISTORY_CACHE_ENTRIES", "1024"))
+
 # ===================================================================================
 # Endpoint : récupération de l'historique de conversation pour un utilisateur anonyme
 # ===================================================================================
@@ -99,4 +108,100 @@ def add_message(session, conversation_id, role, content, sources=None):
     session.add(msg)
     session.commit()
     cp.print_debug(f"Message ajouté avec l'ID {msg.id}")
+    _history_cache.append(conversation_id, [_history_entry(msg)])
     return msg
+
+# =============================================
+# Fenêtre d'historique (chargée côté serveur)
+# =============================================
+
+def _history_entry(message: DBMessage) -> Dict[str, Any]:
+    return {"id": message.id, "role": message.role, "content": message.content}
+
+class HistoryWindowCache:
+    """
+    Derniers messages de chaque conversation, gardés en mémoire (LRU).
+    Une entrée n'est réutilisée que si son dernier message est encore le dernier en base
+    (un autre worker a pu ajouter des messages).
+    """
+
+    def __init__(self, max_entries: int = HISTORY_CACHE_ENTRIES, window: int = HISTORY_WINDOW_MESSAGES):
+        self.max_entries = max_entries
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, conversation_id: int, last_id: int):
+        with self._lock:
+            messages = self._entries.get(conversation_id)
+            if messages is None or (messages[-1]["id"] if messages else 0) != last_id:
+                return None
+            self._entries.move_to_end(conversation_id)
+            return list(messages)
+
+    def put(self, conversation_id: int, messages: List[Dict[str, Any]]):
+        with self._lock:
+            self._entries[conversation_id] = messages[-self.window:]
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def append(self, conversation_id: int, entries: List[Dict[str, Any]]):
+        """
+        Ajoute des messages écrits à la fenêtre en cache (si la conversation y est déjà).
+        Les messages déjà présents (fenêtre relue en base après leur écriture) sont ignorés.
+        """
+        with self._lock:
+            messages = self._entries.get(conversation_id)
+            if messages is None:
+                return
+            last_id = messages[-1]["id"] if messages else 0
+            new = [entry for entry in entries if entry["id"] > last_id]
+            if new:
+                self._entries[conversation_id] = (messages + new)[-self.window:]
+
+_history_cache = HistoryWindowCache()
+# Les tours sont écrits par le thread d'écriture différée (pas par add_message) : le cache suit ses commits
+write_behind.register_written_listener(_history_cache.append)
+
+def load_history_window(session, conversation_id, limit: int = HISTORY_WINDOW_MESSAGES) -> List[Dict[str, Any]]:
+    """
+    Retourne les `limit` derniers messages de la conversation, du plus ancien au plus récent
+    ({"id", "role", "content"}), via l'index (conversation_id, timestamp) ou le cache
+    (qui ne garde que HISTORY_WINDOW_MESSAGES messages : au-delà, lecture en base).
+    """
+    last_id = session.exec(
+        select(func.max(DBMessage.id)).where(DBMessage.conversation_id == conversation_id)
+    ).one() or 0
+    cached = _history_cache.get(conversation_id, last_id) if limit <= _history_cache.window else None
+    if cached is not None:
+        return _with_pending(cached, conversation_id)[-limit:]
+
+    messages = session.exec(
+        select(DBMessage)
+        .where(DBMessage.conversation_id == conversation_id)
+        .order_by(DBMessage.timestamp.desc(), DBMessage.id.desc())
+        .limit(max(limit, _history_cache.window))
+    ).all()
+    window = [_history_entry(m) for m in reversed(messages) if m.role in ("user", "assistant")]
+    _history_cache.put(conversation_id, window)
+    return _with_pending(window, conversation_id)[-limit:]
+
+def _with_pending(window: List[Dict[str, Any]], conversation_id) -> List[Dict[str, Any]]:
+    """
+    Fenêtre suivie des messages encore en file. Un tour validé entre la lecture de la fenêtre et celle
+    de la file peut figurer dans les deux : les premiers messages en file déjà en fin de fenêtre sont ignorés.
+    """
+    pending = _pending_messages(conversation_id)
+    for n in range(min(len(pending), len(window)), 0, -1):
+        if [(m["role"], m["content"]) for m in window[-n:]] == [(m["role"], m["content"]) for m in pending[:n]]:
+            pending = pending[n:]
+            break
+    return window + pending
+
+def _pending_messages(conversation_id) -> List[Dict[str, Any]]:
+    """Messages du tour précédent encore dans la file d'écriture différée (id inconnu)"""
+    return [
+        {"id": None, "role": m["role"], "content": m["content"]}
+        for m in write_behind.pending_messages(conversation_id)
+    ]
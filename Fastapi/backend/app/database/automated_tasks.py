@@ -14,6 +14,7 @@ from .database import get_session, engine
 from .models import RAGConversation, RAGDailyStats, RAGMonthlyStats, RAGYearlyStats
 from .models import Conversation, Message, RAGTokenOperation, RAGContextDocument
 from .stats_manager import StatsManager
+from .. import metrics
 from color_utils import ColorPrint
 import pytz
 
@@ -369,25 +370,27 @@ class AutomatedMaintenanceService:
     def _run_daily_maintenance(self):
         """Exécuter la maintenance quotidienne"""
         try:
-            cp.print_info("[Maintenance] Début de la maintenance quotidienne...")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.run_daily_maintenance())
-            loop.close()
-            cp.print_success("[Maintenance] Maintenance quotidienne terminée")
+            with metrics.time_maintenance_task("daily"):
+                cp.print_info("[Maintenance] Début de la maintenance quotidienne...")
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                loop.run_until_complete(self.run_daily_maintenance())
+                loop.close()
+                cp.print_success("[Maintenance] Maintenance quotidienne terminée")
         except Exception as e:
             cp.print_error(f"[Maintenance] Erreur maintenance quotidienne: {e}")
     
     def _run_weekly_cleanup(self):
         """Exécuter le nettoyage hebdomadaire"""
         try:
-            cp.print_info("[Maintenance] Début du nettoyage hebdomadaire...")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self.run_weekly_maintenance())
-            loop.close()
-            cp.print_success("[Maintenance] Nettoyage hebdomadaire terminé")
-            cp.print_info(f"[Maintenance] Résultat: {result}")
+            with metrics.time_maintenance_task("weekly"):
+                cp.print_info("[Maintenance] Début du nettoyage hebdomadaire...")
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                result = loop.run_until_complete(self.run_weekly_maintenance())
+                loop.close()
+                cp.print_success("[Maintenance] Nettoyage hebdomadaire terminé")
+                cp.print_info(f"[Maintenance] Résultat: {result}")
         except Exception as e:
             cp.print_error(f"[Maintenance] Erreur nettoyage hebdomadaire: {e}")
     
@@ -400,30 +403,32 @@ class AutomatedMaintenanceService:
     def _run_monthly_cleanup(self):
         """Exécuter le nettoyage mensuel des très anciennes données"""
         try:
-            cp.print_info("[Maintenance] Début du nettoyage mensuel...")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            with metrics.time_maintenance_task("monthly"):
+                cp.print_info("[Maintenance] Début du nettoyage mensuel...")
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
             
-            result = loop.run_until_complete(self.cleanup_old_data(days_to_keep=180))
-            stats_result = loop.run_until_complete(self.cleanup_old_stats(days_to_keep=730))
+                result = loop.run_until_complete(self.cleanup_old_data(days_to_keep=180))
+                stats_result = loop.run_until_complete(self.cleanup_old_stats(days_to_keep=730))
             
-            loop.close()
-            cp.print_success("[Maintenance] Nettoyage mensuel terminé")
-            cp.print_info(f"[Maintenance] Données supprimées: {result}")
-            cp.print_info(f"[Maintenance] Stats supprimées: {stats_result}")
+                loop.close()
+                cp.print_success("[Maintenance] Nettoyage mensuel terminé")
+                cp.print_info(f"[Maintenance] Données supprimées: {result}")
+                cp.print_info(f"[Maintenance] Stats supprimées: {stats_result}")
         except Exception as e:
             cp.print_error(f"[Maintenance] Erreur nettoyage mensuel: {e}")
     
     def run_manual_cleanup_now(self, days_to_keep: int = 90):
         """Exécuter un nettoyage manuel immédiatement"""
         try:
-            cp.print_info(f"[Maintenance] Nettoyage manuel immédiat (garder {days_to_keep} jours)...")
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self.run_manual_cleanup(days_to_keep))
-            loop.close()
-            cp.print_success("[Maintenance] Nettoyage manuel terminé")
-            return result
+            with metrics.time_maintenance_task("manual_cleanup"):
+                cp.print_info(f"[Maintenance] Nettoyage manuel immédiat (garder {days_to_keep} jours)...")
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                result = loop.run_until_complete(self.run_manual_cleanup(days_to_keep))
+                loop.close()
+                cp.print_success("[Maintenance] Nettoyage manuel terminé")
+                return result
         except Exception as e:
             cp.print_error(f"[Maintenance] Erreur nettoyage manuel: {e}")
             return {"error": str(e)}
@@ -1,4 +1,4 @@
-from .models import Conversation, Message, RAGConversation, RAGTokenOperation, RAGContextDocument
+from .models import Conversation, Message, RAGConversation, RAGTokenOperation, RAGContextDocument, RAGNodeSpan
 from fastapi import Depends, HTTPException, status, Cookie
 from sqlmodel import Session, select
 from ..database.database import get_session, engine
@@ -7,50 +7,27 @@ import json
 from datetime import datetime
 from color_utils import cp
 
-def update_rag_conversation(
-    invoke_result: Dict[str, Any], 
-    conversation: Conversation,
-    session: Session = Depends(get_session)
-) -> RAGConversation:
+def build_rag_conversation_rows(
+    invoke_result: Dict[str, Any],
+    conversation_id: int,
+    default_session_id: str,
+    question: str
+) -> List[Any]:
     """
-    Créer une instance RAGConversation à partir du résultat de invoke() et d'une conversation.
+    Construit (sans les enregistrer) la RAGConversation d'un tour et ses opérations de tokens
+    et documents contextuels, liés par relation : un seul commit suffit pour tout insérer.
     
-    Args:
-        invoke_result: Résultat de invoke_intelligent_rag()
-        conversation: Instance de Conversation existante
-        session: Session de base de données
-        
     Returns:
-        RAGConversation: Instance créée et sauvegardée
+        list: [RAGConversation, RAGTokenOperation..., RAGContextDocument..., RAGNodeSpan...]
     """
-    
-    # Récupérer les messages de la conversation pour avoir la question
-    messages = session.exec(
-        select(Message)
-        .where(Message.conversation_id == conversation.id)
-        .order_by(Message.timestamp.desc())
-    ).all()
-    
-    # Trouver la dernière question de l'utilisateur
-    last_user_question = None
-    for message in messages:
-        if message.role == "user":
-            last_user_question = message.content
-            break
-    
-    cp.print_debug(f"Last user question found: {last_user_question}")
-    cp.print_debug(f"Invoke result: {invoke_result.get('question', 'Question non trouvée')}")
-    # Si pas de question trouvée, utiliser celle du résultat ou une valeur par défaut
-    question = last_user_question or invoke_result.get("question", "Question non trouvée")
-    
     # Extraire les données des tokens
     token_cost = invoke_result.get("token_cost", {})
     
     # Créer l'instance RAGConversation
     rag_conversation = RAGConversation(
-        session_id=invoke_result.get("session_id", conversation.session_id),
+        session_id=invoke_result.get("session_id", default_session_id),
         timestamp=datetime.utcnow(),
-        conversation_id=conversation.id,
+        conversation_id=conversation_id,
         question=question,
         answer=invoke_result.get("answer", ""),
         intent_analysis=json.dumps(invoke_result.get("intent_analysis")) if invoke_result.get("intent_analysis") else None,
@@ -70,10 +47,7 @@ def update_rag_conversation(
         total_cost_usd=token_cost.get("total_cost_usd", 0.0)
     )
     
-    # Sauvegarder la conversation RAG
-    session.add(rag_conversation)
-    session.commit()
-    session.refresh(rag_conversation)
+    rows = [rag_conversation]
     
     # Créer les opérations de tokens si elles existent
     operations = invoke_result.get("token_cost", {}).get("operations", [])
@@ -82,7 +56,7 @@ def update_rag_conversation(
     
     for operation in operations:
         token_operation = RAGTokenOperation(
-            rag_conversation_id=rag_conversation.id,
+            rag_conversation=rag_conversation,
             session_id=rag_conversation.session_id,
             operation=operation.get("operation", "unknown"),
             model=operation.get("model", "unknown"),
@@ -92,7 +66,7 @@ def update_rag_conversation(
             cost_usd=operation.get("cost_usd", 0.0),
             timestamp=datetime.fromisoformat(operation.get("timestamp", datetime.utcnow().isoformat()).replace('Z', '+00:00')) if operation.get("timestamp") else datetime.utcnow()
         )
-        session.add(token_operation)
+        rows.append(token_operation)
     
     # Créer les documents contextuels si ils existent
     context_docs = invoke_result.get("context", [])
@@ -107,14 +81,76 @@ def update_rag_conversation(
             metadata = json.dumps({"index": i})
         
         context_document = RAGContextDocument(
-            rag_conversation_id=rag_conversation.id,
+            rag_conversation=rag_conversation,
             session_id=rag_conversation.session_id,
             content_preview=content_preview,
             metadonnee=metadata
         )
-        session.add(context_document)
+        rows.append(context_document)
+    
+    # Créer les spans de latence par nœud (tracing.py)
+    intent_analysis = invoke_result.get("intent_analysis") or {}
+    intent = intent_analysis.get("intent")
+    for span in invoke_result.get("node_spans", []):
+        node_span = RAGNodeSpan(
+            rag_conversation=rag_conversation,
+            session_id=rag_conversation.session_id,
+            node=span["node"],
+            intent=getattr(intent, "value", intent),
+            started_at=datetime.fromisoformat(span["started_at"]) if isinstance(span["started_at"], str) else span["started_at"],
+            wall_ms=span.get("wall_ms", 0.0),
+            llm_ms=span.get("llm_ms", 0.0),
+            retrieval_ms=span.get("retrieval_ms", 0.0),
+            llm_calls=span.get("llm_calls", 0),
+            prompt_tokens=span.get("prompt_tokens", 0),
+            completion_tokens=span.get("completion_tokens", 0),
+            cache_hit=span.get("cache_hit", False),
+            success=span.get("success", True)
+        )
+        rows.append(node_span)
+    
+    return rows
+
+def update_rag_conversation(
+    invoke_result: Dict[str, Any], 
+    conversation: Conversation,
+    session: Session = Depends(get_session)
+) -> RAGConversation:
+    """
+    Créer une instance RAGConversation à partir du résultat de invoke() et d'une conversation.
+    
+    Args:
+        invoke_result: Résultat de invoke_intelligent_rag()
+        conversation: Instance de Conversation existante
+        session: Session de base de données
+        
+    Returns:
+        RAGConversation: Instance créée et sauvegardée
+    """
+    
+    # Récupérer les messages de la conversation pour avoir la question
+    messages = session.exec(
+        select(Message)
+        .where(Message.conversation_id == conversation.id)
+        .order_by(Message.timestamp.desc())
+    ).all()
+    
+    # Trouver la dernière question de l'utilisateur
+    last_user_question = None
+    for message in messages:
+        if message.role == "user":
+            last_user_question = message.content
+            break
+    
+    cp.print_debug(f"Last user question found: {last_user_question}")
+    cp.print_debug(f"Invoke result: {invoke_result.get('question', 'Question non trouvée')}")
+    # Si pas de question trouvée, utiliser celle du résultat ou une valeur par défaut
+    question = last_user_question or invoke_result.get("question", "Question non trouvée")
+    
+    rows = build_rag_conversation_rows(invoke_result, conversation.id, conversation.session_id, question)
+    session.add_all(rows)
     
-    # Commit final pour les relations
+    # Un seul commit : les clés rag_conversation_id sont renseignées par les relations
     session.commit()
     
-    return rag_conversation
\ No newline at end of file
+    return rows[0]
\ No newline at end of file
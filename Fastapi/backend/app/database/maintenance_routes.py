@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import Dict, Any, List
 from datetime import datetime
 from .automated_tasks import maintenance_service
+from .migrations import get_schema_status, run_migrations
 from color_utils import ColorPrint
 
 cp = ColorPrint()
@@ -99,3 +100,26 @@ def get_cleanup_history():
         "suggestion": "Consultez les logs de l'application pour voir l'historique",
         "timestamp": datetime.utcnow().isoformat()
     }
+
+@router.get("/schema")
+def get_schema():
+    """Version du schéma, migrations en attente et plan d'exécution (EXPLAIN) des requêtes chaudes"""
+    try:
+        return {**get_schema_status(), "timestamp": datetime.utcnow().isoformat()}
+    except Exception as e:
+        cp.print_error(f"Erreur vérification schéma: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification du schéma: {str(e)}")
+
+@router.post("/schema/migrate")
+def migrate_schema():
+    """Appliquer les migrations en attente sur la base en service"""
+    try:
+        applied = run_migrations()
+        return {
+            "message": f"{len(applied)} migration(s) appliquée(s)",
+            "applied": applied,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        cp.print_error(f"Erreur migration schéma: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la migration: {str(e)}")
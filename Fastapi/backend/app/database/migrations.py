@@ -0,0 +1,222 @@
+"""
+Migrations versionnées du schéma de la base
+create_all crée les tables manquantes mais ne modifie jamais une table existante : les bases
+déjà en production (database.db) sont mises à niveau ici, migration par migration, et la
+table schema_version garde la trace de celles déjà appliquées.
+
+Mise à niveau manuelle d'une base (depuis la racine du dépôt) :
+    python -m Fastapi.backend.app.database.migrations
+"""
+
+from datetime import datetime
+from typing import Dict, Any, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from .database import engine as default_engine
+from .models import SchemaVersion
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# ================================
+# MIGRATIONS
+# ================================
+
+# Chaque migration est idempotente (IF NOT EXISTS) : une base créée par create_all,
+# qui a déjà les index déclarés dans models.py, est simplement marquée à jour.
+# Les noms d'index sont ceux générés par SQLModel pour Field(index=True).
+MIGRATIONS: List[Dict[str, Any]] = [
+    {
+        "version": 1,
+        "name": "hot_query_indexes",
+        "statements": [
+            # Fenêtre d'historique (chat.py) : WHERE conversation_id ORDER BY timestamp DESC
+            "CREATE INDEX IF NOT EXISTS ix_message_conversation_timestamp ON message (conversation_id, timestamp)",
+            # Nettoyage (automated_tasks.py) : WHERE timestamp / created_at < cutoff
+            "CREATE INDEX IF NOT EXISTS ix_message_timestamp ON message (timestamp)",
+            "CREATE INDEX IF NOT EXISTS ix_conversation_created_at ON conversation (created_at)",
+            # Statistiques journalières (stats_manager.py), conversations récentes (db_routes.py), nettoyage
+            "CREATE INDEX IF NOT EXISTS ix_rag_conversations_new_timestamp ON rag_conversations_new (timestamp)",
+            "CREATE INDEX IF NOT EXISTS ix_rag_conversations_new_conversation_id ON rag_conversations_new (conversation_id)",
+            # Enfants d'une RAGConversation (nettoyage, détail d'une conversation)
+            "CREATE INDEX IF NOT EXISTS ix_rag_token_operations_rag_conversation_id ON rag_token_operations (rag_conversation_id)",
+            "CREATE INDEX IF NOT EXISTS ix_rag_context_documents_rag_conversation_id ON rag_context_documents (rag_conversation_id)",
+            # Statistiques mensuelles (automated_tasks.py) : WHERE year AND month
+            "CREATE INDEX IF NOT EXISTS ix_rag_monthly_stats_year_month ON rag_monthly_stats (year, month)",
+        ],
+    },
+]
+
+LATEST_VERSION = max(migration["version"] for migration in MIGRATIONS)
+
+def get_current_version(db_engine: Engine = default_engine) -> int:
+    """Dernière migration appliquée (0 pour une base jamais migrée)"""
+    SchemaVersion.__table__.create(db_engine, checkfirst=True)
+    with Session(db_engine) as session:
+        versions = session.exec(select(SchemaVersion.version)).all()
+    return max(versions, default=0)
+
+def run_migrations(db_engine: Engine = default_engine) -> List[int]:
+    """
+    Applique les migrations en attente, chacune dans sa propre transaction.
+
+    Returns:
+        list: Versions appliquées par cet appel
+    """
+    current = get_current_version(db_engine)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+        if migration["version"] <= current:
+            continue
+        try:
+            with db_engine.begin() as connection:
+                for statement in migration["statements"]:
+                    connection.execute(text(statement))
+                connection.execute(
+                    SchemaVersion.__table__.insert().values(
+                        version=migration["version"], name=migration["name"], applied_at=datetime.utcnow()
+                    )
+                )
+        except IntegrityError:
+            # Un autre worker uvicorn a appliqué la même migration au même moment
+            cp.print_info(f"[Migrations] Migration {migration['version']} déjà appliquée par un autre processus")
+            continue
+        applied.append(migration["version"])
+        cp.print_success(f"[Migrations] Migration {migration['version']} ({migration['name']}) appliquée")
+
+    if not applied:
+        cp.print_info(f"[Migrations] Schéma à jour (version {max(current, LATEST_VERSION)})")
+    return applied
+
+# ================================
+# VÉRIFICATION DES PLANS DE REQUÊTE
+# ================================
+
+# Requêtes chaudes de chat.py, stats_manager.py, db_routes.py et automated_tasks.py
+HOT_QUERIES: Dict[str, Dict[str, Any]] = {
+    "conversation_by_session": {
+        "sql": "SELECT id FROM conversation WHERE session_id = :session_id",
+        "params": {"session_id": "explain"},
+    },
+    "history_window": {
+        "sql": "SELECT id, role, content FROM message WHERE conversation_id = :conversation_id "
+               "ORDER BY timestamp DESC, id DESC LIMIT 12",
+        "params": {"conversation_id": 1},
+    },
+    "history_last_message_id": {
+        "sql": "SELECT max(id) FROM message WHERE conversation_id = :conversation_id",
+        "params": {"conversation_id": 1},
+    },
+    "daily_stats_range": {
+        "sql": "SELECT id FROM rag_conversations_new WHERE timestamp >= :start AND timestamp <= :end",
+        "params": {"start": "2000-01-01 00:00:00", "end": "2000-01-01 23:59:59"},
+    },
+    "recent_rag_conversations": {
+        "sql": "SELECT id FROM rag_conversations_new ORDER BY timestamp DESC LIMIT 10",
+        "params": {},
+    },
+    "rag_conversations_by_conversation": {
+        "sql": "SELECT id FROM rag_conversations_new WHERE conversation_id = :conversation_id",
+        "params": {"conversation_id": 1},
+    },
+    "token_operations_by_rag_conversation": {
+        "sql": "SELECT id FROM rag_token_operations WHERE rag_conversation_id = :rag_conversation_id",
+        "params": {"rag_conversation_id": 1},
+    },
+    "context_documents_by_rag_conversation": {
+        "sql": "SELECT id FROM rag_context_documents WHERE rag_conversation_id = :rag_conversation_id",
+        "params": {"rag_conversation_id": 1},
+    },
+    "monthly_stats_lookup": {
+        "sql": "SELECT id FROM rag_monthly_stats WHERE year = :year AND month = :month",
+        "params": {"year": 2000, "month": 1},
+    },
+    "node_span_window": {
+        "sql": "SELECT node, wall_ms FROM rag_node_spans WHERE started_at >= :start AND started_at <= :end",
+        "params": {"start": "2000-01-01 00:00:00", "end": "2000-01-02 00:00:00"},
+    },
+    "cleanup_old_messages": {
+        "sql": "SELECT id FROM message WHERE timestamp < :cutoff",
+        "params": {"cutoff": "2000-01-01 00:00:00"},
+    },
+    "cleanup_old_conversations": {
+        "sql": "SELECT id FROM conversation WHERE created_at < :cutoff",
+        "params": {"cutoff": "2000-01-01 00:00:00"},
+    },
+    "cleanup_old_rag_conversations": {
+        "sql": "SELECT id FROM rag_conversations_new WHERE timestamp < :cutoff",
+        "params": {"cutoff": "2000-01-01 00:00:00"},
+    },
+}
+
+def _sqlite_plan(connection, sql: str, params: Dict[str, Any]) -> List[str]:
+    rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+    return [row[-1] for row in rows]
+
+def _sqlite_uses_index(plan: List[str]) -> bool:
+    # "SEARCH t USING INDEX ..." ou "SCAN t USING (COVERING) INDEX ..." ; un "SCAN t" seul est un parcours complet
+    return not any(line.startswith("SCAN") and "INDEX" not in line for line in plan)
+
+def _postgresql_plan(connection, sql: str, params: Dict[str, Any]) -> List[str]:
+    # Sur une petite table le planificateur préfère un Seq Scan : on vérifie qu'un index est utilisable
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    rows = connection.execute(text(f"EXPLAIN {sql}"), params).all()
+    return [row[0] for row in rows]
+
+def _postgresql_uses_index(plan: List[str]) -> bool:
+    return not any("Seq Scan" in line for line in plan)
+
+def check_query_plans(db_engine: Engine = default_engine) -> List[Dict[str, Any]]:
+    """
+    Plan d'exécution (EXPLAIN) de chaque requête chaude et utilisation d'un index.
+
+    Returns:
+        list: [{"query", "uses_index", "plan"}]
+    """
+    sqlite = db_engine.dialect.name == "sqlite"
+    results = []
+    for name, query in HOT_QUERIES.items():
+        with db_engine.connect() as connection:
+            try:
+                if sqlite:
+                    plan = _sqlite_plan(connection, query["sql"], query["params"])
+                    uses_index = _sqlite_uses_index(plan)
+                else:
+                    plan = _postgresql_plan(connection, query["sql"], query["params"])
+                    uses_index = _postgresql_uses_index(plan)
+            except Exception as e:
+                results.append({"query": name, "uses_index": False, "plan": [], "error": str(e)})
+                continue
+            finally:
+                connection.rollback()
+        results.append({"query": name, "uses_index": uses_index, "plan": plan})
+        if not uses_index:
+            cp.print_warning(f"[Migrations] Requête '{name}' sans index : {' | '.join(plan)}")
+    return results
+
+def get_schema_status(db_engine: Engine = default_engine) -> Dict[str, Any]:
+    """Version du schéma, migrations en attente et vérification des index"""
+    current = get_current_version(db_engine)
+    plans = check_query_plans(db_engine)
+    return {
+        "current_version": current,
+        "latest_version": LATEST_VERSION,
+        "pending": [m["version"] for m in MIGRATIONS if m["version"] > current],
+        "queries_checked": len(plans),
+        "queries_without_index": [p["query"] for p in plans if not p["uses_index"]],
+        "plans": plans,
+    }
+
+if __name__ == "__main__":
+    from sqlmodel import SQLModel
+
+    SQLModel.metadata.create_all(default_engine)
+    run_migrations()
+    for result in check_query_plans():
+        status = "OK " if result["uses_index"] else "SCAN"
+        print(f"{status} {result['query']}: {' | '.join(result['plan'])}")
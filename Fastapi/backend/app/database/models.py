@@ -4,6 +4,7 @@
 
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from pydantic import BaseModel
 from datetime import datetime
 import datetime as dt
@@ -19,7 +20,7 @@ class Conversation(SQLModel, table=True):
     """
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(index=True)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     messages: List["Message"] = Relationship(back_populates="conversation")
 
 class Message(SQLModel, table=True):
@@ -27,14 +28,31 @@ class Message(SQLModel, table=True):
     Représente un message individuel (utilisateur ou assistant) stocké en base.
     Contient le texte, le rôle (user/assistant), le timestamp et la relation à la conversation.
     """
+    # Fenêtre d'historique : derniers messages d'une conversation (WHERE conversation_id ORDER BY timestamp)
+    __table_args__ = (Index("ix_message_conversation_timestamp", "conversation_id", "timestamp"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     conversation_id: int = Field(foreign_key="conversation.id")
     role: str
     content: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     conversation: Optional[Conversation] = Relationship(back_populates="messages")
     sources: Optional[str] = Field(default=None, description="Sources ou références associées au message, si applicable")
 
+class ConversationSummary(SQLModel, table=True):
+    """
+    Résumé glissant d'une conversation longue : les anciens messages y sont condensés
+    pour que les prompts ne portent que ce résumé et les derniers échanges.
+    """
+    __tablename__ = "conversation_summaries"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(foreign_key="conversation.id", unique=True, index=True)
+    summary: str = Field(description="Résumé des messages les plus anciens")
+    last_summarized_message_id: int = Field(default=0, description="Dernier message (Message.id) couvert par le résumé")
+    summary_tokens: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 # ==================================
 # Modèles RAG SQLModel (nouvelle architecture)
 # ==================================
@@ -48,10 +66,10 @@ class RAGConversation(SQLModel, table=True):
     
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: str = Field(unique=True, index=True)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)
     
     # Relations vers les classes existantes
-    conversation_id: int = Field(foreign_key="conversation.id")
+    conversation_id: int = Field(foreign_key="conversation.id", index=True)
     conversation: Optional[Conversation] = Relationship()
     
     # Question et réponse peuvent être récupérées via les relations Message
@@ -88,7 +106,7 @@ class RAGTokenOperation(SQLModel, table=True):
     __tablename__ = "rag_token_operations"
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    rag_conversation_id: int = Field(foreign_key="rag_conversations_new.id")
+    rag_conversation_id: int = Field(foreign_key="rag_conversations_new.id", index=True)
     session_id: str = Field(index=True)
     operation: str = Field(description="Type d'opération: intent_analysis, answer_generation, etc.")
     model: str = Field(description="Modèle utilisé: gpt-4, gpt-3.5-turbo, etc.")
@@ -109,7 +127,7 @@ class RAGContextDocument(SQLModel, table=True):
     __tablename__ = "rag_context_documents"
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    rag_conversation_id: int = Field(foreign_key="rag_conversations_new.id")
+    rag_conversation_id: int = Field(foreign_key="rag_conversations_new.id", index=True)
     session_id: str = Field(index=True)
     content_preview: str = Field(description="Aperçu du contenu du document")
     metadonnee: str = Field(description="Métadonnées du document au format JSON")
@@ -118,6 +136,33 @@ class RAGContextDocument(SQLModel, table=True):
     # Relation vers la conversation RAG
     rag_conversation: Optional[RAGConversation] = Relationship()
 
+class RAGNodeSpan(SQLModel, table=True):
+    """
+    Durées mesurées pour un nœud du graphe lors d'une conversation RAG
+    (temps total, temps des appels LLM, temps de recherche, tokens, cache).
+    """
+    __tablename__ = "rag_node_spans"
+    # Percentiles sur une fenêtre de temps, par nœud
+    __table_args__ = (Index("ix_rag_node_spans_started_at_node", "started_at", "node"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    rag_conversation_id: int = Field(foreign_key="rag_conversations_new.id", index=True)
+    session_id: str = Field(index=True)
+    node: str = Field(description="Nœud du graphe: intent_analysis_detect, document_retrieval, etc.")
+    intent: Optional[str] = Field(default=None, index=True, description="Intention détectée pour la requête")
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    wall_ms: float = Field(default=0.0)
+    llm_ms: float = Field(default=0.0)
+    retrieval_ms: float = Field(default=0.0)
+    llm_calls: int = Field(default=0)
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    cache_hit: bool = Field(default=False)
+    success: bool = Field(default=True)
+
+    # Relation vers la conversation RAG
+    rag_conversation: Optional[RAGConversation] = Relationship()
+
 # ==================================
 # Modèles de statistiques RAG
 # ==================================
@@ -170,7 +215,10 @@ class RAGMonthlyStats(SQLModel, table=True):
     month: int = Field(index=True)
     
     # Contrainte d'unicité sur year/month
-    __table_args__ = {"sqlite_autoincrement": True}
+    __table_args__ = (
+        Index("ix_rag_monthly_stats_year_month", "year", "month"),
+        {"sqlite_autoincrement": True},
+    )
     
     # Métriques de base
     total_conversations: int = Field(default=0)
@@ -236,6 +284,18 @@ class RAGYearlyStats(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# ==================================
+# Version du schéma (migrations)
+# ==================================
+
+class SchemaVersion(SQLModel, table=True):
+    """Migrations appliquées à la base (voir database/migrations.py)"""
+    __tablename__ = "schema_version"
+
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
 # ======================
 # Schémas Pydantic (API)
 # ======================
@@ -248,7 +308,10 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     prompt: str
-    chat_history: List[ChatMessage]
+    # Historique chargé côté serveur par défaut ; l'historique envoyé par le client n'est utilisé
+    # qu'en mode compatibilité (use_client_history)
+    chat_history: Optional[List[ChatMessage]] = None
+    use_client_history: bool = False
     recaptcha_token: Optional[str] = None
 
 class ChatResponse(BaseModel):
@@ -5,7 +5,7 @@ Routes API pour les statistiques RAG (journalières, mensuelles, annuelles)
 from fastapi import APIRouter, HTTPException, Depends, Query, Path
 from sqlmodel import Session, select
 from typing import List, Dict, Any, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from .database import get_session
 from .models import RAGDailyStats, RAGMonthlyStats, RAGYearlyStats, RAGConversation
 from .stats_manager import StatsManager
@@ -397,3 +397,139 @@ async def run_maintenance():
     except Exception as e:
         cp.print_error(f"Erreur maintenance automatisée: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+# ================================
+# ROUTES CACHES DE RÉPONSES
+# ================================
+
+@router.get("/cache")
+async def get_answer_cache_stats():
+    """Statistiques des caches : réponses sémantique (taux de succès, évictions, taille) et exact (Redis), embeddings"""
+    try:
+        from ..intelligent_rag.semantic_cache import semantic_cache
+        from ..intelligent_rag import exact_cache
+        from .. import llmm
+        return {
+            "semantic": semantic_cache.get_stats(),
+            "exact": exact_cache.get_stats(),
+            "embeddings": llmm.embeddings.get_stats()
+        }
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/cache/invalidate")
+async def invalidate_answer_cache():
+    """Vider les caches de réponses (les analyses d'intention mémorisées sont conservées)"""
+    try:
+        from ..intelligent_rag.semantic_cache import semantic_cache
+        from ..intelligent_rag import exact_cache
+        semantic_cache.invalidate("manual")
+        exact_cache.invalidate_answers("manual")
+        
+        return {
+            "message": "Caches de réponses vidés",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        cp.print_error(f"Erreur invalidation cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ================================
+# ROUTES OPTIMISATIONS DU PIPELINE
+# ================================
+
+@router.get("/intent-classifier")
+async def get_intent_classifier_stats():
+    """Part des analyses d'intention résolues localement et latence économisée"""
+    try:
+        from ..intelligent_rag import intent_classifier
+        return intent_classifier.get_stats()
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats classifieur: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/speculative-retrieval")
+async def get_speculative_retrieval_stats():
+    """Recherches spéculatives lancées pendant l'analyse d'intention : réutilisées, abandonnées, échouées"""
+    try:
+        from ..intelligent_rag.nodes import speculative_retrieval_stats, SPECULATIVE_RETRIEVAL_ENABLED
+        launched = speculative_retrieval_stats["launched"]
+        return {
+            **speculative_retrieval_stats,
+            "enabled": SPECULATIVE_RETRIEVAL_ENABLED,
+            "reuse_rate": speculative_retrieval_stats["reused"] / launched if launched else 0.0
+        }
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats recherche spéculative: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/reranker")
+async def get_reranker_stats():
+    """Documents gardés par le reranker et tokens de contexte économisés"""
+    try:
+        from ..intelligent_rag.reranker import get_stats
+        return get_stats()
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats reranker: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/summary-memory")
+async def get_summary_memory_stats():
+    """Mises à jour du résumé des conversations longues (messages condensés, échecs, tâches en cours)"""
+    try:
+        from ..intelligent_rag.summary_memory import get_stats
+        return get_stats()
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats mémoire de résumé: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/write-behind")
+async def get_write_behind_stats():
+    """File d'écriture différée des tours de conversation (taille, lots écrits, nouvelles tentatives, échecs)"""
+    try:
+        from .write_behind import write_behind
+        return write_behind.get_stats()
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération stats écriture différée: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/storage")
+async def get_storage_stats():
+    """Backend de stockage (SQLite ou PostgreSQL), état du pool de connexions et PRAGMA SQLite effectifs"""
+    try:
+        from .database import get_storage_info
+        return get_storage_info()
+        
+    except Exception as e:
+        cp.print_error(f"Erreur récupération infos stockage: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/latency")
+async def get_latency_stats(
+    hours: int = Query(24, ge=1, le=24 * 90, description="Fenêtre en heures (jusqu'à maintenant)"),
+    since: Optional[datetime] = Query(None, description="Début de fenêtre explicite (prioritaire sur hours)"),
+    until: Optional[datetime] = Query(None, description="Fin de fenêtre explicite"),
+    session: Session = Depends(get_session)
+):
+    """Latence p50/p95/p99 par nœud du graphe et par intention (temps total, temps LLM, temps de recherche)"""
+    try:
+        from ..intelligent_rag.tracing import get_latency_percentiles
+        until = until or datetime.utcnow()
+        since = since or until - timedelta(hours=hours)
+        if since >= until:
+            raise HTTPException(status_code=400, detail="since doit précéder until")
+        return get_latency_percentiles(session, since, until)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        cp.print_error(f"Erreur récupération latences par nœud: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,292 @@
+"""
+Écriture différée (write-behind) des tours de conversation
+Les messages user/assistant et les statistiques RAG d'un tour sont mis en file dès la fin
+de la génération ; un thread d'écriture les insère par lots, en une transaction par lot
+"""
+
+import os
+import json
+import time
+import queue
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlmodel import Session
+from sqlalchemy.exc import OperationalError
+
+from .database import engine
+from .. import metrics
+from .models import Message
+from .db_update_stat import build_rag_conversation_rows
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))  # attente max pour compléter un lot (s)
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "5"))
+
+_STOP = object()
+
+def _is_lock_error(e: OperationalError) -> bool:
+    """Erreur transitoire : verrou SQLite, ou conflit de sérialisation / interblocage PostgreSQL"""
+    message = str(e).lower()
+    return any(marker in message for marker in (
+        "database is locked", "database is busy", "could not serialize access", "deadlock detected"
+    ))
+
+def _json_sources(sources) -> Optional[str]:
+    """Sources d'un message au format stocké en base (liste JSON, comme add_message)"""
+    return json.dumps(sources) if isinstance(sources, list) else sources
+
+class WriteBehindWriter:
+    """File bornée de tours de conversation vidée par un thread d'écriture"""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=WRITE_BEHIND_QUEUE_SIZE)
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[int, List[Dict[str, Any]]] = {}  # messages en file, par conversation
+        self._written_listeners: List[Callable[[int, List[Dict[str, Any]]], None]] = []
+        self.thread: Optional[threading.Thread] = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "failed": 0, "sync_writes": 0}
+
+    # ---------- Cycle de vie ----------
+
+    def start(self):
+        """Démarre le thread d'écriture"""
+        if not WRITE_BEHIND_ENABLED or (self.thread and self.thread.is_alive()):
+            return
+        self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.thread.start()
+        cp.print_success("[WriteBehind] Thread d'écriture démarré")
+
+    def stop(self, timeout: float = 10.0):
+        """Vide la file puis arrête le thread (appelé à l'arrêt de l'application)"""
+        if not self.thread or not self.thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self.thread.join(timeout=timeout)
+        cp.print_info(f"[WriteBehind] Thread d'écriture arrêté ({self._queue.qsize()} tours non écrits)")
+
+    def register_written_listener(self, callback):
+        """
+        Enregistre une fonction appelée après la validation de chaque tour écrit, depuis le thread
+        d'écriture, avec (conversation_id, messages écrits [{"id", "role", "content"}]).
+        """
+        self._written_listeners.append(callback)
+        return callback
+
+    # ---------- Mise en file ----------
+
+    def enqueue_turn(self, conversation_id: int, question: str, answer: str, sources: List[str],
+                     invoke_result: Optional[Dict[str, Any]], default_session_id: str,
+                     question_timestamp: datetime, on_written: Optional[Callable[[], None]] = None):
+        """
+        Met en file un tour complet (question, réponse, statistiques RAG si invoke_result).
+        Si l'écriture différée est désactivée, que le thread n'est pas démarré ou que la file est pleine,
+        le tour est écrit immédiatement (appel bloquant : depuis la boucle d'événements, utiliser aenqueue_turn).
+        """
+        turn = self._make_turn(conversation_id, question, answer, sources, invoke_result,
+                               default_session_id, question_timestamp, on_written)
+        if not self._try_enqueue(turn):
+            self._write_sync(turn)
+
+    async def aenqueue_turn(self, conversation_id: int, question: str, answer: str, sources: List[str],
+                            invoke_result: Optional[Dict[str, Any]], default_session_id: str,
+                            question_timestamp: datetime, on_written: Optional[Callable[[], None]] = None):
+        """Variante asynchrone d'enqueue_turn : l'écriture immédiate de repli passe par un thread"""
+        turn = self._make_turn(conversation_id, question, answer, sources, invoke_result,
+                               default_session_id, question_timestamp, on_written)
+        if not self._try_enqueue(turn):
+            await asyncio.to_thread(self._write_sync, turn)
+
+    def _make_turn(self, conversation_id, question, answer, sources, invoke_result,
+                   default_session_id, question_timestamp, on_written) -> Dict[str, Any]:
+        return {
+            "conversation_id": conversation_id,
+            "messages": [
+                {"role": "user", "content": question, "sources": None, "timestamp": question_timestamp},
+                {"role": "assistant", "content": answer, "sources": sources, "timestamp": datetime.utcnow()},
+            ],
+            "invoke_result": invoke_result,
+            "default_session_id": default_session_id,
+            "question": question,
+            "on_written": on_written,
+        }
+
+    def _try_enqueue(self, turn: Dict[str, Any]) -> bool:
+        """Met le tour en file ; False s'il doit être écrit immédiatement (thread arrêté ou file pleine)"""
+        self.stats["enqueued"] += 1
+        if self.thread is None or not self.thread.is_alive():
+            return False
+        with self._pending_lock:
+            self._pending.setdefault(turn["conversation_id"], []).extend(turn["messages"])
+        try:
+            self._queue.put_nowait(turn)
+        except queue.Full:
+            cp.print_warning("[WriteBehind] File pleine : écriture synchrone")
+            self._forget_pending([turn])
+            return False
+        return True
+
+    def pending_messages(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Messages de la conversation encore en file (pas encore visibles en base)"""
+        with self._pending_lock:
+            return list(self._pending.get(conversation_id, []))
+
+    def _forget_pending(self, turns: List[Dict[str, Any]]):
+        with self._pending_lock:
+            for turn in turns:
+                written = {id(message) for message in turn["messages"]}
+                messages = [m for m in self._pending.get(turn["conversation_id"], []) if id(m) not in written]
+                self._pending[turn["conversation_id"]] = messages
+                if not messages:
+                    self._pending.pop(turn["conversation_id"], None)
+
+    # ---------- Écriture ----------
+
+    def _write_sync(self, turn: Dict[str, Any]):
+        self.stats["sync_writes"] += 1
+        self._write_batch([turn])
+
+    def _rows_for_turn(self, turn: Dict[str, Any]) -> List[Any]:
+        rows = [
+            Message(
+                conversation_id=turn["conversation_id"],
+                role=message["role"],
+                content=message["content"],
+                sources=_json_sources(message["sources"]),
+                timestamp=message["timestamp"],
+            )
+            for message in turn["messages"]
+        ]
+        if turn["invoke_result"] is not None:
+            rows += build_rag_conversation_rows(turn["invoke_result"], turn["conversation_id"],
+                                                turn["default_session_id"], turn["question"])
+        return rows
+
+    def _commit_turns(self, turns: List[Dict[str, Any]]):
+        """Écrit des tours en une transaction, avec nouvelles tentatives si la base est verrouillée (lève l'erreur sinon)"""
+        for attempt in range(WRITE_BEHIND_MAX_RETRIES + 1):
+            try:
+                with Session(engine) as session:
+                    turn_rows = [self._rows_for_turn(turn) for turn in turns]
+                    for rows in turn_rows:
+                        session.add_all(rows)
+                    with metrics.DB_COMMIT_SECONDS.labels(component="write_behind").time():
+                        session.flush()  # ids des messages, lus avant que commit n'expire les objets
+                        message_ids = [[row.id for row in rows[:len(turn["messages"])]] for turn, rows in zip(turns, turn_rows)]
+                        session.commit()
+                # Retirés de la file dès la validation, avant les listeners : une fenêtre d'historique
+                # relue maintenant ne voit plus ces messages à la fois en base et en attente
+                self._forget_pending(turns)
+                for turn, ids in zip(turns, message_ids):
+                    turn["message_ids"] = ids
+                return
+            except OperationalError as e:
+                if not _is_lock_error(e) or attempt == WRITE_BEHIND_MAX_RETRIES:
+                    raise
+                self.stats["retries"] += 1
+                metrics.DB_LOCK_RETRIES.labels(component="write_behind").inc()
+                time.sleep(0.05 * 2 ** attempt)
+
+    def _write_batch(self, turns: List[Dict[str, Any]]):
+        """
+        Écrit un lot en une transaction. Si le lot échoue, chaque tour est réécrit dans sa propre
+        transaction : seul un tour qui échoue seul est perdu (un tour invalide ne fait pas perdre le lot).
+        """
+        self.stats["batches"] += 1
+        try:
+            self._commit_turns(turns)
+        except Exception as e:
+            if len(turns) == 1:
+                self._turn_failed(turns[0], e)
+                return
+            cp.print_warning(f"[WriteBehind] Échec du lot de {len(turns)} tours ({e}) : écriture tour par tour")
+            for turn in turns:
+                try:
+                    self._commit_turns([turn])
+                except Exception as turn_error:
+                    self._turn_failed(turn, turn_error)
+                else:
+                    self._turns_written([turn])
+            return
+        self._turns_written(turns)
+
+    def _turn_failed(self, turn: Dict[str, Any], error: Exception):
+        self._forget_pending([turn])
+        self.stats["failed"] += 1
+        cp.print_error(
+            f"[WriteBehind] Tour perdu (conversation {turn['conversation_id']}, "
+            f"session {turn['default_session_id']}): {error}"
+        )
+
+    def _turns_written(self, turns: List[Dict[str, Any]]):
+        self.stats["written"] += len(turns)
+        for turn in turns:
+            messages = [
+                {"id": message_id, "role": message["role"], "content": message["content"]}
+                for message_id, message in zip(turn["message_ids"], turn["messages"])
+            ]
+            for listener in self._written_listeners:
+                try:
+                    listener(turn["conversation_id"], messages)
+                except Exception as e:
+                    cp.print_warning(f"[WriteBehind] Listener {getattr(listener, '__name__', listener)} en erreur: {e}")
+            if turn["on_written"] is not None:
+                try:
+                    turn["on_written"]()
+                except Exception as e:
+                    cp.print_warning(f"[WriteBehind] Callback après écriture en erreur: {e}")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            # Complète le lot avec les tours arrivés pendant l'intervalle
+            deadline = time.monotonic() + WRITE_BEHIND_FLUSH_INTERVAL
+            while len(batch) < WRITE_BEHIND_BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+
+        # Arrêt : les tours restants sont écrits avant de rendre la main
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), WRITE_BEHIND_BATCH_SIZE):
+            batch = remaining[start:start + WRITE_BEHIND_BATCH_SIZE]
+            self._write_batch(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques de l'écriture différée"""
+        return {
+            **self.stats,
+            "enabled": WRITE_BEHIND_ENABLED,
+            "running": bool(self.thread and self.thread.is_alive()),
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": WRITE_BEHIND_QUEUE_SIZE,
+        }
+
+# Instance globale
+write_behind = WriteBehindWriter()
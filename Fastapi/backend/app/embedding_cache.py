@@ -0,0 +1,229 @@
+"""
+Cache des embeddings OpenAI (requêtes de recherche et documents de vectorisation)
+LRU en mémoire par processus + niveau Redis optionnel partagé entre les workers
+"""
+
+import os
+import re
+import base64
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+from .redis_client import get_redis, get_async_redis, redis_available, mark_redis_unavailable
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+EMBEDDING_CACHE_QUERY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_QUERY_ENTRIES", "2048"))
+EMBEDDING_CACHE_DOCUMENT_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DOCUMENT_ENTRIES", "5000"))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+EMBEDDING_CACHE_REDIS_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_REDIS_TTL_SECONDS", str(7 * 86400)))
+EMBEDDING_CACHE_PREFIX = "polybot:embedding"
+
+def normalize_text(text: str) -> str:
+    """Forme Unicode NFC et espaces normalisés (la casse et les accents changent l'embedding)"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+class _LRU:
+    """LRU thread-safe de vecteurs float32"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe d'un modèle d'embeddings LangChain avec cache.
+    Les requêtes et les documents ont chacun leur LRU (une vectorisation ne chasse pas les requêtes
+    récentes), mais une même clé (modèle + texte normalisé) est cherchée dans les deux.
+    """
+
+    def __init__(self, underlying: Embeddings, query_entries: int = EMBEDDING_CACHE_QUERY_ENTRIES,
+                 document_entries: int = EMBEDDING_CACHE_DOCUMENT_ENTRIES, use_redis: bool = EMBEDDING_CACHE_REDIS):
+        self.underlying = underlying
+        self.model = getattr(underlying, "model", type(underlying).__name__)
+        self.use_redis = use_redis
+        self._queries = _LRU(query_entries)
+        self._documents = _LRU(document_entries)
+        self._stats_lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    # ---------- Clés et statistiques ----------
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, value: int = 1):
+        if value:
+            with self._stats_lock:
+                self._stats[name] += value
+            if name != "redis_errors":
+                metrics.CACHE_LOOKUPS.labels(cache="embedding", result="miss" if name == "misses" else "hit").inc(value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["lru_hits"] + stats["redis_hits"] + stats["misses"]
+        return {
+            **stats,
+            "model": self.model,
+            "redis_enabled": self.use_redis,
+            "query_entries": len(self._queries),
+            "document_entries": len(self._documents),
+            "hit_rate": (stats["lru_hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        }
+
+    # ---------- Niveaux de cache ----------
+
+    def _lru_get(self, key: str) -> Optional[np.ndarray]:
+        vector = self._queries.get(key)
+        return vector if vector is not None else self._documents.get(key)
+
+    @staticmethod
+    def _encode(vector: np.ndarray) -> str:
+        return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode(raw: str) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(raw), dtype=np.float32)
+
+    def _redis_enabled(self) -> bool:
+        return self.use_redis and redis_available()
+
+    def _redis_error(self, e: Exception):
+        self._count("redis_errors")
+        mark_redis_unavailable(e)
+
+    def _redis_get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        if not keys or not self._redis_enabled():
+            return [None] * len(keys)
+        try:
+            raws = get_redis().mget([f"{EMBEDDING_CACHE_PREFIX}:{key}" for key in keys])
+        except Exception as e:
+            self._redis_error(e)
+            return [None] * len(keys)
+        return [self._decode(raw) if raw else None for raw in raws]
+
+    async def _aredis_get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        if not keys or not self._redis_enabled():
+            return [None] * len(keys)
+        try:
+            raws = await get_async_redis().mget([f"{EMBEDDING_CACHE_PREFIX}:{key}" for key in keys])
+        except Exception as e:
+            self._redis_error(e)
+            return [None] * len(keys)
+        return [self._decode(raw) if raw else None for raw in raws]
+
+    def _redis_set_many(self, items: Dict[str, np.ndarray]):
+        if not items or not self._redis_enabled():
+            return
+        try:
+            with get_redis().pipeline() as pipe:
+                for key, vector in items.items():
+                    pipe.set(f"{EMBEDDING_CACHE_PREFIX}:{key}", self._encode(vector), ex=EMBEDDING_CACHE_REDIS_TTL_SECONDS)
+                pipe.execute()
+        except Exception as e:
+            self._redis_error(e)
+
+    async def _aredis_set_many(self, items: Dict[str, np.ndarray]):
+        if not items or not self._redis_enabled():
+            return
+        try:
+            async with get_async_redis().pipeline() as pipe:
+                for key, vector in items.items():
+                    pipe.set(f"{EMBEDDING_CACHE_PREFIX}:{key}", self._encode(vector), ex=EMBEDDING_CACHE_REDIS_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            self._redis_error(e)
+
+    # ---------- Résolution commune ----------
+
+    def _from_lru(self, texts: List[str]):
+        """Retourne (clés, vecteurs trouvés en mémoire, indices manquants)"""
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self._lru_get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self._count("lru_hits", len(texts) - len(missing))
+        return keys, vectors, missing
+
+    def _fill(self, lru: _LRU, keys, vectors, indices, found) -> List[int]:
+        """Place les vecteurs trouvés (Redis) et retourne les indices encore manquants"""
+        still_missing = []
+        for i, vector in zip(indices, found):
+            if vector is None:
+                still_missing.append(i)
+            else:
+                vectors[i] = vector
+                lru.put(keys[i], vector)
+        self._count("redis_hits", len(indices) - len(still_missing))
+        return still_missing
+
+    def _store(self, lru: _LRU, keys, vectors, indices, embedded) -> Dict[str, np.ndarray]:
+        """Place les vecteurs calculés et retourne ceux à écrire dans Redis"""
+        self._count("misses", len(indices))
+        new_items = {}
+        for i, vector in zip(indices, embedded):
+            vector = np.asarray(vector, dtype=np.float32)
+            vectors[i] = vector
+            lru.put(keys[i], vector)
+            new_items[keys[i]] = vector
+        return new_items
+
+    def _resolve(self, texts: List[str], lru: _LRU, embed) -> List[List[float]]:
+        keys, vectors, missing = self._from_lru(texts)
+        missing = self._fill(lru, keys, vectors, missing, self._redis_get_many([keys[i] for i in missing]))
+        if missing:
+            embedded = embed([texts[i] for i in missing])
+            self._redis_set_many(self._store(lru, keys, vectors, missing, embedded))
+        return [vector.tolist() for vector in vectors]
+
+    async def _aresolve(self, texts: List[str], lru: _LRU, aembed) -> List[List[float]]:
+        keys, vectors, missing = self._from_lru(texts)
+        missing = self._fill(lru, keys, vectors, missing, await self._aredis_get_many([keys[i] for i in missing]))
+        if missing:
+            embedded = await aembed([texts[i] for i in missing])
+            await self._aredis_set_many(self._store(lru, keys, vectors, missing, embedded))
+        return [vector.tolist() for vector in vectors]
+
+    # ---------- Interface Embeddings ----------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._resolve(texts, self._documents, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._resolve([text], self._queries, lambda missing: [self.underlying.embed_query(missing[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aresolve(texts, self._documents, self.underlying.aembed_documents)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def aembed(missing):
+            return [await self.underlying.aembed_query(missing[0])]
+        return (await self._aresolve([text], self._queries, aembed))[0]
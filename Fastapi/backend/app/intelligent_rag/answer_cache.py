@@ -0,0 +1,133 @@
+"""
+Intelligent RAG System - Answer Cache
+Intégration au graphe des caches de réponses : mémoïsation exacte partagée (Redis)
+puis cache sémantique local au worker
+"""
+
+from typing import Dict, Any, List, Optional
+
+from . import exact_cache
+from .. import metrics
+from .semantic_cache import semantic_cache
+from .state import IntelligentRAGState
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+def cache_text_for_state(state: Dict[str, Any]) -> str:
+    """Texte servant de clé : la question reformulée si disponible, sinon la question brute"""
+    intent_analysis = state.get("intent_analysis") or {}
+    return intent_analysis.get("reformulation") or state["input_question"]
+
+def cached_state_update(state: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Mise à jour de l'état du graphe à partir d'une entrée de cache"""
+    cp.print_success(f"[AnswerCache] Réponse trouvée en cache (similarité {entry['similarity']:.3f})")
+    update = {
+        "answer": entry["answer"],
+        "sources": entry["sources"],
+        "context": entry["context"],
+        "cache_hit": True,
+        "processing_steps": state.get("processing_steps", []) + [f"Answer cache hit ({entry['similarity']:.3f})"]
+    }
+    if not state.get("intent_analysis"):
+        update["intent_analysis"] = entry["intent_analysis"]
+    return update
+
+def lookup_answer(text: str, question: Optional[str] = None,
+                  intent_analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Cherche une réponse : correspondance exacte (tous workers) puis similarité sémantique
+    (même spécialité, semestre et code de cours ; voir SemanticAnswerCache.lookup)
+    """
+    try:
+        entry = exact_cache.get_answer(text) or semantic_cache.lookup(text, question, intent_analysis)
+    except Exception as e:
+        cp.print_warning(f"[AnswerCache] Recherche impossible: {e}")
+        return None
+    metrics.record_cache_lookup("answer", entry is not None)
+    return entry
+
+async def alookup_answer(text: str, question: Optional[str] = None,
+                         intent_analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Version asynchrone de lookup_answer"""
+    try:
+        entry = await exact_cache.aget_answer(text) or await semantic_cache.alookup(text, question, intent_analysis)
+    except Exception as e:
+        cp.print_warning(f"[AnswerCache] Recherche impossible: {e}")
+        return None
+    metrics.record_cache_lookup("answer", entry is not None)
+    return entry
+
+# ================================
+# NŒUD DU GRAPHE
+# ================================
+
+def _lookup_skipped(state: IntelligentRAGState) -> Optional[Dict[str, Any]]:
+    """Retourne la mise à jour de l'état si la recherche en cache est inutile, None sinon"""
+    if not semantic_cache.is_cacheable(state.get("intent_analysis")):
+        return {"processing_steps": state.get("processing_steps", []) + ["Answer cache skipped"]}
+    if cache_text_for_state(state) == state.get("cache_checked_text"):
+        # Même texte que la recherche faite avant l'analyse d'intention
+        return {"processing_steps": state.get("processing_steps", []) + ["Answer cache miss"]}
+    return None
+
+def answer_cache_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Cherche une réponse en cache pour la question reformulée (après l'analyse d'intention)
+    """
+    skipped = _lookup_skipped(state)
+    if skipped is not None:
+        return skipped
+    entry = lookup_answer(cache_text_for_state(state), state["input_question"], state.get("intent_analysis"))
+    if entry is None:
+        return {"processing_steps": state.get("processing_steps", []) + ["Answer cache miss"]}
+    return cached_state_update(state, entry)
+
+async def aanswer_cache_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Version asynchrone de answer_cache_node
+    """
+    skipped = _lookup_skipped(state)
+    if skipped is not None:
+        return skipped
+    entry = await alookup_answer(cache_text_for_state(state), state["input_question"], state.get("intent_analysis"))
+    if entry is None:
+        return {"processing_steps": state.get("processing_steps", []) + ["Answer cache miss"]}
+    return cached_state_update(state, entry)
+
+# ================================
+# STOCKAGE
+# ================================
+
+def _should_store(result: Dict[str, Any]) -> bool:
+    return (
+        not result.get("cache_hit")
+        and result.get("error") is None
+        and bool(result.get("answer"))
+        and semantic_cache.is_cacheable(result.get("intent_analysis"))
+    )
+
+def _exact_keys(result: Dict[str, Any]) -> List[str]:
+    """Formulations sous lesquelles la réponse est mémorisée (question brute et reformulation)"""
+    return [result["input_question"], cache_text_for_state(result)]
+
+def store_result(result: Dict[str, Any]):
+    """Met en cache le résultat final d'une exécution du graphe s'il est réutilisable"""
+    if not _should_store(result):
+        return
+    try:
+        exact_cache.set_answer(_exact_keys(result), result)
+        semantic_cache.store(cache_text_for_state(result), result)
+    except Exception as e:
+        cp.print_warning(f"[AnswerCache] Stockage impossible: {e}")
+
+async def astore_result(result: Dict[str, Any]):
+    """Version asynchrone de store_result"""
+    if not _should_store(result):
+        return
+    try:
+        await exact_cache.aset_answer(_exact_keys(result), result)
+        await semantic_cache.astore(cache_text_for_state(result), result)
+    except Exception as e:
+        cp.print_warning(f"[AnswerCache] Stockage impossible: {e}")
@@ -0,0 +1,176 @@
+"""
+Intelligent RAG System - Context Packer
+Construit le contexte envoyé au LLM : fusion des chunks adjacents d'une même source
+(suppression du chevauchement du splitter), comptage des tokens et budget par intention
+"""
+
+import os
+from typing import Dict, Any, List, Optional
+
+from .state import IntentType
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Configuration (variables d'environnement)
+CONTEXT_TOKENIZER_MODEL = os.getenv("CONTEXT_TOKENIZER_MODEL", "gpt-4o-mini")
+CONTEXT_BUDGETS = {
+    IntentType.RAG_NEEDED: int(os.getenv("CONTEXT_BUDGET_RAG_NEEDED", "2000")),
+    IntentType.SYLLABUS_SPECIFIC_COURSE: int(os.getenv("CONTEXT_BUDGET_SPECIFIC_COURSE", "2000")),
+    IntentType.SYLLABUS_SPECIALITY_OVERVIEW: int(os.getenv("CONTEXT_BUDGET_SPECIALITY_OVERVIEW", "4000")),
+}
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET_DEFAULT", "2000"))
+
+# Chevauchement maximal recherché entre deux chunks consécutifs (CHUNK_OVERLAP de la vectorisation)
+MAX_OVERLAP_CHARS = int(os.getenv("CONTEXT_MAX_OVERLAP_CHARS", "300"))
+# En dessous, une coïncidence entre fin et début de chunk n'est pas considérée comme un chevauchement
+MIN_OVERLAP_CHARS = 20
+
+SEPARATOR = "\n\n"
+
+# ================================
+# COMPTAGE DES TOKENS
+# ================================
+
+def _load_encoding():
+    if not TIKTOKEN_AVAILABLE:
+        cp.print_warning("[ContextPacker] tiktoken non installé : estimation à 4 caractères par token")
+        return None
+    try:
+        return tiktoken.encoding_for_model(CONTEXT_TOKENIZER_MODEL)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            cp.print_warning(f"[ContextPacker] Encodage tiktoken indisponible ({e}) : estimation à 4 caractères par token")
+            return None
+
+_encoding = _load_encoding()
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens du texte pour le modèle de génération (estimation si tiktoken est absent)"""
+    if _encoding is None:
+        return len(text) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if _encoding is None:
+        return text[:max_tokens * 4]
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+
+def budget_for_intent(intent: Optional[IntentType]) -> int:
+    """Budget de tokens du contexte pour une intention"""
+    return CONTEXT_BUDGETS.get(intent, DEFAULT_CONTEXT_BUDGET)
+
+# ================================
+# FUSION DES CHUNKS ADJACENTS
+# ================================
+
+def _source_key(metadata: Dict[str, Any]) -> Optional[str]:
+    return metadata.get("source.chemin_local") or metadata.get("source.url")
+
+def _chunk_index(metadata: Dict[str, Any]) -> Optional[int]:
+    value = metadata.get("chunk_index")
+    return value if isinstance(value, int) else None
+
+def strip_overlap(previous: str, current: str) -> str:
+    """Retire du début de `current` le texte déjà présent à la fin de `previous`"""
+    longest = min(len(previous), len(current), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:size]):
+            return current[size:].lstrip()
+    return current
+
+def _merge_groups(docs: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Regroupe les chunks consécutifs (chunk_index n, n+1, ...) d'une même source.
+    Chaque groupe garde le rang de son meilleur chunk ; les doublons exacts sont ignorés.
+    """
+    groups: List[Dict[str, Any]] = []
+    seen_contents = set()
+    by_position: Dict[tuple, Dict[str, Any]] = {}
+
+    for rank, doc in enumerate(docs):
+        if doc.page_content in seen_contents:
+            continue
+        seen_contents.add(doc.page_content)
+        group = {"rank": rank, "docs": [doc]}
+        groups.append(group)
+        source, index = _source_key(doc.metadata), _chunk_index(doc.metadata)
+        if source is not None and index is not None:
+            by_position[(source, index)] = group
+
+    # Fusion des voisins : le groupe du chunk n absorbe celui du chunk n+1
+    for (source, index) in sorted(by_position):
+        group = by_position[(source, index)]
+        following = by_position.get((source, index + 1))
+        if following is None or following is group:
+            continue
+        group["docs"].extend(following["docs"])
+        group["rank"] = min(group["rank"], following["rank"])
+        following["docs"] = []
+        for position, candidate in by_position.items():
+            if candidate is following:
+                by_position[position] = group
+
+    merged = []
+    for group in sorted((g for g in groups if g["docs"]), key=lambda g: g["rank"]):
+        text = group["docs"][0].page_content
+        for doc in group["docs"][1:]:
+            text += "\n" + strip_overlap(text, doc.page_content)
+        merged.append({"text": text, "docs": group["docs"]})
+    return merged
+
+# ================================
+# EMBALLAGE DU CONTEXTE
+# ================================
+
+def pack_context(docs: List[Any], intent: Optional[IntentType] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Remplit le budget de tokens avec les documents, dans leur ordre de pertinence.
+
+    Args:
+        docs: Documents classés par pertinence décroissante
+        intent: Intention détectée (choisit le budget)
+        max_tokens: Budget explicite (prioritaire sur celui de l'intention)
+
+    Returns:
+        dict: {"text", "docs" (documents effectivement inclus), "tokens", "budget", "chunks_in", "chunks_used"}
+    """
+    budget = max_tokens if max_tokens is not None else budget_for_intent(intent)
+    separator_tokens = count_tokens(SEPARATOR)
+
+    parts: List[str] = []
+    used_docs: List[Any] = []
+    tokens = 0
+    for group in _merge_groups(docs):
+        group_tokens = count_tokens(group["text"])
+        cost = group_tokens + (separator_tokens if parts else 0)
+        if tokens + cost <= budget:
+            parts.append(group["text"])
+            used_docs.extend(group["docs"])
+            tokens += cost
+        elif not parts:
+            # Le document le plus pertinent dépasse seul le budget : il est tronqué plutôt qu'écarté
+            parts.append(_truncate_to_tokens(group["text"], budget))
+            used_docs.extend(group["docs"])
+            tokens = budget
+        # Sinon le groupe est ignoré : un groupe moins pertinent mais plus court peut encore tenir
+
+    packed = {
+        "text": SEPARATOR.join(parts),
+        "docs": used_docs,
+        "tokens": tokens,
+        "budget": budget,
+        "chunks_in": len(docs),
+        "chunks_used": len(used_docs)
+    }
+    cp.print_debug(f"[ContextPacker] {packed['chunks_used']}/{packed['chunks_in']} chunks, {tokens}/{budget} tokens")
+    return packed
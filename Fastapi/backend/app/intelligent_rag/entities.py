@@ -0,0 +1,69 @@
+"""
+Intelligent RAG System - Entities
+Entités qui distinguent deux questions presque identiques : spécialité, code de cours et semestre.
+Partagées par la classification d'intention, les filtres de récupération et le cache sémantique
+"""
+
+import re
+from typing import Dict, Any, FrozenSet, Optional, Set
+
+from .exact_cache import normalize_question
+from .state import SpecialityType
+
+# Noms complets des spécialités (texte normalisé)
+SPECIALITY_NAMES = {
+    SpecialityType.AGRAL: ["agroalimentaire", "agral"],
+    SpecialityType.EISE: ["systemes embarques", "eise"],
+    SpecialityType.EI2I: ["informatique industrielle", "ei2i"],
+    SpecialityType.GM: ["genie mecanique"],
+    SpecialityType.MAIN: ["mathematiques appliquees", "maths appliquees"],
+    SpecialityType.MTX: ["materiaux", "mtx"],
+    SpecialityType.ROB: ["robotique", "rob"],
+    SpecialityType.ST: ["sciences de la terre"],
+}
+# Codes ambigus en minuscules ("main", "st", "gm") : reconnus seulement en majuscules dans la question brute
+SPECIALITY_UPPERCASE_CODES = {
+    SpecialityType.GM: "GM",
+    SpecialityType.MAIN: "MAIN",
+    SpecialityType.ST: "ST",
+}
+
+# Codes de cours et semestres (aussi poussés dans la clause `where` de Chroma)
+COURSE_CODE_PATTERN = re.compile(r"\bEPU-[A-Z]\d-[A-Z0-9]+\b", re.IGNORECASE)
+SEMESTER_PATTERN = re.compile(r"\b(?:semestre\s*|S)(\d{1,2})\b", re.IGNORECASE)
+
+def find_specialities(question: str) -> Set[SpecialityType]:
+    """Toutes les spécialités citées dans la question"""
+    normalized = normalize_question(question)
+    found = {
+        speciality
+        for speciality, names in SPECIALITY_NAMES.items()
+        if any(re.search(rf"\b{re.escape(name)}\b", normalized) for name in names)
+    }
+    found |= {
+        speciality
+        for speciality, code in SPECIALITY_UPPERCASE_CODES.items()
+        if re.search(rf"\b{code}\b", question)
+    }
+    return found
+
+def question_entities(*texts: str) -> Dict[str, FrozenSet]:
+    """Spécialités, codes de cours et semestres cités dans les textes (question brute, reformulation)"""
+    texts = [text for text in texts if text]
+    return {
+        "specialities": frozenset(speciality.value for text in texts for speciality in find_specialities(text)),
+        "course_codes": frozenset(code.upper() for text in texts for code in COURSE_CODE_PATTERN.findall(text)),
+        "semesters": frozenset(int(semester) for text in texts for semester in SEMESTER_PATTERN.findall(text)),
+    }
+
+def intent_entities(intent_analysis: Optional[Dict[str, Any]]) -> Optional[Dict[str, Optional[str]]]:
+    """Spécialité et cours retenus par l'analyse d'intention (None si l'analyse n'est pas encore faite)"""
+    if not intent_analysis:
+        return None
+    speciality = intent_analysis.get("speciality")
+    speciality = SpecialityType(speciality).value if speciality else None
+    course_name = intent_analysis.get("course_name")
+    return {
+        "speciality": None if speciality == SpecialityType.GENERAL.value else speciality,
+        "course_name": normalize_question(course_name) if course_name else None,
+    }
@@ -0,0 +1,260 @@
+"""
+Intelligent RAG System - Exact-Match Cache (Redis)
+Mémoïsation partagée entre les workers de l'analyse d'intention et des réponses,
+indexée par la question normalisée (accents, casse, espaces) et l'historique utile
+"""
+
+import os
+import json
+import hashlib
+import unicodedata
+import re
+from typing import Dict, Any, List, Optional
+
+from langchain_core.documents import Document
+
+from .. import llmm, metrics
+from ..redis_client import get_redis, get_async_redis, redis_available, mark_redis_unavailable
+from .state import IntentAnalysisResult, IntentType, SpecialityType
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+EXACT_CACHE_ENABLED = os.getenv("EXACT_CACHE_ENABLED", "true").lower() == "true"
+EXACT_CACHE_TTL_SECONDS = int(os.getenv("EXACT_CACHE_TTL_SECONDS", "86400"))
+EXACT_CACHE_PREFIX = os.getenv("EXACT_CACHE_PREFIX", "polybot:rag")
+
+# Fenêtre d'historique prise en compte par l'analyse d'intention (voir _build_intent_prompt)
+INTENT_HISTORY_WINDOW = 6
+
+# Clé du compteur de génération : incrémenté à chaque changement de vectorstore,
+# il rend obsolètes les réponses mémorisées par tous les workers
+GENERATION_KEY = f"{EXACT_CACHE_PREFIX}:generation"
+
+# Compteurs locaux au worker
+_stats = {
+    "intent_hits": 0,
+    "intent_misses": 0,
+    "answer_hits": 0,
+    "answer_misses": 0,
+    "stores": 0,
+    "errors": 0
+}
+
+# ================================
+# NORMALISATION ET CLÉS
+# ================================
+
+def normalize_question(question: str) -> str:
+    """Supprime les accents, la casse, les espaces multiples et la ponctuation finale"""
+    text = unicodedata.normalize("NFKD", question)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    return text.rstrip(" ?!.")
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def history_hash(chat_history: Optional[List[Dict[str, str]]], summary: Optional[str] = None) -> str:
+    """Empreinte de la fenêtre d'historique (et du résumé de conversation) vue par l'analyse d'intention"""
+    if not chat_history and not summary:
+        return "nohist"
+    window = [["summary", summary]] if summary else []
+    window += [[msg.get("role", ""), normalize_question(msg.get("content", ""))] for msg in (chat_history or [])[-INTENT_HISTORY_WINDOW:]]
+    return _digest(json.dumps(window, ensure_ascii=False))[:16]
+
+def _intent_key(question: str, chat_history, summary: Optional[str] = None) -> str:
+    return f"{EXACT_CACHE_PREFIX}:intent:{_digest(normalize_question(question))}:{history_hash(chat_history, summary)}"
+
+def _answer_key(question: str, generation: str) -> str:
+    return f"{EXACT_CACHE_PREFIX}:answer:{generation}:{_digest(normalize_question(question))}"
+
+# ================================
+# SÉRIALISATION
+# ================================
+
+def _dump_intent(intent_analysis: Dict[str, Any]) -> str:
+    return json.dumps(dict(intent_analysis), ensure_ascii=False)
+
+def _load_intent(raw: str) -> IntentAnalysisResult:
+    data = json.loads(raw)
+    return IntentAnalysisResult(
+        intent=IntentType(data["intent"]),
+        speciality=SpecialityType(data["speciality"]) if data.get("speciality") else None,
+        confidence=data.get("confidence", 0.8),
+        reasoning=data.get("reasoning", ""),
+        needs_history=data.get("needs_history", False),
+        course_name=data.get("course_name"),
+        reformulation=data.get("reformulation")
+    )
+
+def _dump_answer(result: Dict[str, Any]) -> str:
+    return json.dumps({
+        "answer": result.get("answer", ""),
+        "sources": result.get("sources", []),
+        "context": [
+            {"page_content": doc.page_content, "metadata": doc.metadata}
+            for doc in result.get("context") or [] if hasattr(doc, "page_content")
+        ],
+        "intent_analysis": dict(result["intent_analysis"]) if result.get("intent_analysis") else None
+    }, ensure_ascii=False)
+
+def _load_answer(raw: str) -> Dict[str, Any]:
+    data = json.loads(raw)
+    return {
+        "answer": data["answer"],
+        "sources": data["sources"],
+        "context": [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in data["context"]],
+        "intent_analysis": _load_intent(json.dumps(data["intent_analysis"])) if data.get("intent_analysis") else None,
+        "similarity": 1.0
+    }
+
+def _enabled() -> bool:
+    return EXACT_CACHE_ENABLED and redis_available()
+
+def _on_error(e: Exception):
+    _stats["errors"] += 1
+    mark_redis_unavailable(e)
+
+# ================================
+# MÉMOÏSATION DE L'ANALYSE D'INTENTION
+# ================================
+
+def get_intent(question: str, chat_history, summary: Optional[str] = None) -> Optional[IntentAnalysisResult]:
+    """Analyse d'intention mémorisée pour cette question et cet historique (None si absente)"""
+    if not _enabled():
+        return None
+    try:
+        raw = get_redis().get(_intent_key(question, chat_history, summary))
+    except Exception as e:
+        _on_error(e)
+        return None
+    _stats["intent_hits" if raw else "intent_misses"] += 1
+    metrics.record_cache_lookup("intent", bool(raw))
+    return _load_intent(raw) if raw else None
+
+async def aget_intent(question: str, chat_history, summary: Optional[str] = None) -> Optional[IntentAnalysisResult]:
+    """Version asynchrone de get_intent"""
+    if not _enabled():
+        return None
+    try:
+        raw = await get_async_redis().get(_intent_key(question, chat_history, summary))
+    except Exception as e:
+        _on_error(e)
+        return None
+    _stats["intent_hits" if raw else "intent_misses"] += 1
+    metrics.record_cache_lookup("intent", bool(raw))
+    return _load_intent(raw) if raw else None
+
+def set_intent(question: str, chat_history, intent_analysis: Dict[str, Any], summary: Optional[str] = None):
+    """Mémorise une analyse d'intention"""
+    if not _enabled():
+        return
+    try:
+        get_redis().set(_intent_key(question, chat_history, summary), _dump_intent(intent_analysis), ex=EXACT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        _on_error(e)
+
+async def aset_intent(question: str, chat_history, intent_analysis: Dict[str, Any], summary: Optional[str] = None):
+    """Version asynchrone de set_intent"""
+    if not _enabled():
+        return
+    try:
+        await get_async_redis().set(_intent_key(question, chat_history, summary), _dump_intent(intent_analysis), ex=EXACT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        _on_error(e)
+
+# ================================
+# MÉMOÏSATION DES RÉPONSES
+# ================================
+
+def get_answer(question: str) -> Optional[Dict[str, Any]]:
+    """
+    Réponse mémorisée pour une question indépendante de l'historique
+    (même format que les entrées du cache sémantique)
+    """
+    if not _enabled():
+        return None
+    try:
+        client = get_redis()
+        generation = client.get(GENERATION_KEY) or "0"
+        raw = client.get(_answer_key(question, generation))
+    except Exception as e:
+        _on_error(e)
+        return None
+    _stats["answer_hits" if raw else "answer_misses"] += 1
+    return _load_answer(raw) if raw else None
+
+async def aget_answer(question: str) -> Optional[Dict[str, Any]]:
+    """Version asynchrone de get_answer"""
+    if not _enabled():
+        return None
+    try:
+        client = get_async_redis()
+        generation = await client.get(GENERATION_KEY) or "0"
+        raw = await client.get(_answer_key(question, generation))
+    except Exception as e:
+        _on_error(e)
+        return None
+    _stats["answer_hits" if raw else "answer_misses"] += 1
+    return _load_answer(raw) if raw else None
+
+def set_answer(questions: List[str], result: Dict[str, Any]):
+    """Mémorise une réponse sous chacune des formulations données (question brute, reformulation)"""
+    if not _enabled():
+        return
+    try:
+        client = get_redis()
+        generation = client.get(GENERATION_KEY) or "0"
+        payload = _dump_answer(result)
+        with client.pipeline() as pipe:
+            for question in set(questions):
+                pipe.set(_answer_key(question, generation), payload, ex=EXACT_CACHE_TTL_SECONDS)
+            pipe.execute()
+        _stats["stores"] += 1
+    except Exception as e:
+        _on_error(e)
+
+async def aset_answer(questions: List[str], result: Dict[str, Any]):
+    """Version asynchrone de set_answer"""
+    if not _enabled():
+        return
+    try:
+        client = get_async_redis()
+        generation = await client.get(GENERATION_KEY) or "0"
+        payload = _dump_answer(result)
+        async with client.pipeline() as pipe:
+            for question in set(questions):
+                pipe.set(_answer_key(question, generation), payload, ex=EXACT_CACHE_TTL_SECONDS)
+            await pipe.execute()
+        _stats["stores"] += 1
+    except Exception as e:
+        _on_error(e)
+
+def invalidate_answers(reason: str = "manual"):
+    """Rend obsolètes les réponses mémorisées de tous les workers (les clés expirent d'elles-mêmes)"""
+    if not EXACT_CACHE_ENABLED:
+        return
+    try:
+        generation = get_redis().incr(GENERATION_KEY)
+        cp.print_info(f"[ExactCache] Réponses invalidées ({reason}), génération {generation}")
+    except Exception as e:
+        _on_error(e)
+
+def get_stats() -> Dict[str, Any]:
+    """Statistiques du cache exact (locales au worker)"""
+    intent_lookups = _stats["intent_hits"] + _stats["intent_misses"]
+    answer_lookups = _stats["answer_hits"] + _stats["answer_misses"]
+    return {
+        **_stats,
+        "enabled": EXACT_CACHE_ENABLED,
+        "redis_available": redis_available(),
+        "ttl_seconds": EXACT_CACHE_TTL_SECONDS,
+        "intent_hit_rate": _stats["intent_hits"] / intent_lookups if intent_lookups else 0.0,
+        "answer_hit_rate": _stats["answer_hits"] / answer_lookups if answer_lookups else 0.0
+    }
+
+# Un nouveau vectorstore rend les réponses mémorisées potentiellement obsolètes
+llmm.register_vectorstore_listener(lambda _db: invalidate_answers("vectorstore_swap"))
@@ -4,34 +4,62 @@ Intelligent RAG System - Graph Builder
 
 import time
 import uuid
+import threading
 import traceback
-from langgraph.graph import StateGraph
+from typing import AsyncIterator, Dict, Any, List, Optional
+from langgraph.graph import StateGraph, END
 from .state import IntelligentRAGState, IntentType, INPUT_TOKEN_COST, OUTPUT_TOKEN_COST
 from .state import TokenCostTrackerState
 from .nodes import (
     intent_analysis_node,
     direct_answer_node,
     document_retrieval_node,
-    rag_generation_node
+    rag_generation_node,
+    aintent_analysis_node,
+    adirect_answer_node,
+    adocument_retrieval_node,
+    arag_generation_node
 )
+from .answer_cache import (
+    answer_cache_node,
+    aanswer_cache_node,
+    cached_state_update,
+    lookup_answer,
+    alookup_answer,
+    store_result,
+    astore_result
+)
+from .tracing import trace_node, record_span, public_spans
+from ..chat import get_sources
 
 # Import color utilities
 from color_utils import ColorPrint
 
 cp = ColorPrint()
 
-def create_intelligent_rag_graph():
+# Nœuds dont les tokens LLM sont renvoyés au client en mode streaming
+STREAMED_NODES = {"direct_answer", "rag_generation"}
+
+def create_intelligent_rag_graph(async_nodes: bool = False):
     """
     Crée le graphe RAG intelligent avec routage basé sur l'intention
+    
+    Args:
+        async_nodes: Si True, utilise les versions asynchrones des nœuds (à exécuter avec ainvoke/astream)
     """
     # Créer le constructeur de graphe
     builder = StateGraph(IntelligentRAGState)
     
-    # Ajouter les nœuds
-    builder.add_node("intent_analysis_detect", intent_analysis_node)
-    builder.add_node("direct_answer", direct_answer_node)
-    builder.add_node("document_retrieval", document_retrieval_node)
-    builder.add_node("rag_generation", rag_generation_node)
+    # Ajouter les nœuds (chacun mesuré par tracing.py)
+    nodes = {
+        "intent_analysis_detect": aintent_analysis_node if async_nodes else intent_analysis_node,
+        "answer_cache": aanswer_cache_node if async_nodes else answer_cache_node,
+        "direct_answer": adirect_answer_node if async_nodes else direct_answer_node,
+        "document_retrieval": adocument_retrieval_node if async_nodes else document_retrieval_node,
+        "rag_generation": arag_generation_node if async_nodes else rag_generation_node,
+    }
+    for name, node in nodes.items():
+        builder.add_node(name, trace_node(name, node))
     
     # Point d'entrée
     builder.set_entry_point("intent_analysis_detect")
@@ -39,6 +67,10 @@ def create_intelligent_rag_graph():
     # Routage conditionnel basé sur l'intention
     def route_after_intent(state: IntelligentRAGState) -> str:
         """Router vers le bon nœud selon l'intention détectée"""
+        if state.get("cache_hit"):
+            cp.print_info("[Routing] → fin (réponse servie par le cache)")
+            return END
+        
         intent_analysis = state.get("intent_analysis")
         
         if not intent_analysis:
@@ -56,13 +88,17 @@ def create_intelligent_rag_graph():
             cp.print_info("[Routing] → document_retrieval (avec RAG)")
             return "document_retrieval"
     
-    # Branchement conditionnel après l'analyse d'intention
+    # Recherche dans les caches de réponses avec la question reformulée
+    builder.add_edge("intent_analysis_detect", "answer_cache")
+    
+    # Branchement conditionnel après l'analyse d'intention et le cache
     builder.add_conditional_edges(
-        "intent_analysis_detect",
+        "answer_cache",
         route_after_intent,
         {
             "direct_answer": "direct_answer",
-            "document_retrieval": "document_retrieval"
+            "document_retrieval": "document_retrieval",
+            END: END
         }
     )
     
@@ -75,7 +111,229 @@ def create_intelligent_rag_graph():
     
     return builder.compile()
 
-def invoke_intelligent_rag(question: str, chat_history: list = None, save_to_db: bool = True) -> dict:
+# ======================================================
+# Registre des graphes compilés (un par mode RAG)
+# ======================================================
+
+# Constructeurs disponibles par mode RAG
+GRAPH_BUILDERS = {
+    "intelligent_rag": create_intelligent_rag_graph,
+    "intelligent_rag_async": lambda: create_intelligent_rag_graph(async_nodes=True),
+}
+
+# Graphes compilés une seule fois par processus (au démarrage de FastAPI ou au premier appel)
+_compiled_graphs: Dict[str, Any] = {}
+_compiled_graphs_lock = threading.Lock()
+
+def get_compiled_graph(mode: str = "intelligent_rag"):
+    """Retourne le graphe compilé pour un mode RAG, en le compilant au premier appel"""
+    graph = _compiled_graphs.get(mode)
+    if graph is not None:
+        return graph
+    
+    with _compiled_graphs_lock:
+        if mode not in _compiled_graphs:
+            if mode not in GRAPH_BUILDERS:
+                raise ValueError(f"Mode RAG inconnu: {mode}")
+            start = time.time()
+            _compiled_graphs[mode] = GRAPH_BUILDERS[mode]()
+            cp.print_info(f"[Graph] Graphe '{mode}' compilé en {(time.time() - start) * 1000:.0f} ms")
+        return _compiled_graphs[mode]
+
+def compile_all_graphs() -> List[str]:
+    """Compile tous les graphes enregistrés (appelé au démarrage)"""
+    for mode in GRAPH_BUILDERS:
+        get_compiled_graph(mode)
+    return list(_compiled_graphs.keys())
+
+def _summarize_token_tracker(token_tracker: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agrège les opérations du token tracker (tokens et coût total)"""
+    return {
+        "total_tokens": sum(op["total_tokens"] for op in token_tracker),
+        "prompt_tokens": sum(op["prompt_tokens"] for op in token_tracker),
+        "completion_tokens": sum(op["completion_tokens"] for op in token_tracker),
+        "total_cost_usd": sum(
+            (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000
+            for op in token_tracker
+        ),
+        "operations": token_tracker
+    }
+
+def _build_final_result(result: Dict[str, Any], response_time: float, session_id: str, token_tracker: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Construit le dictionnaire de résultat renvoyé à l'API à partir de l'état final du graphe"""
+    return {
+        "answer": result.get("answer", ""),
+        "context": result.get("context", []),
+        "sources": result.get("sources", []),
+        "intent_analysis": result.get("intent_analysis"),
+        "processing_steps": result.get("processing_steps", []),
+        "rerank": result.get("rerank_report"),
+        "node_spans": public_spans(result.get("node_spans")),
+        "error": result.get("error"),
+        "success": result.get("error") is None,
+        "response_time": response_time,
+        "session_id": session_id,
+        "token_cost": _summarize_token_tracker(token_tracker)
+    }
+
+def _initial_state(question: str, chat_history: list, session_id: str, token_tracker: list,
+                   conversation_summary: Optional[str] = None) -> Dict[str, Any]:
+    """Prépare l'état initial du graphe - inclut le session_id et token_tracker pour le tracking"""
+    return {
+        "input_question": question,
+        "chat_history": chat_history or [],
+        "conversation_summary": conversation_summary,
+        "processing_steps": ["Graph initialized"],
+        "session_id": session_id,
+        "token_tracker": token_tracker,
+        "node_spans": []
+    }
+
+def _cached_result_state(initial_state: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """État final équivalent à une exécution du graphe, construit depuis une entrée de cache"""
+    return {**initial_state, **cached_state_update(initial_state, entry)}
+
+def _finalize_invocation(result: Dict[str, Any], question: str, chat_history: list, save_to_db: bool,
+                         start_time: float, session_id: str, token_tracker: list) -> dict:
+    """Construit le résultat final (statistiques, données détaillées) à partir de l'état final du graphe"""
+    # Calculer le temps de réponse
+    response_time = time.time() - start_time
+    
+    # Préparer le résultat final
+    final_result = _build_final_result(result, response_time, session_id, token_tracker)
+    
+    # Logger la conversation avec statistiques détaillées (optionnel)
+    if save_to_db:
+        try:
+            # Les opérations sont déjà dans token_tracker
+            session_operations = [
+                {
+                    "operation": op["operation"],
+                    "model": op["model"],
+                    "input_tokens": op["prompt_tokens"],
+                    "output_tokens": op["completion_tokens"],
+                    "cost_usd": (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000,
+                }
+                for op in token_tracker
+            ]
+            
+            # Pas de db_logger pour l'instant
+            final_result["session_id"] = session_id
+            cp.print_info(f"[Graph] Conversation loggée: {session_id}")
+        except Exception as log_error:
+            cp.print_error(f"[Graph] Erreur logging: {log_error}")
+    else:
+        # Mode sans sauvegarde - enrichir les données retournées
+        try:
+            # Les opérations sont déjà dans token_tracker
+            session_operations = [
+                {
+                    "operation": op["operation"],
+                    "model": op["model"],
+                    "input_tokens": op["prompt_tokens"],
+                    "output_tokens": op["completion_tokens"],
+                    "cost_usd": (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000,
+                    "timestamp": ""  # Pas de timestamp pour l'instant
+                }
+                for op in token_tracker
+            ]
+            
+            # Enrichir le résultat avec toutes les données détaillées
+            final_result.update({
+                "detailed_operations": session_operations,
+                "conversation_metadata": {
+                    "question": question,
+                    "chat_history": chat_history or [],
+                    "processing_time": response_time,
+                    "total_context_docs": len(result.get("context", [])),
+                    "total_sources": len(result.get("sources", [])),
+                    "intent_confidence": result.get("intent_analysis", {}).get("confidence", 0.0) if result.get("intent_analysis") else 0.0
+                }
+            })
+            cp.print_info(f"[Graph] Données détaillées ajoutées (mode sans sauvegarde): {session_id}")
+        except Exception as detail_error:
+            cp.print_error(f"[Graph] Erreur enrichissement données: {detail_error}")
+    
+    return final_result
+
+def _invocation_error_result(e: Exception, question: str, chat_history: list, save_to_db: bool,
+                             start_time: float, session_id: str, token_tracker: list, initial_state: Dict[str, Any]) -> dict:
+    """Construit le résultat renvoyé en cas d'erreur critique pendant l'exécution du graphe"""
+    response_time = time.time() - start_time
+    cp.print_error(f"[Graph] Erreur critique: {e}")
+    import traceback
+    traceback.print_exc()
+    cp.print_debug(f"[Graph] État initial: {initial_state}")
+    
+    # Calculer les statistiques même en cas d'erreur
+    total_tokens = sum(op["total_tokens"] for op in token_tracker) if token_tracker else 0
+    prompt_tokens = sum(op["prompt_tokens"] for op in token_tracker) if token_tracker else 0
+    completion_tokens = sum(op["completion_tokens"] for op in token_tracker) if token_tracker else 0
+    total_cost_usd = sum(
+        (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000
+        for op in token_tracker
+    ) if token_tracker else 0.0
+    
+    error_result = {
+        "answer": "Je suis désolé, une erreur technique est survenue.",
+        "context": [],
+        "sources": [],
+        "intent_analysis": None,
+        "processing_steps": ["Critical error occurred"],
+        "error": str(e),
+        "success": False,
+        "response_time": response_time,
+        "session_id": session_id,
+        "token_cost": {
+            "total_tokens": total_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_cost_usd": total_cost_usd,
+            "operations": token_tracker
+        }
+    }
+    
+    # Logger l'erreur aussi (optionnel)
+    if save_to_db:
+        try:
+            # Pas de db_logger pour l'instant
+            error_result["session_id"] = session_id
+            cp.print_info(f"[Graph] Erreur loggée: {session_id}")
+        except Exception as log_error:
+            cp.print_error(f"[Graph] Erreur logging erreur: {log_error}")
+    else:
+        # Mode sans sauvegarde - enrichir les données d'erreur
+        try:
+            session_operations = [
+                {
+                    "operation": op["operation"],
+                    "model": op["model"],
+                    "input_tokens": op["prompt_tokens"],
+                    "output_tokens": op["completion_tokens"],
+                    "cost_usd": (op["prompt_tokens"] * 0.00015 + op["completion_tokens"] * 0.0006) / 1000,
+                    "timestamp": ""
+                }
+                for op in token_tracker
+            ]
+            
+            error_result.update({
+                "detailed_operations": session_operations,
+                "error_metadata": {
+                    "question": question,
+                    "chat_history": chat_history or [],
+                    "processing_time": response_time,
+                    "error_type": type(e).__name__,
+                    "error_traceback": str(e)
+                }
+            })
+            cp.print_info(f"[Graph] Données d'erreur enrichies (mode sans sauvegarde): {session_id}")
+        except Exception as detail_error:
+            cp.print_error(f"[Graph] Erreur enrichissement données d'erreur: {detail_error}")
+    
+    return error_result
+
+def invoke_intelligent_rag(question: str, chat_history: list = None, save_to_db: bool = True,
+                           conversation_summary: Optional[str] = None) -> dict:
     """
     Interface principale pour utiliser le système RAG intelligent
     
@@ -83,6 +341,7 @@ def invoke_intelligent_rag(question: str, chat_history: list = None, save_to_db:
         question: La question de l'utilisateur
         chat_history: L'historique de conversation (optionnel)
         save_to_db: Si True, sauvegarde dans la DB. Si False, retourne seulement les infos.
+        conversation_summary: Résumé des échanges plus anciens que chat_history (conversations longues)
     
     Returns:
         dict: Réponse avec answer, context, sources, et métadonnées
@@ -97,126 +356,128 @@ def invoke_intelligent_rag(question: str, chat_history: list = None, save_to_db:
     token_tracker = []
 
     try:
-        # Créer le graphe
-        graph = create_intelligent_rag_graph()
+        # Récupérer le graphe compilé (partagé par toutes les requêtes)
+        graph = get_compiled_graph("intelligent_rag")
+        initial_state = _initial_state(question, chat_history, session_id, token_tracker, conversation_summary)
         
-        # Préparer l'état initial - inclure le session_id et token_tracker pour le tracking
-        initial_state = {
-            "input_question": question,
-            "chat_history": chat_history or [],
-            "processing_steps": ["Graph initialized"],
-            "session_id": session_id,
-            "token_tracker": token_tracker
-        }
+        # Sans historique, la question brute peut être servie par le cache avant toute analyse
+        if not chat_history and not conversation_summary:
+            lookup_start = time.time()
+            entry = lookup_answer(question)
+            record_span(initial_state, "answer_cache_front", time.time() - lookup_start, cache_hit=entry is not None)
+            if entry is not None:
+                return _finalize_invocation(_cached_result_state(initial_state, entry), question, chat_history, save_to_db, start_time, session_id, token_tracker)
+            initial_state["cache_checked_text"] = question
         
         # Exécuter le graphe
         result = graph.invoke(initial_state)
+        store_result(result)
+        return _finalize_invocation(result, question, chat_history, save_to_db, start_time, session_id, token_tracker)
         
-        # Calculer le temps de réponse
-        response_time = time.time() - start_time
+    except Exception as e:
+        return _invocation_error_result(e, question, chat_history, save_to_db, start_time, session_id, token_tracker, initial_state)
+
+async def ainvoke_intelligent_rag(question: str, chat_history: list = None, save_to_db: bool = True,
+                                  conversation_summary: Optional[str] = None) -> dict:
+    """
+    Version asynchrone de invoke_intelligent_rag : les nœuds utilisent ainvoke (OpenAI)
+    et un pool de threads borné (Chroma), la boucle d'événements n'est jamais bloquée.
+    
+    Returns:
+        dict: Même format que invoke_intelligent_rag
+    """
+    initial_state = None
+    start_time = time.time()
+    session_id = str(uuid.uuid4())
+    token_tracker = []
+
+    try:
+        graph = get_compiled_graph("intelligent_rag_async")
+        initial_state = _initial_state(question, chat_history, session_id, token_tracker, conversation_summary)
         
-        # Calculer les statistiques des tokens depuis la liste
-        total_tokens = sum(op["total_tokens"] for op in token_tracker)
-        prompt_tokens = sum(op["prompt_tokens"] for op in token_tracker)
-        completion_tokens = sum(op["completion_tokens"] for op in token_tracker)
+        if not chat_history and not conversation_summary:
+            lookup_start = time.time()
+            entry = await alookup_answer(question)
+            record_span(initial_state, "answer_cache_front", time.time() - lookup_start, cache_hit=entry is not None)
+            if entry is not None:
+                return _finalize_invocation(_cached_result_state(initial_state, entry), question, chat_history, save_to_db, start_time, session_id, token_tracker)
+            initial_state["cache_checked_text"] = question
         
-        # Calculer le coût total
-        total_cost_usd = sum(
-            (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000
-            for op in token_tracker
-        )
+        result = await graph.ainvoke(initial_state)
+        await astore_result(result)
+        return _finalize_invocation(result, question, chat_history, save_to_db, start_time, session_id, token_tracker)
         
-        # Préparer le résultat final
-        final_result = {
-            "answer": result.get("answer", ""),
-            "context": result.get("context", []),
-            "sources": result.get("sources", []),
-            "intent_analysis": result.get("intent_analysis"),
-            "processing_steps": result.get("processing_steps", []),
-            "error": result.get("error"),
-            "success": result.get("error") is None,
-            "response_time": response_time,
-            "session_id": session_id,
-            "token_cost": {
-                "total_tokens": total_tokens,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_cost_usd": total_cost_usd,
-                "operations": token_tracker
-            }
-        }
+    except Exception as e:
+        return _invocation_error_result(e, question, chat_history, save_to_db, start_time, session_id, token_tracker, initial_state)
+
+async def astream_intelligent_rag(question: str, chat_history: list = None,
+                                  conversation_summary: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Version streaming du système RAG intelligent
+    
+    Produit une suite d'événements :
+        {"event": "sources", "data": [...]}   dès la fin de la récupération de documents
+        {"event": "token", "data": "..."}     pour chaque token généré par la réponse finale
+        {"event": "done", "data": {...}}      résultat final (même format que invoke_intelligent_rag)
+    
+    Args:
+        question: La question de l'utilisateur
+        chat_history: L'historique de conversation (optionnel)
+        conversation_summary: Résumé des échanges plus anciens que chat_history (optionnel)
+    """
+    start_time = time.time()
+    session_id = str(uuid.uuid4())
+    token_tracker = []
+    
+    initial_state = _initial_state(question, chat_history, session_id, token_tracker, conversation_summary)
+    final_state = dict(initial_state)
+    
+    try:
+        graph = get_compiled_graph("intelligent_rag_async")
         
-        # Logger la conversation avec statistiques détaillées (optionnel)
-        if save_to_db:
-            try:
-                # Les opérations sont déjà dans token_tracker
-                session_operations = [
-                    {
-                        "operation": op["operation"],
-                        "model": op["model"],
-                        "input_tokens": op["prompt_tokens"],
-                        "output_tokens": op["completion_tokens"],
-                        "cost_usd": (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000,
-                    }
-                    for op in token_tracker
-                ]
-                
-                # Pas de db_logger pour l'instant
-                final_result["session_id"] = session_id
-                cp.print_info(f"[Graph] Conversation loggée: {session_id}")
-            except Exception as log_error:
-                cp.print_error(f"[Graph] Erreur logging: {log_error}")
-        else:
-            # Mode sans sauvegarde - enrichir les données retournées
-            try:
-                # Les opérations sont déjà dans token_tracker
-                session_operations = [
-                    {
-                        "operation": op["operation"],
-                        "model": op["model"],
-                        "input_tokens": op["prompt_tokens"],
-                        "output_tokens": op["completion_tokens"],
-                        "cost_usd": (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000,
-                        "timestamp": ""  # Pas de timestamp pour l'instant
-                    }
-                    for op in token_tracker
-                ]
-                
-                # Enrichir le résultat avec toutes les données détaillées
-                final_result.update({
-                    "detailed_operations": session_operations,
-                    "conversation_metadata": {
-                        "question": question,
-                        "chat_history": chat_history or [],
-                        "processing_time": response_time,
-                        "total_context_docs": len(result.get("context", [])),
-                        "total_sources": len(result.get("sources", [])),
-                        "intent_confidence": result.get("intent_analysis", {}).get("confidence", 0.0) if result.get("intent_analysis") else 0.0
-                    }
-                })
-                cp.print_info(f"[Graph] Données détaillées ajoutées (mode sans sauvegarde): {session_id}")
-            except Exception as detail_error:
-                cp.print_error(f"[Graph] Erreur enrichissement données: {detail_error}")
+        # Réponse en cache : envoyée d'un seul bloc, sans passer par le graphe
+        if not chat_history and not conversation_summary:
+            lookup_start = time.time()
+            entry = await alookup_answer(question)
+            record_span(initial_state, "answer_cache_front", time.time() - lookup_start, cache_hit=entry is not None)
+            if entry is not None:
+                final_state = _cached_result_state(initial_state, entry)
+                yield {"event": "sources", "data": final_state["sources"]}
+                yield {"event": "token", "data": final_state["answer"]}
+                yield {"event": "done", "data": _build_final_result(final_state, time.time() - start_time, session_id, token_tracker)}
+                return
+            initial_state["cache_checked_text"] = question
+            final_state["cache_checked_text"] = question
         
-        return final_result
+        # "updates" donne l'état produit par chaque nœud, "messages" les tokens LLM au fil de l'eau
+        async for mode, chunk in graph.astream(initial_state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") in STREAMED_NODES and message.content:
+                    yield {"event": "token", "data": message.content}
+                continue
+            
+            for node_name, update in chunk.items():
+                if not update:
+                    continue
+                final_state.update(update)
+                if node_name == "document_retrieval":
+                    retrieved_docs = update.get("retrieved_docs") or []
+                    yield {"event": "sources", "data": get_sources(retrieved_docs)}
+                elif node_name == "answer_cache" and update.get("cache_hit"):
+                    yield {"event": "sources", "data": update["sources"]}
+                    yield {"event": "token", "data": update["answer"]}
+        
+        await astore_result(final_state)
+        response_time = time.time() - start_time
+        yield {"event": "done", "data": _build_final_result(final_state, response_time, session_id, token_tracker)}
         
     except Exception as e:
         response_time = time.time() - start_time
-        cp.print_error(f"[Graph] Erreur critique: {e}")
-        import traceback
+        cp.print_error(f"[Graph] Erreur critique (streaming): {e}")
         traceback.print_exc()
-        cp.print_debug(f"[Graph] État initial: {initial_state}")
-        
-        # Calculer les statistiques même en cas d'erreur
-        total_tokens = sum(op["total_tokens"] for op in token_tracker) if token_tracker else 0
-        prompt_tokens = sum(op["prompt_tokens"] for op in token_tracker) if token_tracker else 0
-        completion_tokens = sum(op["completion_tokens"] for op in token_tracker) if token_tracker else 0
-        total_cost_usd = sum(
-            (op["prompt_tokens"] * INPUT_TOKEN_COST + op["completion_tokens"] * OUTPUT_TOKEN_COST) / 1000000
-            for op in token_tracker
-        ) if token_tracker else 0.0
         
-        error_result = {
+        yield {"event": "done", "data": {
             "answer": "Je suis désolé, une erreur technique est survenue.",
             "context": [],
             "sources": [],
@@ -226,50 +487,5 @@ def invoke_intelligent_rag(question: str, chat_history: list = None, save_to_db:
             "success": False,
             "response_time": response_time,
             "session_id": session_id,
-            "token_cost": {
-                "total_tokens": total_tokens,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_cost_usd": total_cost_usd,
-                "operations": token_tracker
-            }
-        }
-        
-        # Logger l'erreur aussi (optionnel)
-        if save_to_db:
-            try:
-                # Pas de db_logger pour l'instant
-                error_result["session_id"] = session_id
-                cp.print_info(f"[Graph] Erreur loggée: {session_id}")
-            except Exception as log_error:
-                cp.print_error(f"[Graph] Erreur logging erreur: {log_error}")
-        else:
-            # Mode sans sauvegarde - enrichir les données d'erreur
-            try:
-                session_operations = [
-                    {
-                        "operation": op["operation"],
-                        "model": op["model"],
-                        "input_tokens": op["prompt_tokens"],
-                        "output_tokens": op["completion_tokens"],
-                        "cost_usd": (op["prompt_tokens"] * 0.00015 + op["completion_tokens"] * 0.0006) / 1000,
-                        "timestamp": ""
-                    }
-                    for op in token_tracker
-                ]
-                
-                error_result.update({
-                    "detailed_operations": session_operations,
-                    "error_metadata": {
-                        "question": question,
-                        "chat_history": chat_history or [],
-                        "processing_time": response_time,
-                        "error_type": type(e).__name__,
-                        "error_traceback": str(e)
-                    }
-                })
-                cp.print_info(f"[Graph] Données d'erreur enrichies (mode sans sauvegarde): {session_id}")
-            except Exception as detail_error:
-                cp.print_error(f"[Graph] Erreur enrichissement données d'erreur: {detail_error}")
-        
-        return error_result
\ No newline at end of file
+            "token_cost": _summarize_token_tracker(token_tracker)
+        }}
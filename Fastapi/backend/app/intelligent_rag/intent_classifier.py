@@ -0,0 +1,334 @@
+"""
+Intelligent RAG System - Local Intent Classifier
+Classification locale des intentions évidentes (salutations, remerciements, vues d'ensemble
+d'une spécialité, questions proches d'exemples déjà étiquetés) pour éviter l'appel LLM
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from .. import llmm
+from ..database.database import engine
+from ..database.models import RAGConversation
+from .entities import find_specialities
+from .exact_cache import normalize_question
+from .semantic_cache import semantic_cache
+from .state import IntentAnalysisResult, IntentType, SpecialityType
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+INTENT_LOCAL_ENABLED = os.getenv("INTENT_LOCAL_ENABLED", "true").lower() == "true"
+INTENT_LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_LOCAL_CONFIDENCE_THRESHOLD", "0.8"))
+INTENT_KNN_K = int(os.getenv("INTENT_KNN_K", "7"))
+INTENT_KNN_MIN_SIMILARITY = float(os.getenv("INTENT_KNN_MIN_SIMILARITY", "0.88"))
+INTENT_KNN_MAX_EXAMPLES = int(os.getenv("INTENT_KNN_MAX_EXAMPLES", "2000"))
+INTENT_KNN_REFRESH_SECONDS = int(os.getenv("INTENT_KNN_REFRESH_SECONDS", "3600"))
+
+# Préfixe du champ reasoning des classifications locales (exclues des exemples du kNN)
+LOCAL_REASONING_PREFIX = "Local classifier"
+
+# Taille des lots d'embeddings lors de la construction de l'index kNN
+_EMBED_BATCH_SIZE = 256
+
+# ================================
+# RÈGLES
+# ================================
+
+# Salutations, remerciements et formules de politesse (texte normalisé, sans ponctuation)
+SMALL_TALK_PATTERN = re.compile(
+    r"^(?:(?:ok|okay|super|parfait|genial|top|d'accord|tres bien)\s+)?"
+    r"(?:bonjour|bonsoir|salut|hello|hi|hey|coucou|re|merci|merci beaucoup|merci bien|thanks|thank you"
+    r"|au revoir|a bientot|a plus|bye|bonne journee|bonne soiree|bonne nuit)"
+    r"(?:\s+(?:a toi|a vous|polybot|encore|pour tout|pour ton aide|pour votre aide|tout le monde))*$"
+)
+
+# Demande de la liste des cours d'une spécialité
+OVERVIEW_PATTERN = re.compile(
+    r"\b(?:liste|tous les|toutes les|ensemble des|quels sont les|quelles sont les|quels|quelles)\s+"
+    r"(?:(?:les|des|du|de)\s+)?(?:cours|matieres|ue|enseignements|modules)\b"
+    r"|\bprogramme (?:de|des|du)\b|\bmaquette\b"
+)
+
+def _local_result(intent: IntentType, speciality: Optional[SpecialityType], confidence: float, reasoning: str) -> IntentAnalysisResult:
+    return IntentAnalysisResult(
+        intent=intent,
+        speciality=speciality,
+        confidence=confidence,
+        reasoning=f"{LOCAL_REASONING_PREFIX} ({reasoning})",
+        needs_history=False,
+        course_name=None,
+        reformulation=None
+    )
+
+def match_speciality(question: str) -> Optional[SpecialityType]:
+    """Spécialité citée dans la question (None si aucune ou plusieurs)"""
+    found = find_specialities(question)
+    return found.pop() if len(found) == 1 else None
+
+def classify_by_rules(question: str) -> Optional[IntentAnalysisResult]:
+    """Salutations et remerciements, liste des cours d'une spécialité citée"""
+    normalized = re.sub(r"[^\w\s']", " ", normalize_question(question))
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    if SMALL_TALK_PATTERN.match(normalized):
+        return _local_result(IntentType.DIRECT_ANSWER, None, 0.95, "small talk")
+
+    speciality = match_speciality(question)
+    if speciality and OVERVIEW_PATTERN.search(normalized):
+        return _local_result(IntentType.SYLLABUS_SPECIALITY_OVERVIEW, speciality, 0.85, f"overview keywords, {speciality.value}")
+    return None
+
+# ================================
+# kNN SUR LES INTENTIONS PASSÉES
+# ================================
+
+class IntentKnnIndex:
+    """
+    Index des questions passées étiquetées par le LLM (table RAGConversation),
+    reconstruit périodiquement en arrière-plan
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._labels: List[Dict[str, Any]] = []
+        self._built_at = 0.0
+        self._building = False
+
+    @staticmethod
+    def _load_examples() -> List[Tuple[str, Dict[str, Any]]]:
+        """Questions récentes autonomes et leur intention (une seule fois par question normalisée)"""
+        with Session(engine) as session:
+            rows = session.exec(
+                select(RAGConversation.question, RAGConversation.intent_analysis)
+                .where(RAGConversation.success == True, RAGConversation.intent_analysis != None)
+                .order_by(RAGConversation.timestamp.desc())
+                .limit(INTENT_KNN_MAX_EXAMPLES)
+            ).all()
+
+        examples = {}
+        for question, raw_intent in rows:
+            try:
+                intent_analysis = json.loads(raw_intent)
+            except (TypeError, ValueError):
+                continue
+            reasoning = intent_analysis.get("reasoning") or ""
+            if (
+                intent_analysis.get("needs_history")
+                or reasoning.startswith(LOCAL_REASONING_PREFIX)
+                or reasoning.startswith("Fallback")
+                or float(intent_analysis.get("confidence", 0)) < INTENT_LOCAL_CONFIDENCE_THRESHOLD
+            ):
+                continue
+            # Lignes triées de la plus récente à la plus ancienne : on garde l'étiquette la plus récente
+            examples.setdefault(normalize_question(question), (question, intent_analysis))
+        return list(examples.values())
+
+    def build(self) -> int:
+        """Construit l'index (embeddings des questions passées) et retourne le nombre d'exemples"""
+        start = time.time()
+        examples = self._load_examples()
+        if not examples:
+            with self._lock:
+                self._matrix, self._labels, self._built_at = None, [], time.time()
+            return 0
+
+        vectors = []
+        for i in range(0, len(examples), _EMBED_BATCH_SIZE):
+            batch = [question for question, _ in examples[i:i + _EMBED_BATCH_SIZE]]
+            vectors.extend(llmm.embeddings.embed_documents(batch))
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        labels = [
+            {
+                "intent": IntentType(intent_analysis["intent"]),
+                "speciality": intent_analysis.get("speciality")
+            }
+            for _, intent_analysis in examples
+        ]
+        with self._lock:
+            self._matrix, self._labels, self._built_at = matrix, labels, time.time()
+        cp.print_info(f"[IntentClassifier] Index kNN construit: {len(labels)} exemples en {(time.time() - start) * 1000:.0f} ms")
+        return len(labels)
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                cp.print_warning(f"[IntentClassifier] Reconstruction de l'index kNN impossible: {e}")
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name="intent-knn-refresh", daemon=True).start()
+
+    def maybe_refresh(self):
+        """Relance la construction en arrière-plan si l'index est trop ancien"""
+        with self._lock:
+            if self._building or time.time() - self._built_at < INTENT_KNN_REFRESH_SECONDS:
+                return
+            self._building = True
+        self._refresh_in_background()
+
+    def size(self) -> int:
+        return len(self._labels)
+
+    def query(self, vector: np.ndarray) -> Optional[Tuple[IntentType, float, List[Optional[str]]]]:
+        """
+        Vote pondéré par similarité des k plus proches exemples.
+
+        Returns:
+            (intention, confiance, spécialités des voisins ayant voté pour elle) ou None
+        """
+        with self._lock:
+            matrix, labels = self._matrix, self._labels
+        if matrix is None:
+            return None
+
+        similarities = matrix @ vector
+        top = np.argsort(-similarities)[:INTENT_KNN_K]
+        neighbours = [(float(similarities[i]), labels[i]) for i in top if similarities[i] >= INTENT_KNN_MIN_SIMILARITY]
+        if not neighbours:
+            return None
+
+        votes: Dict[IntentType, float] = {}
+        for similarity, label in neighbours:
+            votes[label["intent"]] = votes.get(label["intent"], 0.0) + similarity
+        intent = max(votes, key=votes.get)
+        confidence = votes[intent] / sum(votes.values())
+        specialities = [label["speciality"] for _, label in neighbours if label["intent"] == intent]
+        return intent, confidence, specialities
+
+
+knn_index = IntentKnnIndex()
+
+def _knn_result(question: str, knn: Optional[Tuple[IntentType, float, List[Optional[str]]]]) -> Optional[IntentAnalysisResult]:
+    """Transforme le vote kNN en analyse d'intention (None si pas assez sûr)"""
+    if knn is None:
+        return None
+    intent, confidence, specialities = knn
+    if confidence < INTENT_LOCAL_CONFIDENCE_THRESHOLD:
+        return None
+
+    speciality = match_speciality(question)
+    if intent == IntentType.SYLLABUS_SPECIALITY_OVERVIEW and speciality is None:
+        # Vue d'ensemble : la spécialité doit être citée ou partagée par tous les voisins
+        if len(set(specialities)) != 1 or not specialities[0]:
+            return None
+        speciality = SpecialityType(specialities[0])
+    return _local_result(intent, speciality, round(confidence, 3), "kNN on past intents")
+
+# ================================
+# STATISTIQUES
+# ================================
+
+_stats_lock = threading.Lock()
+_stats = {
+    "local_rules": 0,
+    "local_knn": 0,
+    "llm_calls": 0,
+    "local_time_total": 0.0,
+    "llm_time_total": 0.0
+}
+
+def _record_local(method: str, duration: float):
+    with _stats_lock:
+        _stats[method] += 1
+        _stats["local_time_total"] += duration
+
+def _record_miss(duration: float):
+    with _stats_lock:
+        _stats["local_time_total"] += duration
+
+def record_llm_call(duration: float):
+    """Enregistre la durée d'un appel LLM d'analyse d'intention (sert à estimer le temps gagné)"""
+    with _stats_lock:
+        _stats["llm_calls"] += 1
+        _stats["llm_time_total"] += duration
+
+def get_stats() -> Dict[str, Any]:
+    """Part des requêtes résolues localement et latence économisée (estimée avec la durée moyenne des appels LLM)"""
+    with _stats_lock:
+        stats = dict(_stats)
+    local = stats["local_rules"] + stats["local_knn"]
+    total = local + stats["llm_calls"]
+    avg_llm_latency = stats["llm_time_total"] / stats["llm_calls"] if stats["llm_calls"] else 0.0
+    return {
+        **stats,
+        "enabled": INTENT_LOCAL_ENABLED,
+        "confidence_threshold": INTENT_LOCAL_CONFIDENCE_THRESHOLD,
+        "knn_examples": knn_index.size(),
+        "local_share": local / total if total else 0.0,
+        "avg_llm_latency_seconds": avg_llm_latency,
+        "latency_saved_seconds": max(local * avg_llm_latency - stats["local_time_total"], 0.0)
+    }
+
+# ================================
+# POINT D'ENTRÉE
+# ================================
+
+def build_knn_index() -> int:
+    """Construit l'index kNN (appelé au préchauffage)"""
+    return knn_index.build()
+
+def classify(question: str, chat_history: Optional[List[Dict[str, str]]]) -> Optional[IntentAnalysisResult]:
+    """
+    Classification locale : renvoie une analyse d'intention si sa confiance dépasse
+    INTENT_LOCAL_CONFIDENCE_THRESHOLD, None pour laisser décider le LLM.
+    Avec un historique, seules les formules de politesse sont classées localement.
+    """
+    if not INTENT_LOCAL_ENABLED:
+        return None
+    start = time.time()
+    result = classify_by_rules(question)
+    if result and (result["intent"] == IntentType.DIRECT_ANSWER or not chat_history):
+        _record_local("local_rules", time.time() - start)
+        return result
+    if chat_history:
+        return None
+
+    try:
+        knn_index.maybe_refresh()
+        result = _knn_result(question, knn_index.query(semantic_cache.embed_question(question)))
+    except Exception as e:
+        cp.print_warning(f"[IntentClassifier] kNN indisponible: {e}")
+        result = None
+    if result:
+        _record_local("local_knn", time.time() - start)
+    else:
+        _record_miss(time.time() - start)
+    return result
+
+async def aclassify(question: str, chat_history: Optional[List[Dict[str, str]]]) -> Optional[IntentAnalysisResult]:
+    """Version asynchrone de classify (l'embedding de la question est calculé sans bloquer la boucle)"""
+    if not INTENT_LOCAL_ENABLED:
+        return None
+    start = time.time()
+    result = classify_by_rules(question)
+    if result and (result["intent"] == IntentType.DIRECT_ANSWER or not chat_history):
+        _record_local("local_rules", time.time() - start)
+        return result
+    if chat_history:
+        return None
+
+    try:
+        knn_index.maybe_refresh()
+        result = _knn_result(question, knn_index.query(await semantic_cache.aembed_question(question)))
+    except Exception as e:
+        cp.print_warning(f"[IntentClassifier] kNN indisponible: {e}")
+        result = None
+    if result:
+        _record_local("local_knn", time.time() - start)
+    else:
+        _record_miss(time.time() - start)
+    return result
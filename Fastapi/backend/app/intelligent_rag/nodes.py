@@ -2,14 +2,24 @@
 Intelligent RAG System - Core Nodes
 """
 
+import os
 import json
-from typing import Dict, Any, List
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_core.messages import HumanMessage
 from ..llmm import llm, initialize_the_rag_chain
 from ...app import llmm
 from ..chat import get_sources
+from .. import lexical_index, metrics
 from .state import IntelligentRAGState, IntentType, SpecialityType, IntentAnalysisResult
-from .openai_tracker import track_openai_call_manual, get_tokens_from_response
+from . import exact_cache, intent_classifier, reranker, tracing
+from .toc_index import toc_index, is_toc_for
+from .entities import COURSE_CODE_PATTERN, SEMESTER_PATTERN  # filtres de métadonnées poussés dans la clause `where` de Chroma
+from .context_packer import pack_context
+from .openai_tracker import track_openai_call_manual, atrack_openai_call_manual, get_tokens_from_response
 from .prompts import (
     get_intent_analysis_prompt,
     get_direct_answer_prompt,
@@ -18,357 +28,674 @@ from .prompts import (
 )
 from color_utils import ColorPrint as cp
 
+# Pool de threads borné pour les recherches Chroma (bibliothèque synchrone) dans les nœuds asynchrones
+RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", "4"))
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_POOL_SIZE, thread_name_prefix="chroma-retrieval")
+
+async def _run_in_retrieval_pool(func, *args):
+    """Exécute une fonction de récupération synchrone dans le pool dédié sans bloquer la boucle d'événements"""
+    loop = asyncio.get_running_loop()
+    # Le contexte est propagé pour que le temps de recherche soit compté dans le span du nœud appelant
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_retrieval_executor, context.run, func, *args)
+
+# Récupération générale : candidats vectoriels (Chroma), candidats lexicaux (FTS5) et documents gardés après rerank
+GENERAL_RETRIEVAL_K = 8
+LEXICAL_RETRIEVAL_K = 8
+GENERAL_CONTEXT_DOCS = 6
+# Vue d'ensemble d'une spécialité : recherche TOC complémentaire et nombre de TOC gardés
+OVERVIEW_SEARCH_K = 15
+OVERVIEW_MAX_DOCS = 12
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+
+# En dessous de ce nombre de résultats filtrés, on refait la recherche sans filtre
+MIN_FILTERED_RESULTS = 3
+
+# Récupération spéculative sur la question brute pendant l'appel LLM d'analyse d'intention
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+speculative_retrieval_stats = {"launched": 0, "reused": 0, "dropped": 0, "failed": 0}
+
+def _log_token_usage(track_result: Dict[str, Any]):
+    """Affiche les tokens consommés par un appel OpenAI"""
+    token_info = track_result["tokens"]
+    cp.print_info(f"Tokens utilisés: {token_info['total']} (prompt: {token_info['prompt']}, completion: {token_info['completion']})")
+
+def _format_history(messages: List[Dict[str, str]]) -> str:
+    """Formate des messages d'historique en texte User/Assistant"""
+    return "\n".join([
+        f"User: {msg['content']}" if msg['role'] == "user" else f"Assistant: {msg['content']}"
+        for msg in messages
+    ])
+
+def _history_with_summary(state: IntelligentRAGState, messages: List[Dict[str, str]]) -> str:
+    """Historique des prompts : résumé des anciens échanges (conversations longues) puis derniers messages"""
+    history_text = _format_history(messages)
+    if state.get("conversation_summary"):
+        return f"Résumé des échanges précédents: {state['conversation_summary']}\n{history_text}"
+    return history_text
+
+# ================================
+# ANALYSE D'INTENTION
+# ================================
+
+def _build_intent_prompt(state: IntelligentRAGState) -> str:
+    """Construit le prompt d'analyse d'intention (avec les derniers messages de l'historique)"""
+    # Construire l'historique de conversation (seulement les derniers messages)
+    history_text = ""
+    if state.get("chat_history") or state.get("conversation_summary"):
+        last_msgs = (state.get("chat_history") or [])[-exact_cache.INTENT_HISTORY_WINDOW:]
+        history_text = _history_with_summary(state, last_msgs)
+
+    # Prompt structuré pour obtenir une réponse JSON
+    return get_intent_analysis_prompt(state['input_question'], history_text)
+
+def _parse_intent_response(state: IntelligentRAGState, response) -> Dict[str, Any]:
+    """Parse la réponse JSON du LLM d'analyse d'intention (avec classification de secours)"""
+    try:
+        # Nettoyer la réponse en supprimant les balises markdown
+        clean_response = response.content.strip()
+        if clean_response.startswith("```json"):
+            clean_response = clean_response[7:]  # Supprimer ```json
+        if clean_response.endswith("```"):
+            clean_response = clean_response[:-3]  # Supprimer ```
+        clean_response = clean_response.strip()
+
+        result = json.loads(clean_response)
+
+        # Validation et conversion
+        intent_analysis = IntentAnalysisResult(
+            intent=IntentType(result["intent"]),
+            speciality=SpecialityType(result["speciality"]) if result.get("speciality") and result["speciality"] != "null" else None,
+            confidence=float(result.get("confidence", 0.8)),
+            reasoning=result.get("reasoning", ""),
+            needs_history=result.get("needs_history", False),
+            course_name=result.get("course_name") if result.get("course_name") and result["course_name"] != "null" else None,
+            reformulation=result.get("reformulation") if result.get("reformulation") and result["reformulation"] != "null" else None
+        )
+        cp.print_debug(f"raw: {result}")
+
+        cp.print_success(f"Intention détectée: {intent_analysis['intent']}")
+        cp.print_info(f"Spécialité: {intent_analysis['speciality']}")
+        cp.print_info(f"Confiance: {intent_analysis['confidence']:.2f}")
+
+        return {
+            "intent_analysis": intent_analysis,
+            "processing_steps": state.get("processing_steps", []) + [INTENT_COMPLETED_STEP]
+        }
+
+    except json.JSONDecodeError as e:
+        cp.print_error(f"Erreur parsing JSON: {e}")
+        cp.print_warning(f"Réponse brute: {response.content}")
+
+        # Fallback avec classification simple
+        content = response.content.lower()
+        if any(word in content for word in ["direct", "greeting", "casual"]):
+            intent = IntentType.DIRECT_ANSWER
+        elif any(word in content for word in ["syllabus", "toc"]):
+            intent = IntentType.SYLLABUS_SPECIALITY_OVERVIEW
+        else:
+            intent = IntentType.RAG_NEEDED
+
+        fallback_analysis = IntentAnalysisResult(
+            intent=intent,
+            speciality=None,
+            confidence=0.5,
+            reasoning="Fallback classification due to JSON parsing error",
+            needs_history=False,
+            course_name=None
+        )
+
+        cp.print_warning("Utilisation du fallback pour l'analyse d'intention")
+
+        return {
+            "intent_analysis": fallback_analysis,
+            "processing_steps": state.get("processing_steps", []) + ["Intent analysis with fallback"]
+        }
+
+# Étape ajoutée par _parse_intent_response quand le JSON du LLM a été lu sans fallback
+INTENT_COMPLETED_STEP = "Intent analysis completed"
+
+def _memoized_intent_result(state: IntelligentRAGState, intent_analysis: IntentAnalysisResult) -> Dict[str, Any]:
+    """Résultat construit depuis une analyse d'intention mémorisée (aucun appel OpenAI)"""
+    tracing.mark_cache_hit()
+    cp.print_success(f"Intention mémorisée: {intent_analysis['intent']}")
+    return {
+        "intent_analysis": intent_analysis,
+        "processing_steps": state.get("processing_steps", []) + ["Intent analysis memoized"]
+    }
+
+def _local_intent_result(state: IntelligentRAGState, intent_analysis: IntentAnalysisResult) -> Dict[str, Any]:
+    """Résultat construit par le classifieur local (aucun appel OpenAI)"""
+    cp.print_success(f"Intention détectée localement: {intent_analysis['intent']} ({intent_analysis['reasoning']})")
+    return {
+        "intent_analysis": intent_analysis,
+        "processing_steps": state.get("processing_steps", []) + ["Intent analysis (local classifier)"]
+    }
+
+def _is_memoizable(result: Dict[str, Any]) -> bool:
+    """Seules les analyses lues sans fallback sont mémorisées"""
+    return result.get("processing_steps", [])[-1:] == [INTENT_COMPLETED_STEP]
+
+def _intent_error_result(state: IntelligentRAGState, e: Exception) -> Dict[str, Any]:
+    """Résultat de secours si l'analyse d'intention échoue"""
+    cp.print_error(f"Erreur lors de l'analyse: {e}")
+    import traceback
+    traceback.print_exc()
+    return {
+        "intent_analysis": IntentAnalysisResult(
+            intent=IntentType.RAG_NEEDED,
+            speciality=None,
+            confidence=0.3,
+            reasoning=f"Error in analysis: {str(e)}",
+            needs_history=False,
+            course_name=None
+        ),
+        "processing_steps": state.get("processing_steps", []) + ["Intent analysis failed"],
+        "error": str(e)
+    }
+
 def intent_analysis_node(state: IntelligentRAGState) -> Dict[str, Any]:
     """
     Analyse l'intention de l'utilisateur en utilisant OpenAI avec sortie JSON
     """
     cp.print_step("Analyse d'intention")
     cp.print_info(f"État reçu: {list(state.keys())}")
-    
+
     try:
         # Récupérer la liste token tracker du state
         token_tracker = state.get("token_tracker", [])
         session_id = state.get("session_id", "unknown")
-        
-        # Construire l'historique de conversation (seulement les 5 derniers messages)
-        history_text = ""
-        if state.get("chat_history"):
-            last_msgs = state["chat_history"][-6:]
-            history_text = "\n".join([
-            f"User: {msg['content']}" if msg['role'] == "user" else f"Assistant: {msg['content']}"
-            for msg in last_msgs
-            ])
-        
-        # Prompt structuré pour obtenir une réponse JSON
-        prompt = get_intent_analysis_prompt(state['input_question'], history_text)
+
+        # Analyse déjà faite pour cette question et cet historique (par n'importe quel worker)
+        memoized = exact_cache.get_intent(state["input_question"], state.get("chat_history"), state.get("conversation_summary"))
+        if memoized:
+            return _memoized_intent_result(state, memoized)
+
+        # Intentions évidentes classées localement, le LLM ne tranche que les cas incertains
+        local = intent_classifier.classify(state["input_question"], state.get("chat_history"))
+        if local:
+            return _local_intent_result(state, local)
+
+        prompt = _build_intent_prompt(state)
 
         # Utiliser le tracking manuel pour récupérer les vrais tokens
+        llm_start = time.time()
         track_result = track_openai_call_manual(
-            llm=llm, 
-            prompt=prompt, 
-            operation="intent_analysis", 
-            token_tracker=token_tracker, 
+            llm=llm,
+            prompt=prompt,
+            operation="intent_analysis",
+            token_tracker=token_tracker,
             session_id=session_id
         )
-        response = track_result["response"]
-        token_info = track_result["tokens"]
-        cp.print_info(f"Tokens utilisés: {token_info['total']} (prompt: {token_info['prompt']}, completion: {token_info['completion']})")
-        
-        # Parser la réponse JSON
-        try:
-            # Nettoyer la réponse en supprimant les balises markdown
-            clean_response = response.content.strip()
-            if clean_response.startswith("```json"):
-                clean_response = clean_response[7:]  # Supprimer ```json
-            if clean_response.endswith("```"):
-                clean_response = clean_response[:-3]  # Supprimer ```
-            clean_response = clean_response.strip()
-            
-            result = json.loads(clean_response)
-            
-            # Validation et conversion
-            intent_analysis = IntentAnalysisResult(
-                intent=IntentType(result["intent"]),
-                speciality=SpecialityType(result["speciality"]) if result.get("speciality") and result["speciality"] != "null" else None,
-                confidence=float(result.get("confidence", 0.8)),
-                reasoning=result.get("reasoning", ""),
-                needs_history=result.get("needs_history", False),
-                course_name=result.get("course_name") if result.get("course_name") and result["course_name"] != "null" else None,
-                reformulation=result.get("reformulation") if result.get("reformulation") and result["reformulation"] != "null" else None
-            )
-            cp.print_debug(f"raw: {result}")
-            
-            cp.print_success(f"Intention détectée: {intent_analysis['intent']}")
-            cp.print_info(f"Spécialité: {intent_analysis['speciality']}")
-            cp.print_info(f"Confiance: {intent_analysis['confidence']:.2f}")
-            
-            return {
-                "intent_analysis": intent_analysis,
-                "processing_steps": state.get("processing_steps", []) + ["Intent analysis completed"]
-            }
-            
-        except json.JSONDecodeError as e:
-            cp.print_error(f"Erreur parsing JSON: {e}")
-            cp.print_warning(f"Réponse brute: {response.content}")
-            
-            # Fallback avec classification simple
-            content = response.content.lower()
-            if any(word in content for word in ["direct", "greeting", "casual"]):
-                intent = IntentType.DIRECT_ANSWER
-            elif any(word in content for word in ["syllabus", "toc"]):
-                intent = IntentType.SYLLABUS_SPECIALITY_OVERVIEW
-            else:
-                intent = IntentType.RAG_NEEDED
-            
-            fallback_analysis = IntentAnalysisResult(
-                intent=intent,
-                speciality=None,
-                confidence=0.5,
-                reasoning="Fallback classification due to JSON parsing error",
-                needs_history=False,
-                course_name=None
-            )
-            
-            cp.print_warning("Utilisation du fallback pour l'analyse d'intention")
-            
-            return {
-                "intent_analysis": fallback_analysis,
-                "processing_steps": state.get("processing_steps", []) + ["Intent analysis with fallback"]
-            }
-            
+        intent_classifier.record_llm_call(time.time() - llm_start)
+        _log_token_usage(track_result)
+
+        result = _parse_intent_response(state, track_result["response"])
+        if _is_memoizable(result):
+            exact_cache.set_intent(state["input_question"], state.get("chat_history"), result["intent_analysis"], state.get("conversation_summary"))
+        return result
+
     except Exception as e:
-        cp.print_error(f"Erreur lors de l'analyse: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "intent_analysis": IntentAnalysisResult(
-                intent=IntentType.RAG_NEEDED,
-                speciality=None,
-                confidence=0.3,
-                reasoning=f"Error in analysis: {str(e)}",
-                needs_history=False,
-                course_name=None
-            ),
-            "processing_steps": state.get("processing_steps", []) + ["Intent analysis failed"],
-            "error": str(e)
-        }
+        return _intent_error_result(state, e)
+
+async def aintent_analysis_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Version asynchrone de intent_analysis_node
+    """
+    cp.print_step("Analyse d'intention")
+    cp.print_info(f"État reçu: {list(state.keys())}")
+
+    speculative = None
+    try:
+        token_tracker = state.get("token_tracker", [])
+        session_id = state.get("session_id", "unknown")
+
+        memoized = await exact_cache.aget_intent(state["input_question"], state.get("chat_history"), state.get("conversation_summary"))
+        if memoized:
+            return _memoized_intent_result(state, memoized)
+
+        local = await intent_classifier.aclassify(state["input_question"], state.get("chat_history"))
+        if local:
+            return _local_intent_result(state, local)
+
+        # La plupart des requêtes finissent sur le chemin RAG : on lance la recherche sur la question brute
+        # en parallèle de l'appel LLM, elle sera réutilisée si l'intention le permet
+        speculative = _start_speculative_retrieval(state)
+
+        prompt = _build_intent_prompt(state)
+
+        llm_start = time.time()
+        track_result = await atrack_openai_call_manual(
+            llm=llm,
+            prompt=prompt,
+            operation="intent_analysis",
+            token_tracker=token_tracker,
+            session_id=session_id
+        )
+        intent_classifier.record_llm_call(time.time() - llm_start)
+        _log_token_usage(track_result)
+
+        result = _parse_intent_response(state, track_result["response"])
+        if _is_memoizable(result):
+            await exact_cache.aset_intent(state["input_question"], state.get("chat_history"), result["intent_analysis"], state.get("conversation_summary"))
+
+    except Exception as e:
+        result = _intent_error_result(state, e)
+
+    return await _collect_speculative_retrieval(state, speculative, result)
+
+# ================================
+# RÉCUPÉRATION SPÉCULATIVE
+# ================================
+
+def _uses_speciality_overview(intent_analysis: Dict[str, Any]) -> bool:
+    """Les vues d'ensemble d'une spécialité ont leur propre stratégie de récupération"""
+    return intent_analysis["intent"] == IntentType.SYLLABUS_SPECIALITY_OVERVIEW and not intent_analysis["speciality"] == "GENERAL"
+
+@tracing.traced_retrieval
+def _hybrid_search(question: str, where: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """Recherche vectorielle (Chroma) et lexicale (FTS5), fusionnées par Reciprocal Rank Fusion"""
+    with metrics.CHROMA_QUERY_SECONDS.labels(kind="filtered" if where else "similarity").time():
+        if where:
+            vector_docs = llmm.db.similarity_search(question, k=GENERAL_RETRIEVAL_K, filter=where)
+        else:
+            vector_docs = llmm.db.similarity_search(question, k=GENERAL_RETRIEVAL_K)
+    if not HYBRID_RETRIEVAL_ENABLED:
+        return vector_docs
+
+    lexical_docs = lexical_index.search(llmm.persist_directory, question, LEXICAL_RETRIEVAL_K, where)
+    cp.print_debug(f"[Retrieval] {len(vector_docs)} candidats vectoriels, {len(lexical_docs)} candidats lexicaux")
+    return lexical_index.reciprocal_rank_fusion([vector_docs, lexical_docs])
+
+def _general_similarity_search(question: str) -> List[Any]:
+    """Recherche de la récupération générale (hybride, sans filtre)"""
+    return _hybrid_search(question)
+
+def _build_metadata_filter(state: IntelligentRAGState) -> Optional[Dict[str, Any]]:
+    """
+    Construit la clause `where` Chroma à partir de l'intention et de la question :
+    code de cours cité, puis pour les questions de syllabus spécialité, semestre et fiches de cours
+    """
+    intent_analysis = state.get("intent_analysis") or {}
+    question = _general_retrieval_query(state)
+    conditions = []
+
+    code_match = COURSE_CODE_PATTERN.search(question)
+    if code_match:
+        conditions.append({"metadata.code": code_match.group(0).upper()})
+
+    if intent_analysis.get("intent") in (IntentType.SYLLABUS_SPECIFIC_COURSE, IntentType.SYLLABUS_SPECIALITY_OVERVIEW):
+        speciality = intent_analysis.get("speciality")
+        if speciality and speciality != SpecialityType.GENERAL:
+            conditions.append({"metadata.specialite": SpecialityType(speciality).value})
+        semester_match = SEMESTER_PATTERN.search(question)
+        if semester_match:
+            conditions.append({"metadata.semestre": int(semester_match.group(1))})
+        if intent_analysis.get("intent") == IntentType.SYLLABUS_SPECIFIC_COURSE:
+            conditions.append({"metadata.type": "fiche_cours"})
+
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def _filtered_similarity_search(question: str, where: Optional[Dict[str, Any]]) -> List[Any]:
+    """Recherche filtrée par métadonnées, sans filtre si elle ne trouve pas assez de documents"""
+    if where is None:
+        return _general_similarity_search(question)
+
+    docs = _hybrid_search(question, where)
+    cp.print_info(f"[Retrieval] Filtre {where}: {len(docs)} documents")
+    if len(docs) >= MIN_FILTERED_RESULTS:
+        return docs
+
+    # Métadonnées absentes (vectorstore antérieur aux champs typés) ou filtre trop strict
+    cp.print_warning("[Retrieval] Filtre trop restrictif, recherche sans filtre")
+    unfiltered = _general_similarity_search(question)
+    return docs + [doc for doc in unfiltered if doc not in docs]
+
+def _general_retrieval_query(state: IntelligentRAGState) -> str:
+    """Requête de la récupération générale : la question reformulée si disponible"""
+    return (state.get("intent_analysis") or {}).get("reformulation") or state["input_question"]
+
+def _speculation_usable(state: IntelligentRAGState) -> bool:
+    """La recherche sur la question brute est valable si la récupération générale ferait la même requête"""
+    intent_analysis = state.get("intent_analysis")
+    if not intent_analysis or intent_analysis["intent"] == IntentType.DIRECT_ANSWER:
+        return False
+    if _uses_speciality_overview(intent_analysis) or _build_metadata_filter(state) is not None:
+        return False
+    return _general_retrieval_query(state) == state["input_question"]
+
+def _start_speculative_retrieval(state: IntelligentRAGState) -> Optional[asyncio.Future]:
+    """Lance la recherche générale sur la question brute sans l'attendre"""
+    if not SPECULATIVE_RETRIEVAL_ENABLED:
+        return None
+    speculative_retrieval_stats["launched"] += 1
+    return asyncio.ensure_future(_run_in_retrieval_pool(_general_similarity_search, state["input_question"]))
+
+async def _collect_speculative_retrieval(state: IntelligentRAGState, speculative: Optional[asyncio.Future],
+                                         result: Dict[str, Any]) -> Dict[str, Any]:
+    """Ajoute au résultat de l'analyse d'intention les documents spéculatifs s'ils sont réutilisables"""
+    if speculative is None:
+        return result
+
+    if not _speculation_usable({**state, **result}):
+        # Requête différente (reformulation, vue d'ensemble) ou pas de RAG : résultat abandonné
+        speculative.cancel()
+        speculative_retrieval_stats["dropped"] += 1
+        cp.print_info("[Retrieval] Recherche spéculative abandonnée")
+        return result
+
+    try:
+        docs = await speculative
+    except Exception as e:
+        speculative_retrieval_stats["failed"] += 1
+        cp.print_warning(f"[Retrieval] Recherche spéculative échouée: {e}")
+        return result
+
+    return {**result, "speculative_docs": docs}
+
+# ================================
+# RÉPONSE DIRECTE
+# ================================
+
+def _direct_answer_result(state: IntelligentRAGState, response) -> Dict[str, Any]:
+    """Construit le résultat d'une réponse directe"""
+    answer = response.content.strip()
+
+    cp.print_success("Réponse directe générée")
+
+    return {
+        "answer": answer,
+        "context": [],
+        "sources": [],
+        "processing_steps": state.get("processing_steps", []) + ["Direct answer generated"]
+    }
+
+def _direct_answer_error_result(state: IntelligentRAGState, e: Exception) -> Dict[str, Any]:
+    """Résultat de secours si la réponse directe échoue"""
+    cp.print_error(f"Erreur: {e}")
+    return {
+        "answer": "Je suis désolé, je rencontre une difficulté technique. Pouvez-vous reformuler votre question ?",
+        "context": [],
+        "sources": [],
+        "processing_steps": state.get("processing_steps", []) + ["Direct answer failed"],
+        "error": str(e)
+    }
 
 def direct_answer_node(state: IntelligentRAGState) -> Dict[str, Any]:
     """
     Génère une réponse directe sans recherche documentaire
     """
     cp.print_step("Génération de réponse directe")
-    
+
     try:
         # Récupérer la liste token tracker du state
         token_tracker = state.get("token_tracker", [])
         session_id = state.get("session_id", "unknown")
-        
+
         prompt = get_direct_answer_prompt(state['input_question'])
 
         # Utiliser le tracking manuel pour récupérer les vrais tokens
         track_result = track_openai_call_manual(
-            llm=llm, 
-            prompt=prompt, 
-            operation="direct_answer", 
-            token_tracker=token_tracker, 
+            llm=llm,
+            prompt=prompt,
+            operation="direct_answer",
+            token_tracker=token_tracker,
             session_id=session_id
         )
-        response = track_result["response"]
-        token_info = track_result["tokens"]
-        cp.print_info(f"Tokens utilisés: {token_info['total']} (prompt: {token_info['prompt']}, completion: {token_info['completion']})")
-            
-        answer = response.content.strip()
-        
-        cp.print_success("Réponse directe générée")
-        
-        return {
-            "answer": answer,
-            "context": [],
-            "sources": [],
-            "processing_steps": state.get("processing_steps", []) + ["Direct answer generated"]
-        }
-        
+        _log_token_usage(track_result)
+
+        return _direct_answer_result(state, track_result["response"])
+
     except Exception as e:
-        cp.print_error(f"Erreur: {e}")
-        return {
-            "answer": "Je suis désolé, je rencontre une difficulté technique. Pouvez-vous reformuler votre question ?",
-            "context": [],
-            "sources": [],
-            "processing_steps": state.get("processing_steps", []) + ["Direct answer failed"],
-            "error": str(e)
-        }
+        return _direct_answer_error_result(state, e)
+
+async def adirect_answer_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Version asynchrone de direct_answer_node
+    """
+    cp.print_step("Génération de réponse directe")
+
+    try:
+        token_tracker = state.get("token_tracker", [])
+        session_id = state.get("session_id", "unknown")
+
+        prompt = get_direct_answer_prompt(state['input_question'])
+
+        track_result = await atrack_openai_call_manual(
+            llm=llm,
+            prompt=prompt,
+            operation="direct_answer",
+            token_tracker=token_tracker,
+            session_id=session_id
+        )
+        _log_token_usage(track_result)
+
+        return _direct_answer_result(state, track_result["response"])
+
+    except Exception as e:
+        return _direct_answer_error_result(state, e)
+
+# ================================
+# RÉCUPÉRATION DE DOCUMENTS
+# ================================
+
+def _retrieve_docs_for_intent(state: IntelligentRAGState) -> List[Any]:
+    """Choisit la stratégie de récupération selon l'intention détectée"""
+    intent_analysis = state.get("intent_analysis")
+    if not intent_analysis:
+        raise ValueError("Intent analysis not found")
+
+    cp.print_step(f"Récupération pour intention: {intent_analysis['intent']}")
+
+    # Traitement unifié : seules les vues d'ensemble de spécialité ont un traitement spécial
+    if _uses_speciality_overview(intent_analysis):
+        return _retrieve_speciality_overview_docs(state)
+    # Traitement classique pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE
+    return _retrieve_general_docs(state)
+
+def _retrieve_and_rerank(state: IntelligentRAGState) -> Tuple[List[Any], Optional[Dict[str, Any]]]:
+    """
+    Récupère les candidats puis garde les plus pertinents (reranker).
+    Les vues d'ensemble ne sont pas rerankées : elles ont besoin du TOC de chaque semestre.
+    """
+    docs = _retrieve_docs_for_intent(state)
+    if _uses_speciality_overview(state["intent_analysis"]):
+        return docs, None
+    return reranker.rerank(_general_retrieval_query(state), docs, GENERAL_CONTEXT_DOCS)
+
+def _retrieval_result(state: IntelligentRAGState, docs: List[Any], rerank_report: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Construit le résultat du nœud de récupération"""
+    cp.print_success(f"{len(docs)} documents récupérés")
+
+    steps = ["Documents retrieved"]
+    if rerank_report:
+        steps.append(f"Documents reranked ({rerank_report['method']}): {rerank_report['kept']}/{rerank_report['candidates']} kept")
+    return {
+        "retrieved_docs": docs,
+        "rerank_report": rerank_report,
+        "processing_steps": state.get("processing_steps", []) + steps
+    }
+
+def _retrieval_error_result(state: IntelligentRAGState, e: Exception) -> Dict[str, Any]:
+    """Résultat de secours si la récupération échoue"""
+    cp.print_error(f"Erreur: {e}")
+    return {
+        "retrieved_docs": [],
+        "processing_steps": state.get("processing_steps", []) + ["Document retrieval failed"],
+        "error": str(e)
+    }
 
 def document_retrieval_node(state: IntelligentRAGState) -> Dict[str, Any]:
     """
     Récupère les documents pertinents selon l'intention
     """
     try:
-        intent_analysis = state.get("intent_analysis")
-        if not intent_analysis:
-            raise ValueError("Intent analysis not found")
-        
-        cp.print_step(f"Récupération pour intention: {intent_analysis['intent']}")
-        
-        # Traitement unifié : seules les vues d'ensemble de spécialité ont un traitement spécial
-        if intent_analysis["intent"] == IntentType.SYLLABUS_SPECIALITY_OVERVIEW and not intent_analysis["speciality"] == "GENERAL":
-            docs = _retrieve_speciality_overview_docs(state)
-        else:
-            # Traitement classique pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE
-            docs = _retrieve_general_docs(state)
-        
-        cp.print_success(f"{len(docs)} documents récupérés")
-        
-        return {
-            "retrieved_docs": docs,
-            "processing_steps": state.get("processing_steps", []) + ["Documents retrieved"]
-        }
-        
+        docs, rerank_report = _retrieve_and_rerank(state)
+        return _retrieval_result(state, docs, rerank_report)
+
     except Exception as e:
-        cp.print_error(f"Erreur: {e}")
-        return {
-            "retrieved_docs": [],
-            "processing_steps": state.get("processing_steps", []) + ["Document retrieval failed"],
-            "error": str(e)
-        }
+        return _retrieval_error_result(state, e)
 
+async def adocument_retrieval_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Version asynchrone de document_retrieval_node (Chroma est interrogé dans un pool de threads borné)
+    """
+    try:
+        docs, rerank_report = await _run_in_retrieval_pool(_retrieve_and_rerank, state)
+        return _retrieval_result(state, docs, rerank_report)
+
+    except Exception as e:
+        return _retrieval_error_result(state, e)
+
+@tracing.traced_retrieval
 def _retrieve_speciality_overview_docs(state: IntelligentRAGState) -> List[Any]:
     """Récupération spécialisée pour une vue d'ensemble des cours d'une spécialité"""
     intent_analysis = state["intent_analysis"]
     question = state["input_question"]
     speciality = intent_analysis.get("speciality")
-    
+
     try:
-        # Recherche directe par métadonnées pour les documents TOC
+        # Recherche directe dans l'index TOC précalculé (construit au chargement du vectorstore)
         cp.print_info(f"[Retrieval] Recherche TOC pour spécialité: {speciality}")
-        
-        # Récupérer TOUS les documents de la collection
-        collection = llmm.db.get()
-        all_docs = []
-        
-        # Reconstruire les documents avec leurs métadonnées
-        for i, doc_id in enumerate(collection['ids']):
-            metadata = collection['metadatas'][i]
-            content = collection['documents'][i]
-            
-            # Créer un objet Document-like
-            doc_obj = type('Document', (), {
-                'page_content': content,
-                'metadata': metadata
-            })()
-            all_docs.append(doc_obj)
-        
-        # Filtrer pour les documents TOC de la spécialité avec critères précis
-        filtered_docs = []
         speciality_name = speciality.value if speciality else None
-        
-        for doc in all_docs:
-            metadata = doc.metadata
-            
-            # 1. CRITÈRE PRINCIPAL : metadata.type doit être "toc"
-            metadata_type = str(metadata.get("metadata.type", "")).lower()
-            is_toc_doc = (metadata_type == "toc")
-            
-            # 2. CRITÈRE SPÉCIALITÉ : metadata.specialite doit correspondre
-            metadata_specialite = str(metadata.get("metadata.specialite", "")).upper()
-            speciality_match = True
-            
-            if speciality_name and speciality_name != "GENERAL":
-                # Correspondance exacte avec la spécialité
-                speciality_match = (metadata_specialite == speciality_name)
-            
-            # Les DEUX critères doivent être vrais
-            if is_toc_doc and speciality_match:
-                filtered_docs.append(doc)
-                cp.print_info(f"[Retrieval] TOC trouvé: type={metadata_type}, specialite={metadata_specialite}")
-        
+        filtered_docs = toc_index.get_toc_docs(speciality_name)
+        cp.print_info(f"[Retrieval] {len(filtered_docs)} TOC trouvés dans l'index pour {speciality_name}")
+
         # Si pas assez de documents TOC, faire une recherche complémentaire
         if len(filtered_docs) < 2:
             cp.print_warning(f"[Retrieval] Seulement {len(filtered_docs)} docs TOC trouvés, recherche complémentaire...")
-            
+
             # Recherche par similarité comme backup MAIS toujours avec les critères TOC
-            similarity_docs = llmm.db.similarity_search(question, k=15)
-            
+            with metrics.CHROMA_QUERY_SECONDS.labels(kind="toc").time():
+                similarity_docs = llmm.db.similarity_search(question, k=OVERVIEW_SEARCH_K, filter={"metadata.type": "toc"})
+
             for doc in similarity_docs:
-                if doc not in filtered_docs:
-                    metadata = doc.metadata
-                    
-                    # Vérifier TOUJOURS les critères TOC stricts
-                    metadata_type = str(metadata.get("metadata.type", "")).lower()
-                    metadata_specialite = str(metadata.get("metadata.specialite", "")).upper()
-                    
-                    is_toc_doc = (metadata_type == "toc")
-                    speciality_match = True
-                    
-                    if speciality_name and speciality_name != "GENERAL":
-                        speciality_match = (metadata_specialite == speciality_name)
-                    
-                    if is_toc_doc and speciality_match:
-                        filtered_docs.append(doc)
-                        cp.print_info(f"[Retrieval] TOC complémentaire: type={metadata_type}, specialite={metadata_specialite}")
-        
+                if doc not in filtered_docs and is_toc_for(doc.metadata, speciality_name):
+                    filtered_docs.append(doc)
+                    cp.print_info(f"[Retrieval] TOC complémentaire: specialite={doc.metadata.get('metadata.specialite')}")
+
         cp.print_success(f"[Retrieval] {len(filtered_docs)} documents TOC récupérés au total")
-        return filtered_docs[:12]  # Garder plus de documents pour une vue d'ensemble complète
-        
+        return filtered_docs[:OVERVIEW_MAX_DOCS]  # Garder plus de documents pour une vue d'ensemble complète
+
     except Exception as e:
         cp.print_error(f"[Retrieval] Erreur récupération vue d'ensemble spécialité: {e}")
         import traceback
         traceback.print_exc()
         return []
 
-def _filter_by_speciality(docs: List[Any], speciality: SpecialityType) -> List[Any]:
-    """Filtre les documents par spécialité"""
-    if not speciality:
-        return docs
-    
-    # Mots-clés par spécialité pour filtrage
-    speciality_keywords = {
-        SpecialityType.MAIN: ["main", "mathématiques appliquées", "informatique"],
-        SpecialityType.AGRAL: ["agral", "agroalimentaire"],
-        SpecialityType.EISE: ["eise", "électronique", "systèmes embarqués"],
-        SpecialityType.EI2I: ["ei2i", "électronique", "informatique industrielle"],
-        SpecialityType.GM: ["gm", "génie mécanique", "mécanique"],
-        SpecialityType.MTX: ["mtx", "matériaux"],
-        SpecialityType.ROB: ["rob", "robotique"],
-        SpecialityType.ST: ["st", "sciences de la terre", "géologie"]
+# ================================
+# GÉNÉRATION RAG
+# ================================
+
+def _plan_rag_generation(state: IntelligentRAGState) -> Optional[Dict[str, Any]]:
+    """
+    Prépare la génération RAG selon l'intention.
+
+    Returns:
+        None si aucun document n'a été récupéré (fallback RAG standard),
+        un résultat final si la génération n'est pas nécessaire ("answer" présent),
+        sinon un plan {"prompt", "operation", "docs", "step", "log"} à envoyer au LLM.
+    """
+    intent_analysis = state.get("intent_analysis")
+    retrieved_docs = state.get("retrieved_docs", [])
+
+    if not retrieved_docs:
+        return None
+
+    # Génération simplifiée : seules les vues d'ensemble de spécialité ont un traitement spécial
+    if intent_analysis and intent_analysis["intent"] == IntentType.SYLLABUS_SPECIALITY_OVERVIEW:
+        return _plan_speciality_overview_response(state, retrieved_docs)
+    # Traitement unifié pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE
+    return _plan_general_response(state, retrieved_docs)
+
+def _rag_generation_result(state: IntelligentRAGState, plan: Dict[str, Any], track_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Construit le résultat de la génération RAG à partir de la réponse du LLM"""
+    _log_token_usage(track_result)
+
+    answer = track_result["response"].content.strip()
+    docs = plan["docs"]
+
+    # Extraire les sources
+    sources = get_sources(docs) if docs else []
+
+    cp.print_success(plan["log"])
+
+    return {
+        "answer": answer,
+        "context": docs,
+        "sources": sources,
+        "processing_steps": state.get("processing_steps", []) + [plan["step"]]
+    }
+
+def _rag_generation_error_result(state: IntelligentRAGState, e: Exception) -> Dict[str, Any]:
+    """Résultat de secours si la génération RAG échoue"""
+    cp.print_error(f"[RAG] Erreur: {e}")
+    return {
+        "answer": "Je suis désolé, je rencontre une difficulté pour traiter votre demande.",
+        "context": [],
+        "sources": [],
+        "processing_steps": state.get("processing_steps", []) + ["RAG generation failed"],
+        "error": str(e)
     }
-    
-    if speciality not in speciality_keywords:
-        return docs
-    
-    keywords = speciality_keywords[speciality]
-    filtered_docs = []
-    
-    for doc in docs:
-        metadata = doc.metadata
-        tags = str(metadata.get("tags", "")).lower()
-        title = str(metadata.get("metadata.title", "")).lower()
-        specialite = str(metadata.get("metadata.specialite", "")).lower()
-        
-        # Vérifier la correspondance de spécialité
-        speciality_match = any(
-            keyword in text for text in [tags, title, specialite]
-            for keyword in keywords
-        )
-        
-        if speciality_match:
-            filtered_docs.append(doc)
-    
-    return filtered_docs
 
 def rag_generation_node(state: IntelligentRAGState) -> Dict[str, Any]:
     """
     Génère une réponse en utilisant les documents récupérés
     """
     try:
-        intent_analysis = state.get("intent_analysis")
-        retrieved_docs = state.get("retrieved_docs", [])
-        
-        if not retrieved_docs:
+        plan = _plan_rag_generation(state)
+
+        if plan is None:
             # Fallback vers RAG standard
             cp.print_warning("[RAG] Pas de documents, utilisation RAG standard")
             return _fallback_rag_generation(state)
-        
-        # Génération simplifiée : seules les vues d'ensemble de spécialité ont un traitement spécial
-        if intent_analysis and intent_analysis["intent"] == IntentType.SYLLABUS_SPECIALITY_OVERVIEW:
-            return _generate_speciality_overview_response(state, retrieved_docs)
-        else:
-            # Traitement unifié pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE
-            return _generate_general_response(state, retrieved_docs)
-            
+        if "answer" in plan:
+            return plan
+
+        # Utiliser le tracking manuel pour récupérer les vrais tokens
+        track_result = track_openai_call_manual(
+            llm=llm,
+            prompt=plan["prompt"],
+            operation=plan["operation"],
+            token_tracker=state.get("token_tracker", []),
+            session_id=state.get("session_id", "unknown")
+        )
+        return _rag_generation_result(state, plan, track_result)
+
     except Exception as e:
-        cp.print_error(f"[RAG] Erreur: {e}")
-        return {
-            "answer": "Je suis désolé, je rencontre une difficulté pour traiter votre demande.",
-            "context": [],
-            "sources": [],
-            "processing_steps": state.get("processing_steps", []) + ["RAG generation failed"],
-            "error": str(e)
-        }
+        return _rag_generation_error_result(state, e)
+
+async def arag_generation_node(state: IntelligentRAGState) -> Dict[str, Any]:
+    """
+    Version asynchrone de rag_generation_node
+    """
+    try:
+        plan = _plan_rag_generation(state)
+
+        if plan is None:
+            # Fallback vers RAG standard
+            cp.print_warning("[RAG] Pas de documents, utilisation RAG standard")
+            return await _afallback_rag_generation(state)
+        if "answer" in plan:
+            return plan
+
+        track_result = await atrack_openai_call_manual(
+            llm=llm,
+            prompt=plan["prompt"],
+            operation=plan["operation"],
+            token_tracker=state.get("token_tracker", []),
+            session_id=state.get("session_id", "unknown")
+        )
+        return _rag_generation_result(state, plan, track_result)
+
+    except Exception as e:
+        return _rag_generation_error_result(state, e)
+
+def _plan_general_response(state: IntelligentRAGState, docs: List[Any]) -> Dict[str, Any]:
+    """Prépare une réponse générale (pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE)"""
 
-def _generate_general_response(state: IntelligentRAGState, docs: List[Any]) -> Dict[str, Any]:
-    """Génère une réponse générale (pour RAG_NEEDED et SYLLABUS_SPECIFIC_COURSE)"""
-    
     if not docs:
         return {
             "answer": "Je n'ai pas trouvé d'informations correspondant à votre question dans ma base de données.",
@@ -376,17 +703,16 @@ def _generate_general_response(state: IntelligentRAGState, docs: List[Any]) -> D
             "sources": [],
             "processing_steps": state.get("processing_steps", []) + ["No general documents found"]
         }
-    
-    context_text = "\n\n".join([doc.page_content for doc in docs[:6]])
-    
-    # Utiliser l'historique si nécessaire
+
+    # Contexte : chunks adjacents fusionnés, dans le budget de tokens de l'intention
     intent_analysis = state.get("intent_analysis")
+    packed = pack_context(docs, intent_analysis["intent"] if intent_analysis else None)
+    context_text = packed["text"]
+
+    # Utiliser l'historique si nécessaire
     history_context = ""
-    if intent_analysis and intent_analysis.get("needs_history") and state.get("chat_history"):
-        history_context = "\n".join([
-            f"User: {msg['content']}" if msg['role'] == "user" else f"Assistant: {msg['content']}"
-            for msg in state["chat_history"]
-        ])
+    if intent_analysis and intent_analysis.get("needs_history") and (state.get("chat_history") or state.get("conversation_summary")):
+        history_context = _history_with_summary(state, state.get("chat_history") or [])
         history_context = f"\n\nHistorique de conversation:\n{history_context}\n"
 
     # Utiliser la reformulation si disponible
@@ -402,41 +728,19 @@ def _generate_general_response(state: IntelligentRAGState, docs: List[Any]) -> D
         history_context=history_context
     )
 
-    # Récupérer la liste token tracker du state
-    token_tracker = state.get("token_tracker", [])
-    session_id = state.get("session_id", "unknown")
-    
-    # Utiliser le tracking manuel pour récupérer les vrais tokens
-    track_result = track_openai_call_manual(
-        llm=llm, 
-        prompt=prompt, 
-        operation="rag_generation_general", 
-        token_tracker=token_tracker, 
-        session_id=session_id
-    )
-    response = track_result["response"]
-    token_info = track_result["tokens"]
-    cp.print_info(f"Tokens utilisés: {token_info['total']} (prompt: {token_info['prompt']}, completion: {token_info['completion']})")
-        
-    answer = response.content.strip()
-    
-    # Extraire les sources
-    sources = get_sources(docs) if docs else []
-    
-    cp.print_success(f"[RAG] Réponse générale générée avec {len(docs)} documents")
-    
     return {
-        "answer": answer,
-        "context": docs,
-        "sources": sources,
-        "processing_steps": state.get("processing_steps", []) + ["General response generated"]
+        "prompt": prompt,
+        "operation": "rag_generation_general",
+        "docs": packed["docs"],
+        "step": "General response generated",
+        "log": f"[RAG] Réponse générale générée avec {packed['chunks_used']} documents ({packed['tokens']} tokens de contexte)"
     }
 
-def _generate_speciality_overview_response(state: IntelligentRAGState, docs: List[Any]) -> Dict[str, Any]:
-    """Génère une réponse spécialisée pour une vue d'ensemble des cours d'une spécialité"""
+def _plan_speciality_overview_response(state: IntelligentRAGState, docs: List[Any]) -> Dict[str, Any]:
+    """Prépare une réponse spécialisée pour une vue d'ensemble des cours d'une spécialité"""
     intent_analysis = state.get("intent_analysis")
     speciality = intent_analysis.get("speciality") if intent_analysis else None
-    
+
     if not docs:
         speciality_name = speciality.value if speciality else "la spécialité demandée"
         return {
@@ -445,20 +749,19 @@ def _generate_speciality_overview_response(state: IntelligentRAGState, docs: Lis
             "sources": [],
             "processing_steps": state.get("processing_steps", []) + ["No speciality overview documents found"]
         }
-    
-    context_text = "\n\n".join([doc.page_content for doc in docs[:8]])
-    
+
+    # Contexte : chunks adjacents fusionnés, dans le budget de tokens de l'intention
+    packed = pack_context(docs, IntentType.SYLLABUS_SPECIALITY_OVERVIEW)
+    context_text = packed["text"]
+
     # Utiliser l'historique si nécessaire
     history_context = ""
-    if intent_analysis and intent_analysis.get("needs_history") and state.get("chat_history"):
-        history_context = "\n".join([
-            f"User: {msg['content']}" if msg['role'] == "user" else f"Assistant: {msg['content']}"
-            for msg in state["chat_history"]
-        ])
+    if intent_analysis and intent_analysis.get("needs_history") and (state.get("chat_history") or state.get("conversation_summary")):
+        history_context = _history_with_summary(state, state.get("chat_history") or [])
         history_context = f"\n\nHistorique de conversation:\n{history_context}\n"
-    
+
     speciality_name = speciality.value if speciality else "la spécialité"
-    
+
     prompt = get_speciality_overview_prompt(
         input_question=state['input_question'],
         context_text=context_text,
@@ -466,34 +769,35 @@ def _generate_speciality_overview_response(state: IntelligentRAGState, docs: Lis
         history_context=history_context
     )
 
-    # Récupérer la liste token tracker du state
-    token_tracker = state.get("token_tracker", [])
-    session_id = state.get("session_id", "unknown")
-    
-    # Utiliser le tracking manuel pour récupérer les vrais tokens
-    track_result = track_openai_call_manual(
-        llm=llm, 
-        prompt=prompt, 
-        operation="rag_generation_speciality", 
-        token_tracker=token_tracker, 
-        session_id=session_id
-    )
-    response = track_result["response"]
-    token_info = track_result["tokens"]
-    cp.print_info(f"Tokens utilisés: {token_info['total']} (prompt: {token_info['prompt']}, completion: {token_info['completion']})")
-        
-    answer = response.content.strip()
-    
-    # Extraire les sources
-    sources = get_sources(docs) if docs else []
-    
-    cp.print_success(f"[RAG] Réponse vue d'ensemble spécialité générée avec {len(docs)} documents")
-    
     return {
-        "answer": answer,
-        "context": docs,
+        "prompt": prompt,
+        "operation": "rag_generation_speciality",
+        "docs": packed["docs"],
+        "step": "speciality overview response generated",
+        "log": f"[RAG] Réponse vue d'ensemble spécialité générée avec {packed['chunks_used']} documents ({packed['tokens']} tokens de contexte)"
+    }
+
+def _fallback_result(state: IntelligentRAGState, response: Dict[str, Any]) -> Dict[str, Any]:
+    """Construit le résultat de la génération RAG de secours"""
+    context_docs = response.get("context", [])
+    sources = get_sources(context_docs) if context_docs else []
+
+    return {
+        "answer": response.get("answer", ""),
+        "context": context_docs,
         "sources": sources,
-        "processing_steps": state.get("processing_steps", []) + ["speciality overview response generated"]
+        "processing_steps": state.get("processing_steps", []) + ["Fallback RAG used"]
+    }
+
+def _fallback_error_result(state: IntelligentRAGState, e: Exception) -> Dict[str, Any]:
+    """Résultat si la génération RAG de secours échoue"""
+    cp.print_error(f"[RAG] Erreur fallback: {e}")
+    return {
+        "answer": "Je suis désolé, je ne peux pas traiter votre demande pour le moment.",
+        "context": [],
+        "sources": [],
+        "processing_steps": state.get("processing_steps", []) + ["Fallback RAG failed"],
+        "error": str(e)
     }
 
 def _fallback_rag_generation(state: IntelligentRAGState) -> Dict[str, Any]:
@@ -504,41 +808,40 @@ def _fallback_rag_generation(state: IntelligentRAGState) -> Dict[str, Any]:
             "input": state["input_question"],
             "chat_history": state.get("chat_history", [])
         })
-        
-        context_docs = response.get("context", [])
-        sources = get_sources(context_docs) if context_docs else []
-        
-        return {
-            "answer": response.get("answer", ""),
-            "context": context_docs,
-            "sources": sources,
-            "processing_steps": state.get("processing_steps", []) + ["Fallback RAG used"]
-        }
-        
+        return _fallback_result(state, response)
+
     except Exception as e:
-        cp.print_error(f"[RAG] Erreur fallback: {e}")
-        return {
-            "answer": "Je suis désolé, je ne peux pas traiter votre demande pour le moment.",
-            "context": [],
-            "sources": [],
-            "processing_steps": state.get("processing_steps", []) + ["Fallback RAG failed"],
-            "error": str(e)
-        }
+        return _fallback_error_result(state, e)
+
+async def _afallback_rag_generation(state: IntelligentRAGState) -> Dict[str, Any]:
+    """Génération RAG de secours (asynchrone)"""
+    try:
+        rag_chain = initialize_the_rag_chain()
+        response = await rag_chain.ainvoke({
+            "input": state["input_question"],
+            "chat_history": state.get("chat_history", [])
+        })
+        return _fallback_result(state, response)
+
+    except Exception as e:
+        return _fallback_error_result(state, e)
 
 def _retrieve_general_docs(state: IntelligentRAGState) -> List[Any]:
     """Récupération classique pour les documents généraux (RAG standard)"""
-    reformulated_question = state.get("intent_analysis", {}).get("reformulation")
-    if reformulated_question:
-        question = reformulated_question
-    else:
-        question = state["input_question"]
-    
+    question = _general_retrieval_query(state)
+
     try:
-        # Recherche standard avec similarité
-        docs = llmm.db.similarity_search(question, k=12)
+        # Résultat de la recherche lancée pendant l'analyse d'intention, si elle portait sur la même requête
+        if state.get("speculative_docs") is not None and _speculation_usable(state):
+            speculative_retrieval_stats["reused"] += 1
+            cp.print_info("[Retrieval] Recherche spéculative réutilisée")
+            return state["speculative_docs"]
+
+        # Recherche avec les filtres de métadonnées déduits de l'intention
+        docs = _filtered_similarity_search(question, _build_metadata_filter(state))
         cp.print_debug(f"[Retrieval] taille des docs {llmm.db._collection.count()}")
-        return docs[:8]  # Garder les 8 meilleurs documents
-        
+        return docs  # Tous les candidats : le reranker garde les meilleurs
+
     except Exception as e:
         cp.print_error(f"[Retrieval] Erreur récupération générale: {e}")
         return []
@@ -3,28 +3,18 @@ OpenAI Token Tracking Helper
 Fonctions pour tracker manuellement les vrais tokens des réponses OpenAI
 """
 
+import time
 from typing import Dict, Any, Optional, List
 from langchain_core.messages import HumanMessage
+from .. import metrics
 from color_utils import cp
 
-def track_openai_call_manual(llm, prompt: str, operation: str, token_tracker: List[Dict[str, Any]], session_id: str) -> Dict[str, Any]:
+def _record_openai_call(llm, response, prompt: str, operation: str, token_tracker: List[Dict[str, Any]], session_id: str,
+                        duration: float = 0.0) -> Dict[str, Any]:
     """
-    Effectue un appel OpenAI et track les vrais tokens de la réponse
-    
-    Args:
-        llm: L'instance LLM
-        prompt: Le prompt à envoyer
-        operation: Le nom de l'opération ("intent_analysis", "rag_generation", etc.)
-        token_tracker: La liste pour tracker les tokens
-        session_id: L'ID de session
-    
-    Returns:
-        dict: {"response": response, "tokens": {"prompt": X, "completion": Y, "total": Z}}
+    Extrait les vrais tokens d'une réponse OpenAI et les ajoute au token tracker
+    (partagé entre les versions synchrone et asynchrone du tracking)
     """
-    
-    # Effectuer l'appel OpenAI
-    response = llm.invoke([HumanMessage(content=prompt)])
-    
     # Extraire les vraies informations de tokens si disponibles
     prompt_tokens = 0
     completion_tokens = 0
@@ -32,7 +22,12 @@ def track_openai_call_manual(llm, prompt: str, operation: str, token_tracker: Li
     model_name = getattr(llm, 'model_name', 'gpt-4o-mini')
     
     # Essayer de récupérer les vrais tokens depuis la réponse
-    if hasattr(response, 'response_metadata'):
+    if getattr(response, 'usage_metadata', None):
+        # Réponses streamées (stream_usage=True) : pas de token_usage dans response_metadata
+        prompt_tokens = response.usage_metadata.get('input_tokens', 0)
+        completion_tokens = response.usage_metadata.get('output_tokens', 0)
+        total_tokens = response.usage_metadata.get('total_tokens', 0)
+    elif hasattr(response, 'response_metadata'):
         #cp.print_debug(f"Response metadata: {response.response_metadata}")
         token_usage = response.response_metadata.get('token_usage', {})
         prompt_tokens = token_usage.get('prompt_tokens', 0)
@@ -59,9 +54,11 @@ def track_openai_call_manual(llm, prompt: str, operation: str, token_tracker: Li
         "completion_tokens": completion_tokens,
         "total_tokens": total_tokens,
         "model": model_name,
-        "operation": operation
+        "operation": operation,
+        "duration_ms": duration * 1000
     }
     token_tracker.append(tracking_entry)
+    metrics.record_openai_call(operation, model_name, duration, prompt_tokens, completion_tokens)
     
     return {
         "response": response,
@@ -73,6 +70,41 @@ def track_openai_call_manual(llm, prompt: str, operation: str, token_tracker: Li
         }
     }
 
+def track_openai_call_manual(llm, prompt: str, operation: str, token_tracker: List[Dict[str, Any]], session_id: str) -> Dict[str, Any]:
+    """
+    Effectue un appel OpenAI et track les vrais tokens de la réponse
+    
+    Args:
+        llm: L'instance LLM
+        prompt: Le prompt à envoyer
+        operation: Le nom de l'opération ("intent_analysis", "rag_generation", etc.)
+        token_tracker: La liste pour tracker les tokens
+        session_id: L'ID de session
+    
+    Returns:
+        dict: {"response": response, "tokens": {"prompt": X, "completion": Y, "total": Z}}
+    """
+    
+    # Effectuer l'appel OpenAI
+    start = time.perf_counter()
+    response = llm.invoke([HumanMessage(content=prompt)])
+    
+    return _record_openai_call(llm, response, prompt, operation, token_tracker, session_id, time.perf_counter() - start)
+
+async def atrack_openai_call_manual(llm, prompt: str, operation: str, token_tracker: List[Dict[str, Any]], session_id: str) -> Dict[str, Any]:
+    """
+    Version asynchrone de track_openai_call_manual (n'occupe pas la boucle d'événements pendant l'appel)
+    
+    Returns:
+        dict: {"response": response, "tokens": {"prompt": X, "completion": Y, "total": Z}}
+    """
+    
+    # Effectuer l'appel OpenAI
+    start = time.perf_counter()
+    response = await llm.ainvoke([HumanMessage(content=prompt)])
+    
+    return _record_openai_call(llm, response, prompt, operation, token_tracker, session_id, time.perf_counter() - start)
+
 def get_tokens_from_response(response) -> Dict[str, int]:
     """
     Extrait les informations de tokens d'une réponse OpenAI
@@ -49,6 +49,20 @@ Question:
 
 Return only valid JSON:"""
 
+# Prompt pour le résumé glissant des conversations longues
+CONVERSATION_SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and Polybot, the assistant of Polytech Sorbonne.
+Update the existing summary with the new messages. Keep the facts the user gave (speciality, year, situation), the topics discussed,
+the courses, specialities and names mentioned and any open question, so that later questions referring to them can be understood.
+Write in the language of the conversation, in at most {max_words} words, without any preamble.
+
+Existing summary:
+{summary}
+
+New messages:
+{history_text}
+
+Updated summary:"""
+
 # Prompt pour les réponses directes
 DIRECT_ANSWER_PROMPT = """You are Polybot, the virtual assistant for Polytech Sorbonne.
 
@@ -126,6 +140,14 @@ def get_intent_analysis_prompt(input_question: str, history_text: str = "") -> s
         history_text=history_text
     )
 
+def get_conversation_summary_prompt(summary: str, history_text: str, max_words: int) -> str:
+    """Retourne le prompt formaté pour la mise à jour du résumé de conversation"""
+    return CONVERSATION_SUMMARY_PROMPT.format(
+        summary=summary or "(none)",
+        history_text=history_text,
+        max_words=max_words
+    )
+
 def get_direct_answer_prompt(input_question: str) -> str:
     """Retourne le prompt formaté pour les réponses directes"""
     return DIRECT_ANSWER_PROMPT.format(input_question=input_question)
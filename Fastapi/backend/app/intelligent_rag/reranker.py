@@ -0,0 +1,214 @@
+"""
+Intelligent RAG System - Reranker
+Rescore des documents récupérés avant la génération : cross-encoder local (sentence_transformers)
+si disponible, sinon MMR sur les embeddings. Seuls les documents au-dessus du seuil sont envoyés au LLM.
+"""
+
+import os
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .. import llmm
+from .context_packer import count_tokens
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    CROSS_ENCODER_AVAILABLE = False
+
+# Configuration (variables d'environnement)
+# "auto" : cross-encoder si sentence_transformers est installé, sinon MMR ; "none" désactive le rerank.
+# sentence_transformers (et torch) n'est pas dans requirements.txt : MMR est le reranker livré par défaut
+RERANKER = os.getenv("RERANKER", "auto").lower()
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")  # multilingue
+RERANKER_MIN_SCORE = float(os.getenv("RERANKER_MIN_SCORE", "0.2"))  # probabilité (sigmoïde) du cross-encoder
+RERANKER_MMR_LAMBDA = float(os.getenv("RERANKER_MMR_LAMBDA", "0.7"))
+RERANKER_MMR_MARGIN = float(os.getenv("RERANKER_MMR_MARGIN", "0.08"))  # écart de similarité toléré avec le meilleur document
+RERANKER_MIN_DOCS = int(os.getenv("RERANKER_MIN_DOCS", "2"))
+
+# Contrôle au chargement : un passage sans rapport doit tomber sous RERANKER_MIN_SCORE
+CALIBRATION_QUESTION = "Quels sont les frais d'inscription à Polytech Sorbonne ?"
+CALIBRATION_RELEVANT = "Les frais d'inscription à Polytech Sorbonne sont de 601 euros par an pour les élèves ingénieurs."
+CALIBRATION_IRRELEVANT = "La ratatouille se prépare avec des aubergines, des courgettes, des poivrons et des tomates."
+
+# Compteurs cumulés (exposés par GET /intelligent-rag/stats/reranker)
+_stats_lock = threading.Lock()
+rerank_stats = {"reranked": 0, "skipped": 0, "failed": 0, "candidates": 0, "kept": 0, "tokens_saved": 0,
+                "embedded_docs": 0}  # documents sans vecteur stocké, embeddés par MMR
+
+class CrossEncoderReranker:
+    """Cross-encoder sentence_transformers, chargé au premier appel (ou au préchauffage)"""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = RERANKER_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self.calibration: Optional[Dict[str, Any]] = None
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                self._model = CrossEncoder(self.model_name, device="cpu")
+                cp.print_info(f"[Reranker] Cross-encoder chargé: {self.model_name}")
+                self._check_calibration(self._model)
+        return self._model
+
+    @staticmethod
+    def _probabilities(model, question: str, passages: List[str]) -> np.ndarray:
+        # predict applique déjà la sigmoïde aux modèles à une sortie (activation par défaut) : scores dans [0, 1]
+        return np.asarray(model.predict([(question, passage) for passage in passages]), dtype=np.float32)
+
+    def _check_calibration(self, model):
+        """Vérifie qu'un passage pertinent passe le seuil et qu'un passage sans rapport tombe dessous"""
+        relevant, irrelevant = self._probabilities(
+            model, CALIBRATION_QUESTION, [CALIBRATION_RELEVANT, CALIBRATION_IRRELEVANT]
+        )
+        self.calibration = {
+            "relevant": round(float(relevant), 4),
+            "irrelevant": round(float(irrelevant), 4),
+            "ok": bool(irrelevant < RERANKER_MIN_SCORE <= relevant),
+        }
+        if self.calibration["ok"]:
+            cp.print_info(f"[Reranker] Calibration OK (pertinent {relevant:.3f}, sans rapport {irrelevant:.3f}, seuil {RERANKER_MIN_SCORE})")
+        else:
+            cp.print_warning(
+                f"[Reranker] Scores incohérents avec RERANKER_MIN_SCORE={RERANKER_MIN_SCORE} : "
+                f"pertinent {relevant:.3f}, sans rapport {irrelevant:.3f} (le filtrage par seuil ne trie plus)"
+            )
+
+    def select(self, question: str, docs: List[Any], max_docs: int) -> List[Any]:
+        probabilities = self._probabilities(self.load(), question, [doc.page_content for doc in docs])
+        order = np.argsort(-probabilities)
+        kept = [i for i in order if probabilities[i] >= RERANKER_MIN_SCORE][:max_docs]
+        if len(kept) < RERANKER_MIN_DOCS:
+            kept = list(order[:RERANKER_MIN_DOCS])
+        return [docs[i] for i in kept]
+
+class MMRReranker:
+    """
+    Maximal Marginal Relevance sur l'embedding (en cache) de la question et les vecteurs des documents
+    stockés dans Chroma : les chunks ont été embeddés à la vectorisation, pas d'appel d'embedding par requête
+    """
+
+    name = "mmr"
+
+    def load(self):
+        return None
+
+    @staticmethod
+    def _document_vectors(docs: List[Any]) -> np.ndarray:
+        """Vecteurs stockés des documents (par id Chroma) ; seuls les documents sans vecteur connu sont embeddés"""
+        ids = list(dict.fromkeys(doc.id for doc in docs if getattr(doc, "id", None)))
+        stored = {}
+        if ids:
+            result = llmm.db._collection.get(ids=ids, include=["embeddings"])
+            stored = dict(zip(result["ids"], result["embeddings"]))
+        missing = [i for i, doc in enumerate(docs) if getattr(doc, "id", None) not in stored]
+        vectors = [stored.get(getattr(doc, "id", None)) for doc in docs]
+        if missing:
+            embedded = llmm.embeddings.embed_documents([docs[i].page_content for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+            _count(embedded_docs=len(missing))
+        return np.asarray([np.asarray(vector, dtype=np.float32) for vector in vectors], dtype=np.float32)
+
+    def select(self, question: str, docs: List[Any], max_docs: int) -> List[Any]:
+        query = np.asarray(llmm.embeddings.embed_query(question), dtype=np.float32)
+        matrix = self._document_vectors(docs)
+        query /= max(np.linalg.norm(query), 1e-12)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        relevance = matrix @ query
+        # Seuil relatif : l'échelle des similarités dépend du modèle d'embeddings
+        cutoff = float(relevance.max()) - RERANKER_MMR_MARGIN
+        candidates = [i for i in range(len(docs)) if relevance[i] >= cutoff]
+        if len(candidates) < RERANKER_MIN_DOCS:
+            candidates = list(np.argsort(-relevance)[:RERANKER_MIN_DOCS])
+
+        selected: List[int] = []
+        while candidates and len(selected) < max_docs:
+            def mmr_score(i):
+                redundancy = max((float(matrix[i] @ matrix[j]) for j in selected), default=0.0)
+                return RERANKER_MMR_LAMBDA * float(relevance[i]) - (1 - RERANKER_MMR_LAMBDA) * redundancy
+            best = max(candidates, key=mmr_score)
+            selected.append(best)
+            candidates.remove(best)
+        return [docs[i] for i in selected]
+
+def _create_reranker():
+    if RERANKER == "none":
+        return None
+    if RERANKER in ("auto", "cross_encoder") and CROSS_ENCODER_AVAILABLE:
+        return CrossEncoderReranker()
+    if RERANKER == "cross_encoder":
+        cp.print_warning("[Reranker] sentence_transformers non installé, utilisation de MMR")
+    return MMRReranker()
+
+reranker = _create_reranker()
+
+def _count(**values: int):
+    with _stats_lock:
+        for name, value in values.items():
+            rerank_stats[name] += value
+
+def get_stats() -> Dict[str, Any]:
+    """Statistiques cumulées du reranker"""
+    with _stats_lock:
+        stats = dict(rerank_stats)
+    return {
+        **stats,
+        "method": reranker.name if reranker is not None else "none",
+        "model": getattr(reranker, "model_name", None),
+        "min_score": RERANKER_MIN_SCORE,
+        "calibration": getattr(reranker, "calibration", None),
+        "avg_tokens_saved": stats["tokens_saved"] / stats["reranked"] if stats["reranked"] else 0.0
+    }
+
+def load_reranker():
+    """Charge le modèle du reranker (appelé au préchauffage)"""
+    if reranker is not None:
+        reranker.load()
+
+def rerank(question: str, docs: List[Any], max_docs: int) -> Tuple[List[Any], Optional[Dict[str, Any]]]:
+    """
+    Garde au plus max_docs documents jugés pertinents.
+
+    Returns:
+        (documents gardés, rapport {"method", "candidates", "kept", "tokens_before", "tokens_after", "tokens_saved"})
+        Sans reranker, ou en cas d'erreur, les max_docs premiers documents et None.
+    """
+    baseline = docs[:max_docs]
+    if reranker is None or len(docs) <= RERANKER_MIN_DOCS:
+        _count(skipped=1)
+        return baseline, None
+
+    try:
+        kept = reranker.select(question, docs, max_docs)
+    except Exception as e:
+        _count(failed=1)
+        cp.print_warning(f"[Reranker] Rerank impossible ({reranker.name}): {e}")
+        return baseline, None
+
+    # Comparaison avec ce qui aurait été envoyé au LLM sans rerank
+    tokens_before = sum(count_tokens(doc.page_content) for doc in baseline)
+    tokens_after = sum(count_tokens(doc.page_content) for doc in kept)
+    report = {
+        "method": reranker.name,
+        "candidates": len(docs),
+        "kept": len(kept),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after
+    }
+    _count(reranked=1, candidates=len(docs), kept=len(kept), tokens_saved=report["tokens_saved"])
+    cp.print_info(f"[Reranker] {len(kept)}/{len(docs)} documents gardés ({reranker.name}), ~{report['tokens_saved']} tokens économisés")
+    return kept, report
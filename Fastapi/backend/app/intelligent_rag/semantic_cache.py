@@ -0,0 +1,231 @@
+"""
+Intelligent RAG System - Semantic Answer Cache
+Cache sémantique des réponses : une question (reformulée) suffisamment proche d'une
+question déjà traitée réutilise la réponse et les sources stockées, sans appel LLM.
+Deux questions qui ne diffèrent que par la spécialité, le semestre ou le code de cours ont des
+embeddings presque identiques : une entrée n'est servie que si ces entités sont les mêmes
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .. import llmm
+from .entities import question_entities, intent_entities
+from .state import IntentType
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # Similarité cosinus minimale
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+# Intentions jamais mises en cache (ex: "DIRECT_ANSWER,SYLLABUS_SPECIFIC_COURSE")
+SEMANTIC_CACHE_EXCLUDED_INTENTS = {
+    IntentType(intent.strip())
+    for intent in os.getenv("SEMANTIC_CACHE_EXCLUDED_INTENTS", "").split(",")
+    if intent.strip()
+}
+
+
+class SemanticAnswerCache:
+    """
+    Cache des réponses indexé par l'embedding de la question.
+    Éviction LRU (taille maximale) + expiration TTL, thread-safe.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, excluded_intents=None):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.excluded_intents = set(excluded_intents if excluded_intents is not None else SEMANTIC_CACHE_EXCLUDED_INTENTS)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        # Matrice des vecteurs (reconstruite paresseusement après modification)
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions_lru": 0,
+            "evictions_ttl": 0,
+            "entity_mismatches": 0,
+            "invalidations": 0,
+            "last_invalidation": None
+        }
+
+    # ---------- Embeddings ----------
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_question(self, text: str) -> np.ndarray:
+        """Embedding normalisé d'une question (les questions récentes sont servies par le cache d'embeddings)"""
+        return self._normalize(llmm.embeddings.embed_query(text))
+
+    async def aembed_question(self, text: str) -> np.ndarray:
+        """Version asynchrone de embed_question"""
+        return self._normalize(await llmm.embeddings.aembed_query(text))
+
+    # ---------- Gestion interne (appelée sous verrou) ----------
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._stats["evictions_ttl"] += len(expired)
+            self._matrix = None
+
+    def _get_matrix(self) -> Tuple[Optional[np.ndarray], List[int]]:
+        if self._matrix is None and self._entries:
+            self._matrix_ids = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[entry_id]["vector"] for entry_id in self._matrix_ids])
+        return self._matrix, self._matrix_ids
+
+    @staticmethod
+    def _same_entities(entry: Dict[str, Any], entities: Dict[str, Any], intent: Optional[Dict[str, Any]]) -> bool:
+        """
+        Entités citées identiques ; spécialité et cours de l'analyse d'intention comparés seulement
+        si la recherche est faite après l'analyse (la recherche avant l'analyse n'a que le texte)
+        """
+        if entry["entities"] != entities:
+            return False
+        return intent is None or entry["intent_entities"] is None or entry["intent_entities"] == intent
+
+    def _search(self, vector: np.ndarray, entities: Dict[str, Any],
+                intent: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._purge_expired()
+            matrix, ids = self._get_matrix()
+            if matrix is None:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = matrix @ vector
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for best in candidates[np.argsort(-similarities[candidates])]:
+                entry_id = ids[best]
+                entry = self._entries[entry_id]
+                if not self._same_entities(entry, entities, intent):
+                    self._stats["entity_mismatches"] += 1
+                    continue
+                self._entries.move_to_end(entry_id)  # LRU
+                entry["hits"] += 1
+                self._stats["hits"] += 1
+                return {**entry, "similarity": float(similarities[best])}
+
+            self._stats["misses"] += 1
+            return None
+
+    def _insert(self, text: str, vector: np.ndarray, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": text,
+                "vector": vector,
+                "entities": question_entities(text, result.get("input_question")),
+                "intent_entities": intent_entities(result.get("intent_analysis")),
+                "answer": result.get("answer", ""),
+                "sources": result.get("sources", []),
+                "context": result.get("context", []),
+                "intent_analysis": result.get("intent_analysis"),
+                "created_at": time.time(),
+                "hits": 0
+            }
+            self._next_id += 1
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions_lru"] += 1
+            self._matrix = None
+
+    # ---------- API publique ----------
+
+    def is_cacheable(self, intent_analysis: Optional[Dict[str, Any]]) -> bool:
+        """Une réponse n'est réutilisable que si elle ne dépend pas de l'historique ni d'une intention exclue"""
+        if not intent_analysis:
+            return False
+        if intent_analysis.get("needs_history"):
+            return False
+        return intent_analysis.get("intent") not in self.excluded_intents
+
+    def lookup(self, text: str, question: Optional[str] = None,
+               intent_analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cherche une réponse en cache pour une question (None si aucune entrée assez proche
+        avec les mêmes entités). `question` : question brute quand `text` est sa reformulation ;
+        `intent_analysis` : analyse d'intention si la recherche est faite après celle-ci.
+        """
+        if not SEMANTIC_CACHE_ENABLED or not text:
+            return None
+        return self._search(self.embed_question(text), question_entities(text, question), intent_entities(intent_analysis))
+
+    async def alookup(self, text: str, question: Optional[str] = None,
+                      intent_analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Version asynchrone de lookup"""
+        if not SEMANTIC_CACHE_ENABLED or not text:
+            return None
+        return self._search(await self.aembed_question(text), question_entities(text, question), intent_entities(intent_analysis))
+
+    def store(self, text: str, result: Dict[str, Any]):
+        """Met en cache la réponse associée à une question"""
+        if not SEMANTIC_CACHE_ENABLED:
+            return
+        self._insert(text, self.embed_question(text), result)
+
+    async def astore(self, text: str, result: Dict[str, Any]):
+        """Version asynchrone de store"""
+        if not SEMANTIC_CACHE_ENABLED:
+            return
+        self._insert(text, await self.aembed_question(text), result)
+
+    def invalidate(self, reason: str = "manual"):
+        """Vide le cache (ex: le vectorstore a changé, les réponses stockées peuvent être obsolètes)"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._matrix = None
+            self._stats["invalidations"] += 1
+            self._stats["last_invalidation"] = {"reason": reason, "entries": count, "at": time.time()}
+        cp.print_info(f"[SemanticCache] Cache invalidé ({reason}): {count} entrées supprimées")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques du cache (taux de succès, évictions, taille)"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "enabled": SEMANTIC_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "excluded_intents": sorted(intent.value for intent in self.excluded_intents),
+                "lookups": lookups,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0
+            }
+
+
+# Instance partagée par le processus
+semantic_cache = SemanticAnswerCache()
+
+# Un nouveau vectorstore rend les réponses stockées potentiellement obsolètes
+llmm.register_vectorstore_listener(lambda _db: semantic_cache.invalidate("vectorstore_swap"))
+
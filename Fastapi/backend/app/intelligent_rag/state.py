@@ -45,6 +45,7 @@ class TokenCostTrackerState(TypedDict):
     total_tokens: int  # Total des tokens utilisés
     model: str  # Nom du modèle utilisé
     operation: str  # Nom de l'opération (intent_analysis, rag_generation, etc.)
+    duration_ms: float  # Durée de l'appel OpenAI
 
 class IntelligentRAGState(TypedDict):
     """État du graphe RAG intelligent"""
@@ -52,9 +53,14 @@ class IntelligentRAGState(TypedDict):
     input_question: str
     chat_history: List[Dict[str, str]]
     
+    # Résumé des anciens échanges d'une conversation longue (chat_history ne contient alors que les derniers messages)
+    conversation_summary: NotRequired[Optional[str]]
+    
     # Champs optionnels avec NotRequired pour éviter les conflits LangGraph
     intent_analysis: NotRequired[Optional[IntentAnalysisResult]]
     retrieved_docs: NotRequired[Optional[List[Any]]]
+    speculative_docs: NotRequired[Optional[List[Any]]]  # Recherche lancée sur la question brute pendant l'analyse d'intention
+    rerank_report: NotRequired[Optional[Dict[str, Any]]]  # Documents gardés par le reranker et tokens économisés
     filtered_docs: NotRequired[Optional[List[Any]]]
     answer: NotRequired[Optional[str]]
     context: NotRequired[Optional[List[Any]]]
@@ -63,4 +69,7 @@ class IntelligentRAGState(TypedDict):
     error: NotRequired[Optional[str]]
     session_id: NotRequired[Optional[str]]  # Pour le tracking des coûts
     token_tracker: NotRequired[Optional[List[TokenCostTrackerState]]]  # Instance du token tracker
+    node_spans: NotRequired[Optional[List[Dict[str, Any]]]]  # Durées mesurées par nœud (voir tracing.py)
+    cache_hit: NotRequired[bool]  # Réponse servie par le cache sémantique
+    cache_checked_text: NotRequired[Optional[str]]  # Texte déjà cherché dans le cache avant l'analyse d'intention
 
@@ -0,0 +1,184 @@
+"""
+Intelligent RAG System - Summary Memory
+Résumé glissant des conversations longues : au-delà d'un seuil de tokens, les anciens messages
+sont condensés (en tâche de fond après chaque tour) et les prompts ne portent plus que
+ce résumé et les derniers messages
+"""
+
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from .. import metrics
+from ..llmm import llm
+from ..database.database import engine
+from ..database.models import ConversationSummary, Message
+from .context_packer import count_tokens
+from .openai_tracker import atrack_openai_call_manual
+from .prompts import get_conversation_summary_prompt
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Configuration (variables d'environnement)
+SUMMARY_MEMORY_ENABLED = os.getenv("SUMMARY_MEMORY_ENABLED", "true").lower() == "true"
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "1200"))  # historique non résumé au-delà duquel on condense
+SUMMARY_RECENT_MESSAGES = int(os.getenv("SUMMARY_RECENT_MESSAGES", "4"))  # derniers messages toujours gardés tels quels
+SUMMARY_MAX_WORDS = int(os.getenv("SUMMARY_MAX_WORDS", "150"))
+
+# Références des tâches en cours (sinon elles peuvent être collectées avant la fin)
+_background_tasks = set()
+# Une seule mise à jour à la fois par conversation ; le verrou vit tant qu'une tâche le détient ou l'attend
+_locks: Dict[int, asyncio.Lock] = {}
+_lock_users: Dict[int, int] = {}
+
+summary_stats = {"updates": 0, "skipped": 0, "failed": 0, "messages_folded": 0}
+
+def _format_messages(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(
+        f"User: {msg['content']}" if msg["role"] == "user" else f"Assistant: {msg['content']}"
+        for msg in messages
+    )
+
+def _get_record(session: Session, conversation_id: int) -> Optional[ConversationSummary]:
+    return session.exec(
+        select(ConversationSummary).where(ConversationSummary.conversation_id == conversation_id)
+    ).first()
+
+# ================================
+# LECTURE (AVANT LE GRAPHE)
+# ================================
+
+def compact_history(session: Session, conversation_id: int,
+                    chat_history: List[Dict[str, Any]]) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Remplace les messages déjà résumés par le résumé de la conversation.
+    Seul l'historique chargé côté serveur (messages avec "id") est compacté.
+
+    Returns:
+        (résumé ou None, messages non couverts par le résumé)
+    """
+    if not SUMMARY_MEMORY_ENABLED or not chat_history or "id" not in chat_history[0]:
+        return None, chat_history
+    try:
+        record = _get_record(session, conversation_id)
+    except Exception as e:
+        cp.print_warning(f"[SummaryMemory] Lecture du résumé impossible: {e}")
+        return None, chat_history
+
+    if record is None:
+        return None, chat_history
+    # id None : message encore dans la file d'écriture différée, donc jamais résumé
+    return record.summary, [
+        msg for msg in chat_history
+        if msg["id"] is None or msg["id"] > record.last_summarized_message_id
+    ]
+
+# ================================
+# MISE À JOUR (APRÈS CHAQUE TOUR)
+# ================================
+
+def _unsummarized_messages(session: Session, conversation_id: int, after_id: int) -> List[Dict[str, Any]]:
+    messages = session.exec(
+        select(Message)
+        .where(Message.conversation_id == conversation_id, Message.id > after_id)
+        .order_by(Message.timestamp, Message.id)
+    ).all()
+    return [{"id": m.id, "role": m.role, "content": m.content} for m in messages if m.role in ("user", "assistant")]
+
+@asynccontextmanager
+async def _conversation_lock(conversation_id: int):
+    """Verrou de la conversation, supprimé quand la dernière tâche qui l'utilisait (détenteur ou en attente) le rend"""
+    lock = _locks.setdefault(conversation_id, asyncio.Lock())
+    _lock_users[conversation_id] = _lock_users.get(conversation_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _lock_users[conversation_id] -= 1
+        if not _lock_users[conversation_id]:
+            del _lock_users[conversation_id]
+            _locks.pop(conversation_id, None)
+
+def _load_pending(conversation_id: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """Résumé actuel et messages non résumés de la conversation"""
+    with Session(engine) as session:
+        record = _get_record(session, conversation_id)
+        previous_summary = record.summary if record else ""
+        pending = _unsummarized_messages(session, conversation_id, record.last_summarized_message_id if record else 0)
+    return previous_summary, pending
+
+def _save_summary(conversation_id: int, summary: str, last_summarized_message_id: int):
+    with Session(engine) as session:
+        record = _get_record(session, conversation_id) or ConversationSummary(conversation_id=conversation_id, summary=summary)
+        record.summary = summary
+        record.last_summarized_message_id = last_summarized_message_id
+        record.summary_tokens = count_tokens(summary)
+        record.updated_at = datetime.utcnow()
+        session.add(record)
+        with metrics.DB_COMMIT_SECONDS.labels(component="summary_memory").time():
+            session.commit()
+
+async def aupdate_summary(conversation_id: int, session_id: str = "summary"):
+    """
+    Condense dans le résumé les messages non résumés, sauf les SUMMARY_RECENT_MESSAGES derniers,
+    si leur taille dépasse SUMMARY_TRIGGER_TOKENS.
+
+    Args:
+        conversation_id: Conversation concernée (messages lus dans la table Message)
+        session_id: Session utilisée pour le suivi des tokens
+    """
+    async with _conversation_lock(conversation_id):
+        # Lectures et commit dans un thread : la boucle d'événements ne se bloque pas sur la base.
+        # La connexion SQLite n'est pas gardée pendant l'appel LLM
+        previous_summary, pending = await asyncio.to_thread(_load_pending, conversation_id)
+
+        to_fold = pending[:max(len(pending) - SUMMARY_RECENT_MESSAGES, 0)]
+        if not to_fold or count_tokens(_format_messages(pending)) <= SUMMARY_TRIGGER_TOKENS:
+            summary_stats["skipped"] += 1
+            return
+
+        prompt = get_conversation_summary_prompt(
+            summary=previous_summary,
+            history_text=_format_messages(to_fold),
+            max_words=SUMMARY_MAX_WORDS
+        )
+        track_result = await atrack_openai_call_manual(llm, prompt, "conversation_summary", [], session_id)
+        summary = track_result["response"].content.strip()
+
+        await asyncio.to_thread(_save_summary, conversation_id, summary, to_fold[-1]["id"])
+
+    summary_stats["updates"] += 1
+    summary_stats["messages_folded"] += len(to_fold)
+    cp.print_info(f"[SummaryMemory] Conversation {conversation_id}: {len(to_fold)} messages résumés "
+                  f"({track_result['tokens']['total']} tokens utilisés)")
+
+async def _run_update(conversation_id: int, session_id: str):
+    try:
+        await aupdate_summary(conversation_id, session_id)
+    except Exception as e:
+        summary_stats["failed"] += 1
+        cp.print_warning(f"[SummaryMemory] Mise à jour du résumé impossible (conversation {conversation_id}): {e}")
+
+def schedule_summary_update(conversation_id: int, session_id: str = "summary"):
+    """Lance la mise à jour du résumé en tâche de fond (la réponse n'attend pas l'appel LLM)"""
+    if not SUMMARY_MEMORY_ENABLED:
+        return
+    task = asyncio.get_running_loop().create_task(_run_update(conversation_id, session_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def get_stats() -> Dict[str, Any]:
+    """Statistiques de la mémoire de résumé"""
+    return {
+        **summary_stats,
+        "enabled": SUMMARY_MEMORY_ENABLED,
+        "trigger_tokens": SUMMARY_TRIGGER_TOKENS,
+        "recent_messages": SUMMARY_RECENT_MESSAGES,
+        "pending_updates": len(_background_tasks)
+    }
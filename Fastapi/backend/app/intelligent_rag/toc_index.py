@@ -0,0 +1,82 @@
+"""
+Intelligent RAG System - TOC Index
+Index en mémoire des documents TOC (tables des matières des syllabus) par spécialité,
+construit au chargement du vectorstore et reconstruit à chaque remplacement
+"""
+
+import time
+import threading
+from typing import Dict, Any, List, Optional
+
+from langchain_core.documents import Document
+
+from .. import llmm
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Taille des pages lues dans la collection Chroma lors de la construction
+_PAGE_SIZE = 1000
+
+# Clé regroupant tous les documents TOC (pas de spécialité ou GENERAL)
+ALL_SPECIALITIES = "__all__"
+
+def is_toc_for(metadata: Dict[str, Any], speciality_name: Optional[str]) -> bool:
+    """Le document est un TOC (metadata.type == "toc") de la spécialité demandée (toutes si None ou GENERAL)"""
+    if str(metadata.get("metadata.type", "")).lower() != "toc":
+        return False
+    if speciality_name and speciality_name != "GENERAL":
+        return str(metadata.get("metadata.specialite", "")).upper() == speciality_name
+    return True
+
+class TocIndex:
+    """Documents TOC groupés par metadata.specialite (en majuscules)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_speciality: Optional[Dict[str, List[Document]]] = None
+        self._built_at: Optional[float] = None
+
+    def build(self, db=None) -> int:
+        """Parcourt la collection page par page et retourne le nombre de documents TOC indexés"""
+        db = db if db is not None else llmm.db
+        start = time.time()
+        by_speciality: Dict[str, List[Document]] = {ALL_SPECIALITIES: []}
+
+        offset = 0
+        while True:
+            page = db.get(include=["documents", "metadatas"], limit=_PAGE_SIZE, offset=offset)
+            for content, metadata in zip(page["documents"], page["metadatas"]):
+                metadata = metadata or {}
+                if not is_toc_for(metadata, None):
+                    continue
+                doc = Document(page_content=content, metadata=metadata)
+                by_speciality[ALL_SPECIALITIES].append(doc)
+                by_speciality.setdefault(str(metadata.get("metadata.specialite", "")).upper(), []).append(doc)
+            if len(page["ids"]) < _PAGE_SIZE:
+                break
+            offset += _PAGE_SIZE
+
+        with self._lock:
+            self._by_speciality = by_speciality
+            self._built_at = time.time()
+        count = len(by_speciality[ALL_SPECIALITIES])
+        cp.print_info(f"[TocIndex] {count} documents TOC indexés ({len(by_speciality) - 1} spécialités) en {(time.time() - start) * 1000:.0f} ms")
+        return count
+
+    def get_toc_docs(self, speciality_name: Optional[str]) -> List[Document]:
+        """Documents TOC d'une spécialité (tous si None ou GENERAL), construit l'index au premier appel"""
+        if self._by_speciality is None:
+            self.build()
+        key = speciality_name if speciality_name and speciality_name != "GENERAL" else ALL_SPECIALITIES
+        return list(self._by_speciality.get(key, []))
+
+
+toc_index = TocIndex()
+
+def _rebuild_on_swap(new_db):
+    toc_index.build(new_db)
+
+# Le nouveau vectorstore peut contenir d'autres TOC : reconstruction immédiate
+llmm.register_vectorstore_listener(_rebuild_on_swap)
@@ -0,0 +1,193 @@
+"""
+Intelligent RAG System - Tracing
+Mesure de chaque nœud du graphe (temps total, temps LLM, temps de recherche, tokens, cache)
+pour toutes les requêtes ; les spans sont enregistrés avec la RAGConversation du tour
+"""
+
+import math
+import time
+import asyncio
+import functools
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+from sqlmodel import Session, select
+
+from .. import metrics
+from ..database.models import RAGNodeSpan
+
+# Span du nœud en cours d'exécution (visible dans le pool de recherche via copy_context)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("rag_current_span", default=None)
+
+PERCENTILES = (50, 95, 99)
+
+# ================================
+# SPANS
+# ================================
+
+def _new_span(node: str) -> Dict[str, Any]:
+    return {
+        "node": node,
+        "started_at": datetime.utcnow(),
+        "wall_ms": 0.0,
+        "llm_ms": 0.0,
+        "retrieval_ms": 0.0,
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cache_hit": False,
+        "success": True,
+        "_retrieval_depth": 0,
+    }
+
+def _close_span(span: Dict[str, Any], state: Dict[str, Any], start: float, tracker_start: int,
+                update: Optional[Dict[str, Any]]):
+    """Complète le span avec les appels OpenAI du nœud et l'ajoute à l'état"""
+    span["wall_ms"] = (time.perf_counter() - start) * 1000
+    calls = (state.get("token_tracker") or [])[tracker_start:]
+    span["llm_calls"] = len(calls)
+    span["llm_ms"] = sum(call.get("duration_ms", 0.0) for call in calls)
+    span["prompt_tokens"] = sum(call["prompt_tokens"] for call in calls)
+    span["completion_tokens"] = sum(call["completion_tokens"] for call in calls)
+    if update:
+        span["cache_hit"] = span["cache_hit"] or bool(update.get("cache_hit"))
+        span["success"] = span["success"] and update.get("error") is None
+    metrics.RAG_NODE_SECONDS.labels(node=span["node"]).observe(span["wall_ms"] / 1000)
+    spans = state.get("node_spans")
+    if spans is not None:
+        spans.append(span)
+
+def trace_node(name: str, node: Callable) -> Callable:
+    """Enveloppe un nœud du graphe (synchrone ou asynchrone) pour mesurer son exécution"""
+    if asyncio.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def traced(state):
+            span, start = _new_span(name), time.perf_counter()
+            tracker_start = len(state.get("token_tracker") or [])
+            token = _current_span.set(span)
+            update = None
+            try:
+                update = await node(state)
+                return update
+            except Exception:
+                span["success"] = False
+                raise
+            finally:
+                _current_span.reset(token)
+                _close_span(span, state, start, tracker_start, update)
+        return traced
+
+    @functools.wraps(node)
+    def traced(state):
+        span, start = _new_span(name), time.perf_counter()
+        tracker_start = len(state.get("token_tracker") or [])
+        token = _current_span.set(span)
+        update = None
+        try:
+            update = node(state)
+            return update
+        except Exception:
+            span["success"] = False
+            raise
+        finally:
+            _current_span.reset(token)
+            _close_span(span, state, start, tracker_start, update)
+    return traced
+
+def record_span(state: Dict[str, Any], node: str, wall_seconds: float, cache_hit: bool = False):
+    """Ajoute un span pour une étape exécutée hors du graphe (cache consulté avant l'analyse d'intention)"""
+    metrics.RAG_NODE_SECONDS.labels(node=node).observe(wall_seconds)
+    spans = state.get("node_spans")
+    if spans is None:
+        return
+    span = _new_span(node)
+    span.update({"wall_ms": wall_seconds * 1000, "cache_hit": cache_hit})
+    spans.append(span)
+
+def mark_cache_hit():
+    """Le nœud en cours a été servi par un cache"""
+    span = _current_span.get()
+    if span is not None:
+        span["cache_hit"] = True
+
+@contextmanager
+def retrieval_timer():
+    """Ajoute la durée du bloc au temps de recherche du nœud en cours (seul le bloc le plus externe compte)"""
+    span = _current_span.get()
+    if span is None:
+        yield
+        return
+    span["_retrieval_depth"] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span["_retrieval_depth"] -= 1
+        if span["_retrieval_depth"] == 0:
+            span["retrieval_ms"] += (time.perf_counter() - start) * 1000
+
+def traced_retrieval(func: Callable) -> Callable:
+    """Décorateur : la fonction compte dans le temps de recherche (Chroma, FTS5, index TOC) du nœud en cours"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with retrieval_timer():
+            return func(*args, **kwargs)
+    return wrapper
+
+def public_spans(spans: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Spans sérialisables en JSON (réponse API)"""
+    return [
+        {**{key: value for key, value in span.items() if not key.startswith("_")},
+         "started_at": span["started_at"].isoformat(),
+         **{key: round(span[key], 2) for key in ("wall_ms", "llm_ms", "retrieval_ms")}}
+        for span in spans or []
+    ]
+
+# ================================
+# PERCENTILES
+# ================================
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentile par rang le plus proche (valeurs déjà triées)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def _summarize(rows: List[Any]) -> Dict[str, Any]:
+    summary = {"count": len(rows)}
+    for metric in ("wall_ms", "llm_ms", "retrieval_ms"):
+        values = sorted(getattr(row, metric) for row in rows)
+        summary[metric] = {f"p{p}": round(percentile(values, p), 1) for p in PERCENTILES}
+    summary["cache_hit_rate"] = round(sum(1 for row in rows if row.cache_hit) / len(rows), 3) if rows else 0.0
+    summary["error_rate"] = round(sum(1 for row in rows if not row.success) / len(rows), 3) if rows else 0.0
+    return summary
+
+def get_latency_percentiles(session: Session, since: datetime, until: datetime) -> Dict[str, Any]:
+    """
+    Percentiles p50/p95/p99 des spans de la fenêtre, par nœud et par intention.
+
+    Returns:
+        dict: {"window", "total_spans", "by_node": {node: stats}, "by_intent": {intent: {node: stats}}}
+    """
+    rows = session.exec(
+        select(RAGNodeSpan).where(RAGNodeSpan.started_at >= since, RAGNodeSpan.started_at <= until)
+    ).all()
+
+    by_node: Dict[str, List[Any]] = {}
+    by_intent: Dict[str, Dict[str, List[Any]]] = {}
+    for row in rows:
+        by_node.setdefault(row.node, []).append(row)
+        by_intent.setdefault(row.intent or "unknown", {}).setdefault(row.node, []).append(row)
+
+    return {
+        "window": {"since": since.isoformat(), "until": until.isoformat()},
+        "total_spans": len(rows),
+        "by_node": {node: _summarize(node_rows) for node, node_rows in sorted(by_node.items())},
+        "by_intent": {
+            intent: {node: _summarize(node_rows) for node, node_rows in sorted(nodes.items())}
+            for intent, nodes in sorted(by_intent.items())
+        }
+    }
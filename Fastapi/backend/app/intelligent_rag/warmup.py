@@ -0,0 +1,112 @@
+"""
+Intelligent RAG System - Warm-up
+Préchauffage du worker au démarrage : compilation des graphes, client d'embeddings,
+index HNSW de Chroma, connexion HTTP keep-alive vers OpenAI, index kNN des intentions, index TOC
+et modèle du reranker
+"""
+
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable
+
+from .. import llmm
+from .graph import compile_all_graphs
+from .intent_classifier import build_knn_index
+from .toc_index import toc_index
+from .reranker import load_reranker
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Requête factice utilisée pour le préchauffage
+WARMUP_QUERY = "Polytech Sorbonne"
+
+# État de préchauffage du worker (lu par la sonde de readiness)
+_ready = threading.Event()
+_warmup_status: Dict[str, Any] = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "steps": {}
+}
+
+def _run_step(name: str, step: Callable[[], Any]):
+    """Exécute une étape de préchauffage en mesurant sa durée (une erreur n'interrompt pas les suivantes)"""
+    start = time.time()
+    try:
+        step()
+        _warmup_status["steps"][name] = {"ok": True, "duration_ms": round((time.time() - start) * 1000, 1)}
+        cp.print_performance(f"[Warm-up] {name}: {(time.time() - start) * 1000:.0f} ms")
+    except Exception as e:
+        _warmup_status["steps"][name] = {"ok": False, "duration_ms": round((time.time() - start) * 1000, 1), "error": str(e)}
+        cp.print_warning(f"[Warm-up] {name} a échoué: {e}")
+
+async def _run_async_step(name: str, step: Callable[[], Awaitable[Any]]):
+    """Version asynchrone de _run_step"""
+    start = time.time()
+    try:
+        await step()
+        _warmup_status["steps"][name] = {"ok": True, "duration_ms": round((time.time() - start) * 1000, 1)}
+        cp.print_performance(f"[Warm-up] {name}: {(time.time() - start) * 1000:.0f} ms")
+    except Exception as e:
+        _warmup_status["steps"][name] = {"ok": False, "duration_ms": round((time.time() - start) * 1000, 1), "error": str(e)}
+        cp.print_warning(f"[Warm-up] {name} a échoué: {e}")
+
+def _openai_keep_alive():
+    """Ouvre (TLS + keep-alive) la connexion HTTP du client de chat vers l'API OpenAI"""
+    llmm.llm.root_client.models.list()
+
+async def _openai_async_keep_alive():
+    """Ouvre la connexion du client asynchrone (liée à la boucle d'événements du serveur)"""
+    await llmm.llm.root_async_client.models.list()
+
+def _mark_ready():
+    _warmup_status["finished_at"] = datetime.utcnow().isoformat()
+    _warmup_status["ready"] = True
+    _ready.set()
+    cp.print_success("[Warm-up] Worker prêt")
+
+def warm_up(mark_ready: bool = True) -> Dict[str, Any]:
+    """
+    Préchauffe le worker avant de le déclarer prêt.
+
+    Args:
+        mark_ready: Si False, laisse à l'appelant le soin de déclarer le worker prêt
+
+    Returns:
+        dict: Statut détaillé du préchauffage (durée et succès de chaque étape)
+    """
+    _warmup_status["started_at"] = datetime.utcnow().isoformat()
+    cp.print_step("Préchauffage du worker")
+
+    _run_step("graph_compilation", compile_all_graphs)
+    _run_step("embedding", lambda: llmm.embeddings.embed_query(WARMUP_QUERY))
+    _run_step("chroma_query", lambda: llmm.db.similarity_search(WARMUP_QUERY, k=1))
+    _run_step("openai_keep_alive", _openai_keep_alive)
+    _run_step("intent_knn_index", build_knn_index)
+    _run_step("toc_index", toc_index.build)
+    _run_step("reranker", load_reranker)
+
+    if mark_ready:
+        _mark_ready()
+    return _warmup_status
+
+async def awarm_up() -> Dict[str, Any]:
+    """
+    Préchauffage complet depuis la boucle d'événements du serveur : étapes synchrones
+    puis connexion du client OpenAI asynchrone utilisé par le pipeline ainvoke.
+    """
+    warm_up(mark_ready=False)
+    await _run_async_step("openai_async_keep_alive", _openai_async_keep_alive)
+    _mark_ready()
+    return _warmup_status
+
+def is_ready() -> bool:
+    """Indique si le préchauffage est terminé"""
+    return _ready.is_set()
+
+def get_warmup_status() -> Dict[str, Any]:
+    """Retourne le statut du préchauffage"""
+    return _warmup_status
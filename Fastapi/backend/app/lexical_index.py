@@ -0,0 +1,187 @@
+"""
+Index lexical SQLite FTS5 des chunks du vectorstore (recherche hybride lexicale + vectorielle)
+Construit par build_vectorstore à côté des fichiers Chroma, interrogé en lecture seule par le backend
+"""
+
+import re
+import json
+import sqlite3
+import hashlib
+import unicodedata
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable
+
+from langchain_core.documents import Document
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# Fichier de l'index, placé dans le dossier du vectorstore (déplacé avec lui)
+LEXICAL_INDEX_FILENAME = "lexical_index.sqlite3"
+
+# Constante de la fusion Reciprocal Rank Fusion
+RRF_K = 60
+
+try:
+    _probe = sqlite3.connect(":memory:")
+    _probe.execute("CREATE VIRTUAL TABLE probe USING fts5(text)")
+    _probe.close()
+    FTS5_AVAILABLE = True
+except sqlite3.OperationalError:
+    FTS5_AVAILABLE = False
+    cp.print_warning("[LexicalIndex] SQLite sans FTS5 : recherche lexicale désactivée")
+
+# ================================
+# ANALYSE DU TEXTE (FRANÇAIS)
+# ================================
+
+FRENCH_STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "cette", "dans", "de", "des", "du", "elle", "en", "est", "et",
+    "il", "ils", "je", "la", "le", "les", "leur", "leurs", "lui", "ma", "mais", "me", "mes", "mon", "ne",
+    "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses", "son", "sont", "sur",
+    "ta", "te", "tes", "ton", "tu", "un", "une", "vos", "votre", "vous", "y", "d", "l", "c", "j", "n", "s",
+    "quel", "quels", "quelle", "quelles", "comment", "quoi", "the", "of", "and", "is",
+}
+
+# Suffixes retirés par le stemmer léger (du plus long au plus court)
+_FRENCH_SUFFIXES = (
+    "issements", "issement", "atrices", "ateurs", "ations", "atrice", "ateur", "ation", "ements", "ement",
+    "ances", "ences", "ance", "ence", "ismes", "isme", "istes", "iste", "ables", "able", "iques", "ique",
+    "euses", "euse", "eaux", "eurs", "eur", "ites", "ite", "ives", "ive", "ifs", "if", "aux", "es", "s", "x", "e",
+)
+
+# Codes de cours (EPU-M5-IAM) : recherchés comme expression exacte
+COURSE_CODE_PATTERN = re.compile(r"\b[A-Z]{2,}-[A-Z0-9]{1,4}-[A-Z0-9]{2,}\b", re.IGNORECASE)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+def stem(token: str) -> str:
+    """Stemmer léger pour le français : retire un suffixe flexionnel ou dérivationnel courant"""
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix in _FRENCH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+def analyze(text: str) -> List[str]:
+    """Texte → termes indexés (minuscules, sans accents, sans mots vides, racinisés)"""
+    return [stem(token) for token in _TOKEN_PATTERN.findall(_fold(text)) if token not in FRENCH_STOPWORDS]
+
+def _match_query(question: str) -> Optional[str]:
+    """Requête FTS5 : codes de cours en expression exacte OU termes de la question"""
+    clauses = []
+    for code in COURSE_CODE_PATTERN.findall(question):
+        clauses.append('"' + " ".join(analyze(code)) + '"')  # mêmes termes que l'index (racinisés)
+    terms = dict.fromkeys(analyze(question))  # termes uniques, dans l'ordre
+    clauses.extend(f'"{term}"' for term in terms)
+    return " OR ".join(clauses) if clauses else None
+
+# ================================
+# CONSTRUCTION
+# ================================
+
+def build_lexical_index(documents: Iterable[Document], directory: Path) -> int:
+    """
+    Crée (ou remplace) l'index FTS5 des documents dans le dossier donné et retourne le nombre de chunks.
+    L'id Chroma des documents (Document.id) est conservé : le reranker relit leur vecteur stocké.
+    """
+    if not FTS5_AVAILABLE:
+        return 0
+    path = Path(directory) / LEXICAL_INDEX_FILENAME
+    if path.exists():
+        path.unlink()
+
+    connection = sqlite3.connect(str(path))
+    try:
+        connection.execute(
+            "CREATE VIRTUAL TABLE chunks USING fts5("
+            "terms, content UNINDEXED, metadata UNINDEXED, chunk_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+        )
+        count = 0
+        with connection:
+            for doc in documents:
+                connection.execute(
+                    "INSERT INTO chunks (terms, content, metadata, chunk_id) VALUES (?, ?, ?, ?)",
+                    (" ".join(analyze(doc.page_content)), doc.page_content, json.dumps(doc.metadata, ensure_ascii=False),
+                     getattr(doc, "id", None))
+                )
+                count += 1
+        connection.execute("INSERT INTO chunks(chunks) VALUES('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    cp.print_info(f"[LexicalIndex] {count} chunks indexés dans {path}")
+    return count
+
+# ================================
+# RECHERCHE
+# ================================
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Applique une clause `where` Chroma simple (égalités, $and, $or) aux métadonnées d'un document"""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches_where(metadata, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(matches_where(metadata, clause) for clause in where["$or"])
+    return all(metadata.get(key) == value for key, value in where.items())
+
+def search(directory: Path, question: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+    """
+    Recherche BM25 dans l'index du dossier donné (liste vide si l'index est absent).
+    Le filtre `where` est appliqué sur les métadonnées des meilleurs candidats.
+    """
+    path = Path(directory) / LEXICAL_INDEX_FILENAME
+    query = _match_query(question)
+    if not FTS5_AVAILABLE or not query or not path.exists():
+        return []
+
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        try:
+            rows = connection.execute(
+                "SELECT content, metadata, chunk_id FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                (query, k * 4 if where else k)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Index construit avant la colonne chunk_id (remplacé à la prochaine vectorisation)
+            rows = connection.execute(
+                "SELECT content, metadata, NULL FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                (query, k * 4 if where else k)
+            ).fetchall()
+    finally:
+        connection.close()
+
+    docs = []
+    for content, metadata, chunk_id in rows:
+        metadata = json.loads(metadata)
+        if matches_where(metadata, where):
+            docs.append(Document(page_content=content, metadata=metadata, id=chunk_id))
+            if len(docs) == k:
+                break
+    return docs
+
+# ================================
+# FUSION
+# ================================
+
+def _doc_key(doc: Document) -> str:
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """Fusionne des classements (vectoriel, lexical) : score = somme des 1 / (k + rang)"""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
@@ -15,15 +15,18 @@ from langchain.chains.combine_documents import create_stuff_documents_chain  # I
 
 from pathlib import Path
 import sys
+import os
 
 import gc
 from chromadb.config import Settings
+from chromadb.api.client import SharedSystemClient
 
 # Add the directory containing promptt.py to the Python path
 # This assumes promptt.py is in the same directory as this file
 sys.path.append(str(Path(__file__).parent))
 from .promptt import qa_prompt  # Import the qa_prompt from the prompt module
 from .promptt import contextualize_q_prompt  # Import the contextualize_q_prompt from the prompt module
+from .embedding_cache import CachedEmbeddings  # LRU (+ Redis optionnel) devant l'API d'embeddings
 
 from color_utils import ColorPrint  # Import the ColorPrint class for colored console output
 
@@ -31,10 +34,15 @@ cp = ColorPrint()  # Create an instance of ColorPrint for colored output
 
 # Vector de Polytech Sorbonne
 persist_directory = Path(__file__).parent.parent.parent.parent / "Document_handler" / "new_filler" / "Vectorisation" / "vectorstore_Syllabus"  # Define the directory where the Chroma vector database will be persisted
+# CHROMA_PERSIST_DIRECTORY remplace le vectorstore par défaut (ex: store de test du banc de charge)
+persist_directory = Path(os.getenv("CHROMA_PERSIST_DIRECTORY", str(persist_directory)))
 
 cp.print_info(f"Using persist directory: {persist_directory}")  # Print the persist directory using colored output
 
-embeddings = OpenAIEmbeddings()  # Create an instance of the OpenAIEmbeddings class (ensure to pass your OpenAI API key as an environment variable named 'OPENAI_API_KEY')
+# OPENAI_EMBEDDINGS_CHECK_CTX_LENGTH=false : textes envoyés tels quels, sans découpage tiktoken (pas de téléchargement de l'encodage)
+EMBEDDINGS_CHECK_CTX_LENGTH = os.getenv("OPENAI_EMBEDDINGS_CHECK_CTX_LENGTH", "true").lower() == "true"
+
+embeddings = CachedEmbeddings(OpenAIEmbeddings(check_embedding_ctx_length=EMBEDDINGS_CHECK_CTX_LENGTH))  # Create an instance of the OpenAIEmbeddings class (ensure to pass your OpenAI API key as an environment variable named 'OPENAI_API_KEY'), wrapped with the embedding cache
 
 
 persistent_client = chromadb.PersistentClient(
@@ -56,7 +64,8 @@ db = Chroma(
 cp.print_info(f"ChromaDB collection Name: {db._LANGCHAIN_DEFAULT_COLLECTION_NAME}, with collection count {db._collection.count()}")  # Print the collection name and count using colored output
 # intiate the model
 llm = ChatOpenAI(model="gpt-4o-mini",
-    temperature=0.7)  # Create an instance of the ChatOpenAI class with the specified model name "gpt-4o-mini"
+    temperature=0.7,
+    stream_usage=True)  # Create an instance of the ChatOpenAI class with the specified model name "gpt-4o-mini" (stream_usage keeps token counts when answers are streamed)
 
 # initiate the db as retriever
 retriever = db.as_retriever(
@@ -72,6 +81,69 @@ history_aware_retriever = create_history_aware_retriever(
 )
 
 
+# Callbacks appelés à chaque remplacement du vectorstore actif (caches et index dérivés à invalider)
+_vectorstore_listeners = []
+
+def register_vectorstore_listener(callback):
+    """
+    Enregistre une fonction appelée avec le nouveau vectorstore chaque fois qu'il est remplacé.
+    """
+    _vectorstore_listeners.append(callback)
+    return callback
+
+def _notify_vectorstore_listeners():
+    for callback in _vectorstore_listeners:
+        try:
+            callback(db)
+        except Exception as e:
+            cp.print_warning(f"[Chroma] Vectorstore listener {getattr(callback, '__name__', callback)} failed: {e}")
+
+def set_vectorstore(new_db):
+    """
+    Remplace le vectorstore actif (ex: après build_vectorstore) et prévient les listeners.
+    """
+    global db
+    db = new_db
+    _notify_vectorstore_listeners()
+
+
+def _forget_chroma_system(directory: Path):
+    """
+    Arrête et oublie le système chromadb mis en cache pour ce chemin. chromadb garde un seul système
+    par chemin : après le renommage du dossier (bascule d'une reconstruction complète), celui-ci décrit
+    encore l'ancien dossier, et tout nouveau client sur ce chemin le réutiliserait.
+    """
+    target = Path(directory).resolve()
+    for identifier, system in list(SharedSystemClient._identifier_to_system.items()):
+        if identifier == "ephemeral" or Path(identifier).resolve() != target:
+            continue
+        SharedSystemClient._identifier_to_system.pop(identifier, None)
+        try:
+            system.stop()
+        except Exception as e:
+            cp.print_warning(f"[Chroma] Arrêt de l'ancien système {identifier} impossible: {e}")
+
+def open_vectorstore(directory):
+    """
+    Ouvre le vectorstore de `directory` sur un client neuf et l'installe comme store actif
+    (persistent_client, collection et db remplacés, listeners prévenus).
+    À appeler quand un autre store a pris la place de ce dossier (ex: fin de build_vectorstore complet).
+    """
+    global persistent_client, collection, persist_directory
+    directory = Path(directory)
+    _forget_chroma_system(directory)
+    persistent_client = chromadb.PersistentClient(path=str(directory), settings=Settings(allow_reset=True))
+    collection = persistent_client.get_or_create_collection(LANGCHAIN_DEFAULT_COLLECTION_NAME)
+    persist_directory = directory
+    set_vectorstore(Chroma(
+        client=persistent_client,
+        collection_name=LANGCHAIN_DEFAULT_COLLECTION_NAME,
+        embedding_function=embeddings,
+    ))
+    cp.print_info(f"[Chroma] Vectorstore ouvert: {directory} ({collection.count()} documents)")
+    return db
+
+
 def initialize_the_rag_chain():
     """
     Initialize the Retrieval-Augmented Generation (RAG) chain.
@@ -173,14 +245,14 @@ def clean_and_reload_vectorstore(active_directory: str, new_directory: str, coll
         cp.print_error("Redémarre le process Python pour libérer l'ancienne instance Chroma.")
         return
 
-    embeddings = OpenAIEmbeddings()
     db = Chroma(
         client=persistent_client,
         collection_name=collection_name,
-        embedding_function=embeddings
+        embedding_function=embeddings  # instance partagée : le cache d'embeddings survit au rechargement
     )
 
     cp.print_info(f" ✅ Loaded ChromaDB collection: {collection_name}, with {db._collection.count()} documents.")
+    _notify_vectorstore_listeners()
 
 
 #####################################################################################################
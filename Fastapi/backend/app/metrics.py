@@ -0,0 +1,266 @@
+"""
+Métriques Prometheus du processus API (exposées sur /metrics)
+Latence des requêtes par route et intention, requêtes en cours, appels OpenAI, requêtes Chroma,
+commits en base, caches, rejets du rate limiting, tâches de maintenance et retard de la boucle d'événements.
+
+Avec plusieurs workers uvicorn, définir PROMETHEUS_MULTIPROC_DIR (répertoire vide, purgé au
+redémarrage) avant le lancement : chaque worker y écrit ses valeurs et /metrics les agrège.
+"""
+
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from fastapi import APIRouter, Response
+from starlette.routing import Match
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+try:
+    from prometheus_client import (
+        Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# Configuration (variables d'environnement)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Période de mesure du retard de la boucle d'événements (secondes)
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.25"))
+
+# Seuils des histogrammes (secondes)
+REQUEST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0)
+QUERY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+TASK_BUCKETS = (1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Routes non mesurées (le scrape lui-même)
+EXCLUDED_PATHS = {"/metrics"}
+
+class _NoopMetric:
+    """Métrique sans effet quand prometheus_client n'est pas installé"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def observe(self, amount: float):
+        pass
+
+    @contextmanager
+    def time(self):
+        yield
+
+def _metric(kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+    if not PROMETHEUS_AVAILABLE or not METRICS_ENABLED:
+        return _NoopMetric()
+    metric_class = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind]
+    return metric_class(name, documentation, labelnames, **kwargs)
+
+if not PROMETHEUS_AVAILABLE:
+    cp.print_warning("[Metrics] prometheus_client non installé : /metrics désactivé")
+
+# ================================
+# MÉTRIQUES
+# ================================
+
+HTTP_REQUEST_SECONDS = _metric(
+    "histogram", "polybot_http_request_duration_seconds",
+    "Durée des requêtes HTTP (jusqu'au dernier octet, streaming compris)",
+    ("method", "route", "status", "intent"), buckets=REQUEST_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = _metric(
+    "gauge", "polybot_http_requests_in_progress",
+    "Requêtes HTTP en cours de traitement", ("method",), multiprocess_mode="livesum"
+)
+RATE_LIMIT_REJECTIONS = _metric(
+    "counter", "polybot_rate_limit_rejections_total",
+    "Requêtes rejetées par le rate limiting (429)", ("route",)
+)
+OPENAI_REQUEST_SECONDS = _metric(
+    "histogram", "polybot_openai_request_duration_seconds",
+    "Durée des appels OpenAI", ("operation", "model"), buckets=REQUEST_BUCKETS
+)
+OPENAI_TOKENS = _metric(
+    "counter", "polybot_openai_tokens_total",
+    "Tokens consommés par les appels OpenAI", ("operation", "model", "type")
+)
+RAG_NODE_SECONDS = _metric(
+    "histogram", "polybot_rag_node_duration_seconds",
+    "Durée des nœuds du graphe RAG", ("node",), buckets=REQUEST_BUCKETS
+)
+CHROMA_QUERY_SECONDS = _metric(
+    "histogram", "polybot_chroma_query_duration_seconds",
+    "Durée des requêtes Chroma", ("kind",), buckets=QUERY_BUCKETS
+)
+DB_COMMIT_SECONDS = _metric(
+    "histogram", "polybot_db_commit_duration_seconds",
+    "Durée des commits en base", ("component",), buckets=QUERY_BUCKETS
+)
+DB_LOCK_RETRIES = _metric(
+    "counter", "polybot_db_lock_retries_total",
+    "Transactions rejouées parce que la base était verrouillée", ("component",)
+)
+EVENT_LOOP_LAG_SECONDS = _metric(
+    "histogram", "polybot_event_loop_lag_seconds",
+    "Retard de la boucle d'événements (code synchrone bloquant la boucle)", buckets=LAG_BUCKETS
+)
+CACHE_LOOKUPS = _metric(
+    "counter", "polybot_cache_lookups_total",
+    "Consultations des caches (taux de hit = hit / total)", ("cache", "result")
+)
+MAINTENANCE_TASK_SECONDS = _metric(
+    "histogram", "polybot_maintenance_task_duration_seconds",
+    "Durée des tâches de maintenance", ("task", "status"), buckets=TASK_BUCKETS
+)
+
+# ================================
+# AIDES À L'INSTRUMENTATION
+# ================================
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Compte une consultation de cache (answer, intent, embedding)"""
+    CACHE_LOOKUPS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def record_openai_call(operation: str, model: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+    """Durée et tokens d'un appel OpenAI"""
+    OPENAI_REQUEST_SECONDS.labels(operation=operation, model=model).observe(seconds)
+    OPENAI_TOKENS.labels(operation=operation, model=model, type="prompt").inc(prompt_tokens)
+    OPENAI_TOKENS.labels(operation=operation, model=model, type="completion").inc(completion_tokens)
+
+@contextmanager
+def time_maintenance_task(task: str):
+    """Mesure une tâche de maintenance (statut error si elle lève une exception)"""
+    start = time.perf_counter()
+    status = "success"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        MAINTENANCE_TASK_SECONDS.labels(task=task, status=status).observe(time.perf_counter() - start)
+
+def intent_label(result: Optional[Dict[str, Any]]) -> str:
+    """Intention d'un résultat RAG sous forme de label"""
+    intent = ((result or {}).get("intent_analysis") or {}).get("intent")
+    return getattr(intent, "value", intent) or "none"
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Chemin déclaré de la route (/chat, /intelligent-rag/stats/daily/{target_date}...) plutôt que l'URL"""
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    app = scope.get("app")
+    for candidate in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"  # Évite une série par URL inconnue
+
+# ================================
+# RETARD DE LA BOUCLE D'ÉVÉNEMENTS
+# ================================
+
+_lag_monitor_task: Optional[asyncio.Task] = None
+
+async def _monitor_event_loop_lag(interval: float):
+    """Mesure l'écart entre le réveil prévu et le réveil effectif d'un sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(loop.time() - expected, 0.0))
+
+def start_event_loop_monitor():
+    """Démarre la mesure du retard dans la boucle du worker (à appeler au démarrage)"""
+    global _lag_monitor_task
+    if not METRICS_ENABLED or not PROMETHEUS_AVAILABLE or _lag_monitor_task is not None:
+        return
+    _lag_monitor_task = asyncio.get_running_loop().create_task(_monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
+
+def stop_event_loop_monitor():
+    global _lag_monitor_task
+    if _lag_monitor_task is not None:
+        _lag_monitor_task.cancel()
+        _lag_monitor_task = None
+
+# ================================
+# MIDDLEWARE ASGI
+# ================================
+
+class PrometheusMiddleware:
+    """
+    Mesure chaque requête HTTP jusqu'à l'envoi du dernier octet (les réponses SSE sont donc
+    comptées sur toute leur durée). Les endpoints RAG renseignent request.state.rag_intent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = {"code": 500}
+        observed = {"done": False}
+
+        def observe():
+            if observed["done"]:
+                return
+            observed["done"] = True
+            HTTP_REQUESTS_IN_PROGRESS.labels(method=method).dec()
+            intent = scope.get("state", {}).get("rag_intent", "none")
+            HTTP_REQUEST_SECONDS.labels(
+                method=method, route=route_template(scope), status=str(status["code"]), intent=intent
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        HTTP_REQUESTS_IN_PROGRESS.labels(method=method).inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe()
+
+# ================================
+# EXPOSITION
+# ================================
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Métriques au format texte Prometheus (agrégées sur tous les workers en mode multiprocess)"""
+    if not PROMETHEUS_AVAILABLE or not METRICS_ENABLED:
+        return Response("prometheus_client non installé ou METRICS_ENABLED=false\n", status_code=503, media_type="text/plain")
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+def mark_worker_dead():
+    """À l'arrêt d'un worker : ses jauges « live » ne sont plus agrégées"""
+    if PROMETHEUS_AVAILABLE and PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
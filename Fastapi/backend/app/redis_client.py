@@ -0,0 +1,59 @@
+"""
+Clients Redis partagés (rate limiting slowapi et caches partagés entre les workers uvicorn)
+"""
+
+import os
+import time
+
+from redis import Redis
+from redis import asyncio as aioredis
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+# URL du serveur Redis (utilisée aussi comme stockage du limiteur slowapi)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Timeout court : un cache indisponible ne doit pas ralentir les requêtes
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25"))
+# Durée pendant laquelle Redis n'est plus sollicité après une erreur
+REDIS_RETRY_AFTER_SECONDS = 30
+
+_client = None
+_async_client = None
+_unavailable_until = 0.0
+
+def get_redis() -> Redis:
+    """Client Redis synchrone (créé au premier appel)"""
+    global _client
+    if _client is None:
+        _client = Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+    return _client
+
+def get_async_redis() -> aioredis.Redis:
+    """Client Redis asynchrone (créé au premier appel, dans la boucle d'événements du worker)"""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+    return _async_client
+
+def redis_available() -> bool:
+    """False pendant REDIS_RETRY_AFTER_SECONDS après une erreur (les caches passent alors en mode dégradé)"""
+    return time.time() >= _unavailable_until
+
+def mark_redis_unavailable(error: Exception):
+    """Signale une erreur Redis : les caches cessent de l'interroger temporairement"""
+    global _unavailable_until
+    if redis_available():
+        cp.print_warning(f"[Redis] Indisponible ({error}), caches désactivés pendant {REDIS_RETRY_AFTER_SECONDS}s")
+    _unavailable_until = time.time() + REDIS_RETRY_AFTER_SECONDS
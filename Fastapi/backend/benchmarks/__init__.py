@@ -0,0 +1 @@
+# Scripts de mesure des performances du backend
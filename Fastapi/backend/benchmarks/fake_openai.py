@@ -0,0 +1,237 @@
+"""
+Faux serveur OpenAI local pour les tests de charge hors ligne
+Répond à /v1/chat/completions (streaming SSE compris) et /v1/embeddings avec une latence et un
+nombre de tokens configurables. Les embeddings sont des vecteurs déterministes (sac de mots haché) :
+deux textes proches restent proches, la recherche Chroma garde donc un sens.
+
+Le prompt d'analyse d'intention reçoit un JSON valide, avec une répartition des intentions
+déterministe par question (mêmes chemins du graphe d'un lancement à l'autre).
+
+Usage (depuis la racine du dépôt) :
+    python -m Fastapi.backend.benchmarks.fake_openai --port 8765 --latency-ms 300 --completion-tokens 250
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-fake ...
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import time
+import uuid
+from typing import Dict, Any, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Configuration (variables d'environnement, surchargées par la ligne de commande)
+FAKE_OPENAI_LATENCY_MS = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "250"))  # Temps avant le premier token
+FAKE_OPENAI_MS_PER_TOKEN = float(os.getenv("FAKE_OPENAI_MS_PER_TOKEN", "5"))  # Vitesse de génération
+FAKE_OPENAI_JITTER = float(os.getenv("FAKE_OPENAI_JITTER", "0.2"))  # Variation relative de la latence
+FAKE_OPENAI_COMPLETION_TOKENS = int(os.getenv("FAKE_OPENAI_COMPLETION_TOKENS", "200"))
+FAKE_OPENAI_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_OPENAI_EMBEDDING_LATENCY_MS", "40"))
+FAKE_OPENAI_EMBEDDING_DIM = int(os.getenv("FAKE_OPENAI_EMBEDDING_DIM", "256"))
+
+# Répartition des intentions renvoyées au classifieur (somme = 1)
+INTENT_MIX = (
+    ("RAG_NEEDED", 0.70),
+    ("SYLLABUS_SPECIFIC_COURSE", 0.15),
+    ("SYLLABUS_SPECIALITY_OVERVIEW", 0.10),
+    ("DIRECT_ANSWER", 0.05),
+)
+SPECIALITIES = ("AGRAL", "EISE", "EI2I", "GM", "MAIN", "MTX", "ROB", "ST")
+
+_WORDS = (
+    "Polytech", "Sorbonne", "formation", "ingénieur", "spécialité", "cours", "semestre", "projet", "stage",
+    "étudiants", "admission", "campus", "enseignement", "travaux", "pratiques", "crédits", "ECTS", "module",
+)
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+config: Dict[str, float] = {
+    "latency_ms": FAKE_OPENAI_LATENCY_MS,
+    "ms_per_token": FAKE_OPENAI_MS_PER_TOKEN,
+    "jitter": FAKE_OPENAI_JITTER,
+    "completion_tokens": FAKE_OPENAI_COMPLETION_TOKENS,
+    "embedding_latency_ms": FAKE_OPENAI_EMBEDDING_LATENCY_MS,
+    "embedding_dim": FAKE_OPENAI_EMBEDDING_DIM,
+}
+counters: Dict[str, int] = {"chat_completions": 0, "embeddings": 0, "embedded_texts": 0}
+
+app = FastAPI(title="Fake OpenAI")
+
+# ================================
+# CONTENU DES RÉPONSES
+# ================================
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _count_tokens(text: str) -> int:
+    """Estimation à 4 caractères par token (suffisant pour des compteurs de test)"""
+    return max(len(text) // 4, 1)
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+def _intent_answer(prompt: str) -> str:
+    """JSON d'analyse d'intention, choisi de façon déterministe à partir de la question"""
+    question = prompt.rsplit("Question:", 1)[-1].split("Return only valid JSON:", 1)[0].strip()
+    bucket = (_stable_hash(question) % 1000) / 1000
+    intent, cumulated = INTENT_MIX[-1][0], 0.0
+    for candidate, share in INTENT_MIX:
+        cumulated += share
+        if bucket < cumulated:
+            intent = candidate
+            break
+    speciality = SPECIALITIES[_stable_hash(question + "#spe") % len(SPECIALITIES)]
+    return json.dumps({
+        "intent": intent,
+        "speciality": speciality if intent.startswith("SYLLABUS") else "GENERAL",
+        "confidence": 0.9,
+        "reasoning": "fake classification",
+        "needs_history": False,
+        "course_name": None,
+        "reformulation": None,
+    })
+
+def _answer_text(prompt: str, completion_tokens: int) -> str:
+    rng = random.Random(_stable_hash(prompt))
+    return " ".join(rng.choice(_WORDS) for _ in range(completion_tokens))
+
+def _completion_content(prompt: str) -> str:
+    if "intent classification system" in prompt:
+        return _intent_answer(prompt)
+    if "running summary" in prompt:
+        return _answer_text(prompt, 60)
+    return _answer_text(prompt, int(config["completion_tokens"]))
+
+async def _sleep_ms(milliseconds: float):
+    jitter = config["jitter"]
+    await asyncio.sleep(max(milliseconds * random.uniform(1 - jitter, 1 + jitter), 0.0) / 1000)
+
+def embed_text(text: str, dim: int) -> List[float]:
+    """Vecteur normalisé d'un sac de mots haché (déterministe)"""
+    vector = [0.0] * dim
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        h = _stable_hash(token)
+        vector[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+# ================================
+# ENDPOINTS
+# ================================
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    counters["chat_completions"] += 1
+    prompt = _prompt_text(body.get("messages", []))
+    content = _completion_content(prompt)
+    model = body.get("model", "gpt-4o-mini")
+    usage = {
+        "prompt_tokens": _count_tokens(prompt),
+        "completion_tokens": len(content.split()),
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await _sleep_ms(config["latency_ms"] + config["ms_per_token"] * usage["completion_tokens"])
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: Dict[str, Any], finish_reason=None, chunk_usage=None) -> str:
+        payload = {
+            "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if chunk_usage is None else [],
+        }
+        if chunk_usage is not None:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def events():
+        await _sleep_ms(config["latency_ms"])
+        yield chunk({"role": "assistant", "content": ""})
+        for index, word in enumerate(content.split(" ")):
+            await asyncio.sleep(config["ms_per_token"] / 1000)
+            yield chunk({"content": word if index == 0 else " " + word})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    # Listes d'identifiants de tokens (check_embedding_ctx_length) : hachées telles quelles
+    texts = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs]
+    counters["embeddings"] += 1
+    counters["embedded_texts"] += len(texts)
+    await _sleep_ms(config["embedding_latency_ms"])
+
+    dim = int(body.get("dimensions") or config["embedding_dim"])
+    as_base64 = body.get("encoding_format") == "base64"
+    data = []
+    for index, text in enumerate(texts):
+        vector = embed_text(text, dim)
+        if as_base64:
+            vector = base64.b64encode(struct.pack(f"<{dim}f", *vector)).decode("ascii")
+        data.append({"object": "embedding", "index": index, "embedding": vector})
+    prompt_tokens = sum(_count_tokens(text) for text in texts)
+    return {
+        "object": "list", "data": data, "model": body.get("model", "text-embedding-ada-002"),
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "config": config, "counters": counters}
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur OpenAI (chat completions et embeddings)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="Temps avant le premier token")
+    parser.add_argument("--ms-per-token", type=float, default=config["ms_per_token"], help="Temps de génération par token")
+    parser.add_argument("--jitter", type=float, default=config["jitter"], help="Variation relative de la latence (0.2 = ±20 %%)")
+    parser.add_argument("--completion-tokens", type=int, default=config["completion_tokens"], help="Tokens par réponse")
+    parser.add_argument("--embedding-latency-ms", type=float, default=config["embedding_latency_ms"])
+    parser.add_argument("--embedding-dim", type=int, default=config["embedding_dim"])
+    args = parser.parse_args()
+
+    config.update({
+        "latency_ms": args.latency_ms,
+        "ms_per_token": args.ms_per_token,
+        "jitter": args.jitter,
+        "completion_tokens": args.completion_tokens,
+        "embedding_latency_ms": args.embedding_latency_ms,
+        "embedding_dim": args.embedding_dim,
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Test de charge hors ligne de /chat
+Lance un faux serveur OpenAI (fake_openai.py), construit un vectorstore Chroma de test (TOC et fiches
+de cours synthétiques, index lexical FTS5), démarre l'API dans un sous-processus avec une base SQLite
+temporaire et Redis remplacé par fakeredis, puis envoie des questions à /chat par paliers de
+concurrence croissants. Aucun accès réseau n'est nécessaire.
+
+Rapport par palier : débit, latence p50/p95/p99 côté client, retard de la boucle d'événements,
+transactions rejouées sur verrou SQLite et durée des commits (lus sur /metrics de l'API).
+
+Usage (depuis la racine du dépôt) :
+    python -m Fastapi.backend.benchmarks.load_test
+    python -m Fastapi.backend.benchmarks.load_test --stages 1,8,32 --stage-seconds 60 --latency-ms 600 --output report.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+APP_MODULE = "Fastapi.backend.main:app"
+
+SPECIALITIES = ("AGRAL", "EISE", "EI2I", "GM", "MAIN", "MTX", "ROB", "ST")
+SEMESTERS = (5, 6, 7, 8, 9, 10)
+COURSES_PER_SEMESTER = 4
+GENERAL_TOPICS = {
+    "admission": "L'admission en première année se fait par le Concours GEIPI Polytech ou sur titre après un BUT ou une licence.",
+    "campus": "Le campus Pierre et Marie Curie accueille les salles de cours, les laboratoires et la bibliothèque universitaire.",
+    "associations": "Le BDE, le BDS et le bureau des arts fédèrent les associations étudiantes de l'école.",
+    "stages": "Chaque spécialité comprend un stage ouvrier, un stage assistant ingénieur et un stage de fin d'études.",
+    "international": "Un semestre de mobilité à l'étranger est possible grâce aux accords Erasmus et aux doubles diplômes.",
+    "apprentissage": "Certaines spécialités sont ouvertes en apprentissage avec une alternance entre l'école et l'entreprise.",
+}
+
+QUESTION_TEMPLATES = (
+    "Comment se passe {topic} à Polytech Sorbonne ?",
+    "Peux-tu me donner des informations sur {topic} ?",
+    "Quels sont les cours de la spécialité {speciality} ?",
+    "Quels cours y a-t-il au semestre {semester} en {speciality} ?",
+    "Que voit-on dans le cours {code} ?",
+    "Combien de crédits ECTS vaut le cours {code} ?",
+    "Quelles sont les modalités d'évaluation de {code} ?",
+    "Bonjour, merci pour ton aide !",
+)
+
+# ================================
+# VECTORSTORE DE TEST
+# ================================
+
+def _course_code(speciality: str, semester: int, index: int) -> str:
+    return f"EPU-{speciality[0]}{semester}-{speciality[:2]}{index}"
+
+def fixture_documents() -> List[Any]:
+    """Documents synthétiques avec les métadonnées du vectorstore Syllabus (TOC, fiches de cours, pages générales)"""
+    from langchain_core.documents import Document
+
+    documents = []
+    for speciality in SPECIALITIES:
+        for semester in SEMESTERS:
+            codes = [_course_code(speciality, semester, i) for i in range(COURSES_PER_SEMESTER)]
+            documents.append(Document(
+                page_content=f"Table des matières {speciality} semestre {semester} : " + ", ".join(codes),
+                metadata={"metadata.type": "toc", "metadata.specialite": speciality, "metadata.semestre": semester,
+                          "source.url": f"https://fixture.local/{speciality}/S{semester}/toc"},
+            ))
+            for code in codes:
+                for chunk_index in range(2):
+                    documents.append(Document(
+                        page_content=(
+                            f"Fiche du cours {code} de la spécialité {speciality}, semestre {semester}. "
+                            f"Partie {chunk_index + 1} : objectifs, contenu des séances, travaux pratiques, "
+                            f"projet en binôme, évaluation par contrôle continu et examen final, 3 crédits ECTS."
+                        ),
+                        metadata={"metadata.type": "fiche_cours", "metadata.specialite": speciality,
+                                  "metadata.semestre": semester, "metadata.code": code, "chunk_index": chunk_index,
+                                  "source.url": f"https://fixture.local/{speciality}/{code}"},
+                    ))
+    for topic, text in GENERAL_TOPICS.items():
+        for chunk_index in range(4):
+            documents.append(Document(
+                page_content=f"{text} Informations complémentaires sur {topic}, partie {chunk_index + 1}.",
+                metadata={"metadata.type": "page", "chunk_index": chunk_index,
+                          "source.url": f"https://fixture.local/{topic}"},
+            ))
+    return documents
+
+def build_fixture_store(directory: Path, openai_base_url: str) -> int:
+    """Vectorstore Chroma (collection langchain) et index lexical FTS5, embeddings du faux serveur"""
+    from langchain_chroma import Chroma
+    from langchain_openai import OpenAIEmbeddings
+    from ..app.lexical_index import build_lexical_index
+
+    documents = fixture_documents()
+    embeddings = OpenAIEmbeddings(base_url=openai_base_url, api_key="sk-fake", check_embedding_ctx_length=False)
+    Chroma.from_documents(documents, embeddings, persist_directory=str(directory), collection_name="langchain")
+    build_lexical_index(documents, directory)
+    return len(documents)
+
+def make_question(rng: random.Random, repeat_pool: List[str], repeat_ratio: float) -> str:
+    """Question aléatoire ; une part repart d'une question déjà posée (caches de réponses et d'intentions)"""
+    if repeat_pool and rng.random() < repeat_ratio:
+        return rng.choice(repeat_pool)
+    speciality = rng.choice(SPECIALITIES)
+    semester = rng.choice(SEMESTERS)
+    question = rng.choice(QUESTION_TEMPLATES).format(
+        topic=rng.choice(list(GENERAL_TOPICS)),
+        speciality=speciality,
+        semester=semester,
+        code=_course_code(speciality, semester, rng.randrange(COURSES_PER_SEMESTER)),
+    )
+    # Suffixe unique : chaque nouvelle question manque les caches
+    question = f"{question} (réf. {rng.randrange(10 ** 6)})"
+    repeat_pool.append(question)
+    return question
+
+# ================================
+# PROCESSUS (FAUX OPENAI ET API)
+# ================================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _start_process(arguments: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log_file = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, *arguments], cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float, log_path: Path):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le processus s'est arrêté (code {process.returncode}), voir {log_path}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} indisponible après {timeout:.0f}s, voir {log_path}")
+
+def _stop_process(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def app_environment(workdir: Path, openai_base_url: str, store_directory: Path) -> Dict[str, str]:
+    """Environnement de l'API : tout pointe vers des ressources locales et temporaires"""
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": openai_base_url,
+        "OPENAI_API_BASE": openai_base_url,
+        "OPENAI_EMBEDDINGS_CHECK_CTX_LENGTH": "false",
+        "CHROMA_PERSIST_DIRECTORY": str(store_directory),
+        "DATABASE_URL": f"sqlite:///{workdir / 'load_test.db'}",
+        "RATE_LIMIT_ENABLED": "false",
+        "RATE_LIMIT_STORAGE_URI": "memory://",
+        "RERANKER": "mmr",  # pas de téléchargement du cross-encoder
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return env
+
+def serve_app(host: str, port: int):
+    """Lance l'API dans ce processus, avec fakeredis à la place du serveur Redis"""
+    import uvicorn
+    from redis import Redis
+    from redis import asyncio as aioredis
+
+    try:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        # Remplacé avant l'import de l'API : redis_client crée ses clients avec Redis.from_url
+        Redis.from_url = classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+        aioredis.Redis.from_url = classmethod(
+            lambda cls, url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs)
+        )
+        cp.print_info("[LoadTest] Redis remplacé par fakeredis")
+    except ImportError:
+        # Sans Redis joignable les caches partagés passent en mode dégradé (LRU local uniquement)
+        cp.print_warning("[LoadTest] fakeredis non installé : caches Redis désactivés")
+        os.environ["REDIS_URL"] = f"redis://127.0.0.1:{_free_port()}"
+
+    uvicorn.run(APP_MODULE, host=host, port=port, workers=1, log_level="warning")
+
+# ================================
+# MÉTRIQUES PROMETHEUS DE L'API
+# ================================
+
+_SAMPLE_PATTERN = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)")
+_LABEL_PATTERN = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+def parse_metrics(text: str) -> Dict[Tuple[str, frozenset], float]:
+    """Texte Prometheus → {(nom, labels): valeur}"""
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE_PATTERN.match(line)
+        if not match or line.startswith("#"):
+            continue
+        name, labels, value = match.groups()
+        samples[(name, frozenset(_LABEL_PATTERN.findall(labels or "")))] = float(value)
+    return samples
+
+def _delta(after: Dict, before: Dict) -> Dict:
+    return {key: value - before.get(key, 0.0) for key, value in after.items()}
+
+def metric_sum(samples: Dict, name: str, **labels) -> float:
+    """Somme des échantillons d'une métrique (toutes séries dont les labels correspondent)"""
+    wanted = set(labels.items())
+    return sum(value for (sample, sample_labels), value in samples.items()
+               if sample == name and wanted <= sample_labels)
+
+def histogram_quantile(q: float, samples: Dict, name: str, **labels) -> Optional[float]:
+    """Quantile d'un histogramme par interpolation dans les seuils (comme histogram_quantile de PromQL)"""
+    wanted = set(labels.items())
+    buckets: Dict[float, float] = {}
+    for (sample, sample_labels), value in samples.items():
+        if sample != f"{name}_bucket" or not wanted <= sample_labels:
+            continue
+        le = float(dict(sample_labels)["le"])
+        buckets[le] = buckets.get(le, 0.0) + value
+    bounds = sorted(buckets.items())
+    if not bounds or bounds[-1][1] <= 0:
+        return None
+    rank = q * bounds[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in bounds:
+        if count >= rank:
+            if upper_bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = upper_bound, count
+    return bounds[-1][0]
+
+def scrape(client: httpx.Client, base_url: str) -> Dict:
+    response = client.get(f"{base_url}/metrics", timeout=10)
+    if response.status_code != 200:
+        return {}
+    return parse_metrics(response.text)
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Percentile par rang le plus proche (comme tracing.percentile)"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)), 1) - 1]
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+def server_side_report(samples: Dict) -> Dict[str, Any]:
+    """Indicateurs serveur d'un palier (différence de deux scrapes)"""
+    lag_count = metric_sum(samples, "polybot_event_loop_lag_seconds_count")
+    commit_count = metric_sum(samples, "polybot_db_commit_duration_seconds_count")
+    return {
+        "loop_lag_mean_ms": _ms(metric_sum(samples, "polybot_event_loop_lag_seconds_sum") / lag_count) if lag_count else None,
+        "loop_lag_p99_ms": _ms(histogram_quantile(0.99, samples, "polybot_event_loop_lag_seconds")),
+        "db_lock_retries": int(metric_sum(samples, "polybot_db_lock_retries_total")),
+        "db_commits": int(commit_count),
+        "db_commit_p95_ms": _ms(histogram_quantile(0.95, samples, "polybot_db_commit_duration_seconds")),
+        "openai_calls": int(metric_sum(samples, "polybot_openai_request_duration_seconds_count")),
+        "rate_limited": int(metric_sum(samples, "polybot_rate_limit_rejections_total")),
+    }
+
+# ================================
+# GÉNÉRATION DE CHARGE
+# ================================
+
+async def _virtual_user(client: httpx.AsyncClient, endpoint: str, deadline: float, rng: random.Random,
+                        repeat_pool: List[str], repeat_ratio: float, results: List[Dict[str, Any]]):
+    """Un utilisateur : sa propre session (historique de conversation), une question après l'autre"""
+    cookies = {"polybot_session_id": str(uuid.uuid4())}
+    headers = {"X-Recaptcha-Validated": "true"}
+    while time.perf_counter() < deadline:
+        body = {"prompt": make_question(rng, repeat_pool, repeat_ratio)}
+        start = time.perf_counter()
+        try:
+            if endpoint == "/chat/stream":
+                async with client.stream("POST", endpoint, json=body, headers=headers, cookies=cookies) as response:
+                    async for _ in response.aiter_bytes():
+                        pass
+            else:
+                response = await client.post(endpoint, json=body, headers=headers, cookies=cookies)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append({"latency": time.perf_counter() - start, "status": status})
+
+async def run_stage(base_url: str, endpoint: str, concurrency: int, seconds: float, seed: int,
+                    repeat_pool: List[str], repeat_ratio: float) -> Dict[str, Any]:
+    """Palier à concurrence fixe : débit et latence côté client"""
+    results: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + seconds
+        await asyncio.gather(*(
+            _virtual_user(client, endpoint, deadline, random.Random(seed * 1000 + i), repeat_pool, repeat_ratio, results)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(result["latency"] for result in results if result["status"] == 200)
+    errors = sum(1 for result in results if result["status"] != 200)
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "error_statuses": sorted({str(result["status"]) for result in results if result["status"] != 200}),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        **{f"latency_p{p}_ms": _ms(_percentile(latencies, p)) for p in (50, 95, 99)},
+    }
+
+# ================================
+# RAPPORT
+# ================================
+
+REPORT_COLUMNS = (
+    ("concurrency", "conc."), ("requests", "req."), ("errors", "err."), ("throughput_rps", "req/s"),
+    ("latency_p50_ms", "p50 ms"), ("latency_p95_ms", "p95 ms"), ("latency_p99_ms", "p99 ms"),
+    ("loop_lag_mean_ms", "lag moy. ms"), ("loop_lag_p99_ms", "lag p99 ms"),
+    ("db_lock_retries", "verrous"), ("db_commit_p95_ms", "commit p95 ms"), ("openai_calls", "appels OpenAI"),
+)
+
+def print_report(stages: List[Dict[str, Any]]):
+    header = [label for _, label in REPORT_COLUMNS]
+    rows = [["-" if stage.get(key) is None else str(stage[key]) for key, _ in REPORT_COLUMNS] for stage in stages]
+    widths = [max(len(cell) for cell in column) for column in zip(header, *rows)]
+    for row in [header, *rows]:
+        print(" | ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+    for stage in stages:
+        if stage["errors"]:
+            cp.print_warning(f"[LoadTest] Concurrence {stage['concurrency']} : erreurs {', '.join(stage['error_statuses'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge hors ligne de /chat (faux OpenAI, Chroma de test, fakeredis)")
+    parser.add_argument("--stages", default="1,4,8,16", help="Paliers de concurrence (utilisateurs simultanés)")
+    parser.add_argument("--stage-seconds", type=float, default=30, help="Durée de chaque palier")
+    parser.add_argument("--endpoint", choices=("/chat", "/chat/stream"), default="/chat")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Part des questions déjà posées (caches)")
+    parser.add_argument("--latency-ms", type=float, default=250, help="Latence du faux OpenAI avant le premier token")
+    parser.add_argument("--ms-per-token", type=float, default=5, help="Temps de génération par token du faux OpenAI")
+    parser.add_argument("--completion-tokens", type=int, default=200, help="Tokens par réponse du faux OpenAI")
+    parser.add_argument("--embedding-latency-ms", type=float, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", type=Path, help="Dossier de travail (nouveau dossier temporaire par défaut)")
+    parser.add_argument("--output", type=Path, help="Rapport JSON")
+    parser.add_argument("--serve-app", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--host", default="127.0.0.1", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args.host, args.port)
+        return
+
+    # Dossier conservé après le test : journaux de l'API et du faux OpenAI
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="polybot_load_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    cp.print_info(f"[LoadTest] Dossier de travail : {workdir}")
+    openai_port, app_port = _free_port(), _free_port()
+    openai_base_url = f"http://127.0.0.1:{openai_port}/v1"
+    app_base_url = f"http://127.0.0.1:{app_port}"
+    fake_openai = api = None
+
+    try:
+        fake_openai = _start_process([
+            "-m", "Fastapi.backend.benchmarks.fake_openai", "--port", str(openai_port),
+            "--latency-ms", str(args.latency_ms), "--ms-per-token", str(args.ms_per_token),
+            "--completion-tokens", str(args.completion_tokens), "--embedding-latency-ms", str(args.embedding_latency_ms),
+        ], dict(os.environ), workdir / "fake_openai.log")
+        _wait_until_ready(f"http://127.0.0.1:{openai_port}/health", fake_openai, 30, workdir / "fake_openai.log")
+        cp.print_success(f"[LoadTest] Faux OpenAI prêt sur le port {openai_port}")
+
+        store_directory = workdir / "vectorstore"
+        count = build_fixture_store(store_directory, openai_base_url)
+        cp.print_success(f"[LoadTest] Vectorstore de test construit ({count} documents)")
+
+        api = _start_process(
+            ["-m", "Fastapi.backend.benchmarks.load_test", "--serve-app", "--port", str(app_port)],
+            app_environment(workdir, openai_base_url, store_directory), workdir / "api.log"
+        )
+        _wait_until_ready(f"{app_base_url}/ready", api, 300, workdir / "api.log")
+        cp.print_success(f"[LoadTest] API prête sur le port {app_port} (journal : {workdir / 'api.log'})")
+
+        stages = []
+        repeat_pool: List[str] = []
+        with httpx.Client() as scraper:
+            for index, concurrency in enumerate(int(value) for value in args.stages.split(",")):
+                cp.print_info(f"[LoadTest] Palier {concurrency} utilisateurs pendant {args.stage_seconds:.0f}s")
+                before = scrape(scraper, app_base_url)
+                stage = asyncio.run(run_stage(app_base_url, args.endpoint, concurrency, args.stage_seconds,
+                                              args.seed + index, repeat_pool, args.repeat_ratio))
+                stage.update(server_side_report(_delta(scrape(scraper, app_base_url), before)))
+                stages.append(stage)
+
+        cp.print_success("[LoadTest] Résultats")
+        print_report(stages)
+        if args.output:
+            args.output.write_text(json.dumps({"config": vars(args) | {"workdir": str(workdir)}, "stages": stages},
+                                              indent=2, default=str))
+            cp.print_info(f"[LoadTest] Rapport écrit dans {args.output}")
+    finally:
+        _stop_process(api)
+        _stop_process(fake_openai)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Benchmark qualité / latence de la récupération sur un jeu de questions de référence
+Construit un vectorstore par configuration de découpage (CHUNK_SIZE / CHUNK_OVERLAP des pages,
+découpage des syllabus par sections avec chunck_syll.py ou par le text splitter générique) à partir
+d'un corpus fixe, avec des embeddings locaux déterministes, puis passe chaque question de référence
+dans _retrieve_general_docs ou _retrieve_speciality_overview_docs pour chaque valeur de k.
+
+Par configuration : recall@k et MRR (sur les sources distinctes, dans l'ordre de récupération),
+rappel et tokens du contexte effectivement envoyé au LLM (après rerank et emballage), latence des
+requêtes, nombre de chunks et taille de l'index. Aucun appel réseau.
+
+Usage (depuis la racine du dépôt) :
+    python -m Fastapi.backend.benchmarks.retrieval_bench
+    python -m Fastapi.backend.benchmarks.retrieval_bench --chunking 1500:150,1000:100,800:80 --general-k 8,12,15 --output retrieval.json
+
+Clés des sources attendues dans le jeu de référence : URL (ou chemin local) pour les pages,
+code du cours pour les fiches de cours, toc:<SPÉCIALITÉ>:S<semestre> pour les tables des matières.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ..app.lexical_index import analyze, build_lexical_index
+
+from color_utils import ColorPrint
+
+cp = ColorPrint()
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+DEFAULT_CORPUS = FIXTURES_DIR / "retrieval_corpus.json"
+DEFAULT_GOLD = FIXTURES_DIR / "retrieval_gold.json"
+SYLLABUS_CHUNKING_MODES = ("sections", "splitter")
+
+# ================================
+# EMBEDDINGS LOCAUX DÉTERMINISTES
+# ================================
+
+class HashingEmbeddings(Embeddings):
+    """
+    Sac de termes et de paires de termes consécutifs (analyse lexicale française de lexical_index),
+    haché dans un vecteur normalisé : déterministe, sans modèle ni réseau.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        terms = analyze(text)
+        vector = [0.0] * self.dim
+        for feature in terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            vector[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+# ================================
+# CORPUS ET VECTORSTORES
+# ================================
+
+def source_key(metadata: Dict[str, Any]) -> Optional[str]:
+    """Identifiant de la source d'un chunk, comparable aux sources attendues du jeu de référence"""
+    if str(metadata.get("metadata.type", "")).lower() == "toc":
+        return f"toc:{metadata.get('metadata.specialite')}:S{metadata.get('metadata.semestre')}"
+    return metadata.get("metadata.code") or metadata.get("source.url") or metadata.get("source.chemin_local")
+
+def _course_raw_docs(syllabi: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cours entiers au format des JSON normalisés (découpés ensuite par le text splitter)"""
+    raw_docs = []
+    for syllabus in syllabi:
+        for course in syllabus.get("courses", []):
+            semester = course["code"].split("-")[1][1:]
+            raw_docs.append({
+                "content": f"# {course['title']} ({course['code']})\n\n{course.get('content', '')}",
+                "document_type": "cours",
+                "metadata": {"title": course["title"], "code": course["code"], "type": "fiche_cours",
+                             "specialite": syllabus["specialite"], "niveau": f"Semestre {semester}"},
+                "source": {"category": "pdf_ajouté_manuellement", "chemin_local": syllabus["syllabus"],
+                           "site": syllabus["specialite"]},
+            })
+    return raw_docs
+
+def build_chunks(corpus: Dict[str, Any], chunk_size: int, chunk_overlap: int, syllabus_mode: str) -> List[Document]:
+    """Chunks du corpus avec les fonctions de la vectorisation (mêmes métadonnées que build_vectorstore)"""
+    from Document_handler.new_filler.Vectorisation import vectorisation_chunk_dev as vectorisation
+    from Document_handler.new_filler.logic.chunck_syll import chunk_syllabus_for_rag
+
+    chunks = vectorisation._chunk_raw_docs(corpus["pages"], chunk_size, chunk_overlap)
+    if syllabus_mode == "sections":
+        return chunks + vectorisation._syllabus_to_lc_docs(corpus["syllabi"])
+
+    # TOC par semestre inchangés, fiches de cours découpées comme les pages
+    tocs = [doc for doc in chunk_syllabus_for_rag(corpus["syllabi"]) if doc["metadata"].get("type") == "toc"]
+    return chunks + vectorisation._chunk_raw_docs(tocs + _course_raw_docs(corpus["syllabi"]), chunk_size, chunk_overlap)
+
+def build_store(directory: Path, chunks: List[Document], embeddings: Embeddings):
+    """Vectorstore Chroma (collection langchain) et index lexical FTS5 dans le même dossier"""
+    from langchain_chroma import Chroma
+
+    db = Chroma.from_documents(chunks, embeddings, persist_directory=str(directory), collection_name="langchain")
+    build_lexical_index(chunks, directory)
+    return db
+
+def _directory_size(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+def activate_store(directory: Path, db, embeddings: Embeddings):
+    """Installe le vectorstore comme après build_vectorstore (index TOC reconstruit par les listeners)"""
+    from ..app import llmm
+
+    llmm.persist_directory = directory
+    llmm.embeddings = embeddings  # embeddings du reranker MMR
+    llmm.set_vectorstore(db)
+
+# ================================
+# ÉVALUATION
+# ================================
+
+def _ranked_sources(docs: List[Any]) -> List[str]:
+    ranked = []
+    for doc in docs:
+        key = source_key(doc.metadata)
+        if key and key not in ranked:
+            ranked.append(key)
+    return ranked
+
+def _state(item: Dict[str, Any]) -> Dict[str, Any]:
+    from ..app.intelligent_rag.state import IntentType, SpecialityType
+
+    speciality = item.get("speciality")
+    return {
+        "input_question": item["question"],
+        "intent_analysis": {
+            "intent": IntentType(item["intent"]),
+            "speciality": SpecialityType(speciality) if speciality else None,
+            "reformulation": None,
+        },
+        "processing_steps": [],
+    }
+
+def evaluate_question(item: Dict[str, Any], cutoffs: List[int], repeats: int) -> Dict[str, Any]:
+    """Récupération, rerank et emballage du contexte d'une question, comme le nœud de récupération"""
+    from ..app.intelligent_rag import nodes, reranker
+    from ..app.intelligent_rag.context_packer import pack_context
+
+    state = _state(item)
+    overview = nodes._uses_speciality_overview(state["intent_analysis"])
+    retrieve = nodes._retrieve_speciality_overview_docs if overview else nodes._retrieve_general_docs
+
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        docs = retrieve(state)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    expected = set(item["expected"])
+    ranked = _ranked_sources(docs)
+    first_hit = next((rank for rank, key in enumerate(ranked, start=1) if key in expected), None)
+
+    kept = docs if overview else reranker.rerank(nodes._general_retrieval_query(state), docs, nodes.GENERAL_CONTEXT_DOCS)[0]
+    packed = pack_context(kept, state["intent_analysis"]["intent"])
+    return {
+        "question": item["question"],
+        "intent": item["intent"],
+        "retrieved": ranked,
+        **{f"recall@{k}": len(expected & set(ranked[:k])) / len(expected) for k in cutoffs},
+        "reciprocal_rank": 1 / first_hit if first_hit else 0.0,
+        "context_recall": len(expected & set(_ranked_sources(packed["docs"]))) / len(expected),
+        "context_tokens": packed["tokens"],
+        "latencies_ms": latencies,
+    }
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    """Percentile par rang le plus proche (comme tracing.percentile)"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)), 1) - 1]
+
+def summarize(results: List[Dict[str, Any]], cutoffs: List[int]) -> Dict[str, Any]:
+    latencies = sorted(latency for result in results for latency in result["latencies_ms"])
+    return {
+        "questions": len(results),
+        **{f"recall@{k}": round(statistics.mean(r[f"recall@{k}"] for r in results), 3) for k in cutoffs},
+        "mrr": round(statistics.mean(r["reciprocal_rank"] for r in results), 3),
+        "context_recall": round(statistics.mean(r["context_recall"] for r in results), 3),
+        "context_tokens": round(statistics.mean(r["context_tokens"] for r in results)),
+        "latency_p50_ms": round(_percentile(latencies, 50), 2),
+        "latency_p95_ms": round(_percentile(latencies, 95), 2),
+    }
+
+def run_configuration(gold: List[Dict[str, Any]], cutoffs: List[int], repeats: int,
+                      general_k: int, overview_max: int, hybrid: bool) -> Dict[str, Any]:
+    """Évalue le jeu de référence avec les paramètres de récupération donnés"""
+    from ..app.intelligent_rag import nodes
+
+    nodes.GENERAL_RETRIEVAL_K = general_k
+    nodes.LEXICAL_RETRIEVAL_K = general_k
+    nodes.OVERVIEW_MAX_DOCS = overview_max
+    nodes.HYBRID_RETRIEVAL_ENABLED = hybrid
+
+    evaluate_question(gold[0], cutoffs, 1)  # Premier appel (caches Chroma, connexion FTS5) hors mesure
+    results = [evaluate_question(item, cutoffs, repeats) for item in gold]
+    by_intent: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_intent.setdefault(result["intent"], []).append(result)
+    return {
+        **summarize(results, cutoffs),
+        "by_intent": {intent: summarize(rows, cutoffs) for intent, rows in sorted(by_intent.items())},
+        "misses": [{"question": r["question"], "retrieved": r["retrieved"][:max(cutoffs)]}
+                   for r in results if r["reciprocal_rank"] == 0.0],
+    }
+
+# ================================
+# RAPPORT
+# ================================
+
+def print_report(rows: List[Dict[str, Any]], cutoffs: List[int]):
+    columns = ["chunking", "syllabus", "k", "overview_max", "hybrid", "chunks", "index_kb",
+               *[f"recall@{k}" for k in cutoffs], "mrr", "context_recall", "context_tokens",
+               "latency_p50_ms", "latency_p95_ms"]
+    table = [[str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(cell) for cell in column) for column in zip(columns, *table)]
+    for line in [columns, *table]:
+        print(" | ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+def _chunking_list(value: str) -> List[Tuple[int, int]]:
+    return [tuple(int(part) for part in item.split(":")) for item in value.split(",") if item]
+
+def main():
+    parser = argparse.ArgumentParser(description="Qualité et latence de la récupération sur un jeu de questions de référence")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="Corpus JSON {pages, syllabi}")
+    parser.add_argument("--gold", type=Path, default=DEFAULT_GOLD, help="Questions de référence et sources attendues")
+    parser.add_argument("--chunking", default="1500:150,1000:100,2000:200", help="CHUNK_SIZE:CHUNK_OVERLAP des pages")
+    parser.add_argument("--syllabus-chunking", default="sections,splitter",
+                        help="sections (chunck_syll.py) et/ou splitter (text splitter générique)")
+    parser.add_argument("--general-k", default="8,12,15", help="Candidats vectoriels et lexicaux (GENERAL_RETRIEVAL_K)")
+    parser.add_argument("--overview-max", default="12", help="TOC gardés pour une vue d'ensemble (OVERVIEW_MAX_DOCS)")
+    parser.add_argument("--hybrid", default="on", help="Recherche hybride FTS5 : on, off ou on,off")
+    parser.add_argument("--cutoffs", default="1,3,5,10", help="Valeurs de k du recall@k")
+    parser.add_argument("--repeats", type=int, default=3, help="Mesures de latence par question")
+    parser.add_argument("--dim", type=int, default=512, help="Dimension des embeddings locaux")
+    parser.add_argument("--output", type=Path, help="Rapport JSON détaillé (par intention, questions manquées)")
+    args = parser.parse_args()
+
+    syllabus_modes = [mode for mode in args.syllabus_chunking.split(",") if mode]
+    unknown = set(syllabus_modes) - set(SYLLABUS_CHUNKING_MODES)
+    if unknown:
+        parser.error(f"Découpage de syllabus inconnu : {', '.join(sorted(unknown))}")
+    cutoffs = _int_list(args.cutoffs)
+
+    workdir = Path(tempfile.mkdtemp(prefix="polybot_retrieval_"))
+    # Les clients OpenAI de llmm sont créés à l'import mais jamais appelés ; llmm ouvre un store vide
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ.setdefault("RERANKER", "mmr")  # pas de téléchargement du cross-encoder
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = str(workdir / "empty")
+
+    corpus = json.loads(args.corpus.read_text(encoding="utf-8"))
+    gold = json.loads(args.gold.read_text(encoding="utf-8"))
+    embeddings = HashingEmbeddings(args.dim)
+    cp.print_info(f"[RetrievalBench] {len(gold)} questions, dossier de travail {workdir}")
+
+    rows = []
+    for chunk_size, chunk_overlap in _chunking_list(args.chunking):
+        for syllabus_mode in syllabus_modes:
+            directory = workdir / f"store_{chunk_size}_{chunk_overlap}_{syllabus_mode}"
+            chunks = build_chunks(corpus, chunk_size, chunk_overlap, syllabus_mode)
+            db = build_store(directory, chunks, embeddings)
+            activate_store(directory, db, embeddings)
+            index_kb = round(_directory_size(directory) / 1024)
+            cp.print_info(f"[RetrievalBench] {chunk_size}:{chunk_overlap} / {syllabus_mode} : {len(chunks)} chunks, {index_kb} Ko")
+
+            for general_k in _int_list(args.general_k):
+                for overview_max in _int_list(args.overview_max):
+                    for hybrid in (value == "on" for value in args.hybrid.split(",") if value):
+                        summary = run_configuration(gold, cutoffs, args.repeats, general_k, overview_max, hybrid)
+                        rows.append({
+                            "chunking": f"{chunk_size}:{chunk_overlap}",
+                            "syllabus": syllabus_mode,
+                            "k": general_k,
+                            "overview_max": overview_max,
+                            "hybrid": "on" if hybrid else "off",
+                            "chunks": len(chunks),
+                            "index_kb": index_kb,
+                            **summary,
+                        })
+
+    cp.print_success("[RetrievalBench] Résultats")
+    print_report(rows, cutoffs)
+    if args.output:
+        args.output.write_text(json.dumps({"config": vars(args), "results": rows}, indent=2, ensure_ascii=False, default=str),
+                               encoding="utf-8")
+        cp.print_info(f"[RetrievalBench] Rapport détaillé écrit dans {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,16 @@
 # Imports des bibliothèques nécessaires
 from fastapi import FastAPI, Depends, Request, Response, Cookie, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from redis import Redis
 from sqlmodel import Session
 from datetime import datetime, timedelta
 import uuid
+import json
 import os
+import asyncio
 
 from color_utils import ColorPrint
 
@@ -21,8 +23,10 @@ cp = ColorPrint()
 # Imports internes 
 from .app.keys_file import OPENAI_API_KEY
 from .app.llmm import initialize_the_rag_chain
-from .app.chat import router as chat_router, get_sources, get_or_create_conversation, add_message
+from .app.chat import router as chat_router, get_sources, get_or_create_conversation, load_history_window
 from .app.recaptcha import verify_recaptcha_token
+from .app.redis_client import REDIS_URL, get_redis
+from .app import metrics
 from .app.server_file import router as server_router
 from Document_handler.The_handler import router as router_scrapping
 from .app.PDF_manual.pdf_manual import router as pdf_manual_router
@@ -33,7 +37,7 @@ from .app.auth.dependencies import get_current_admin_from_cookie
 #from .app.intelligent_rag.api import router as intelligent_rag_router
 from .app.database.db_routes import router as db_router
 from .app.database.automated_tasks import maintenance_service
-from .app.database.db_update_stat import update_rag_conversation
+from .app.database.write_behind import write_behind
 from .app.database.stats_routes import router as stats_router
 from .app.database.maintenance_routes import router as maintenance_router
 
@@ -60,7 +64,9 @@ def get_rag_system_info():
 # =================
 
 if USE_INTELLIGENT_RAG:
-    from .app.intelligent_rag.graph import invoke_intelligent_rag
+    from .app.intelligent_rag.graph import ainvoke_intelligent_rag, astream_intelligent_rag
+    from .app.intelligent_rag.warmup import awarm_up, is_ready, get_warmup_status
+    from .app.intelligent_rag.summary_memory import compact_history, schedule_summary_update
     cp.print_info(f"{get_rag_system_info()}")
 elif USE_LANGGRAPH:
     from .app.langgraph_system.rag_graph import invoke_langgraph_rag
@@ -77,10 +83,19 @@ app = FastAPI()
 cp.print_info("FastAPI app initialized")
 
 # Initialisation du limiteur de requêtes (avec Redis comme stockage)
-redis = Redis(host="localhost", port = 6379, decode_responses=True)
-limiter = Limiter(key_func=get_remote_address, storage_uri="redis://localhost:6379")
+# RATE_LIMIT_ENABLED=false et RATE_LIMIT_STORAGE_URI=memory:// servent aux tests de charge locaux
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", REDIS_URL)
+redis = get_redis()
+limiter = Limiter(key_func=get_remote_address, storage_uri=RATE_LIMIT_STORAGE_URI, enabled=RATE_LIMIT_ENABLED)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """Réponse 429 de slowapi, comptée dans les métriques"""
+    metrics.RATE_LIMIT_REJECTIONS.labels(route=metrics.route_template(request.scope)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 def session_id_key(request: Request):
     """
@@ -115,7 +130,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métriques Prometheus : latence de chaque requête (streaming compris) et /metrics
+app.add_middleware(metrics.PrometheusMiddleware)
+
 # Inclusion des routeurs (authentification, chat/historique)
+app.include_router(metrics.router)
 app.include_router(auth_router)
 app.include_router(chat_router)
 app.include_router(server_router)
@@ -127,19 +146,34 @@ app.include_router(stats_router, dependencies=[Depends(get_current_admin_from_co
 app.include_router(maintenance_router, dependencies=[Depends(get_current_admin_from_cookie)])  # Routes pour la maintenance
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     create_db_and_tables()
     cp.print_success("[Startup] Base de données initialisée")
 
+    # Retard de la boucle d'événements (polybot_event_loop_lag_seconds)
+    metrics.start_event_loop_monitor()
+
+    # Écriture différée des tours de conversation (messages et statistiques RAG)
+    write_behind.start()
+
     # Démarrer le service de maintenance automatique
     maintenance_service.start_background_service()
     cp.print_success("[Startup] Service de maintenance automatique démarré")
 
+    # Préchauffage (graphes compilés, embeddings, Chroma, connexion OpenAI) avant d'accepter du trafic
+    if USE_INTELLIGENT_RAG:
+        await awarm_up()
+        cp.print_success("[Startup] Worker préchauffé")
+
 # Nettoyage à l'arrêt de l'application
 @app.on_event("shutdown")
 def on_shutdown(): 
     maintenance_service.stop_background_service()
     cp.print_info("[Shutdown] Service de maintenance arrêté")
+    write_behind.stop()
+    cp.print_info("[Shutdown] File d'écriture différée vidée")
+    metrics.stop_event_loop_monitor()
+    metrics.mark_worker_dead()
     pass
 
 # Initialisation de la chaîne RAG
@@ -181,6 +215,42 @@ def init_session(response: Response, request: Request, polybot_session_id: str =
 # Endpoint principal : /chat
 # ==========================
 
+def get_chat_history(session: Session, conversation_id: int, request_body: ChatRequest) -> list:
+    """
+    Historique passé au RAG : fenêtre des derniers messages chargée depuis la base,
+    ou historique envoyé par le client en mode compatibilité (use_client_history).
+    À appeler avant d'enregistrer le message de l'utilisateur.
+    """
+    if request_body.use_client_history:
+        return [
+            {"role": msg.role, "content": msg.content}
+            for msg in request_body.chat_history or [] if msg.role == "assistant" or msg.role == "user"
+        ]
+    return load_history_window(session, conversation_id)
+
+def after_turn_written(conversation_id: int, session_id: str):
+    """
+    Callback appelé par le thread d'écriture différée une fois le tour en base :
+    planifie la mise à jour du résumé de conversation sur la boucle d'événements.
+    """
+    if not USE_INTELLIGENT_RAG:
+        return None
+    loop = asyncio.get_running_loop()
+    return lambda: loop.call_soon_threadsafe(schedule_summary_update, conversation_id, session_id)
+
+async def check_chat_recaptcha(request: Request, request_body: ChatRequest):
+    """
+    Vérifie le token reCAPTCHA d'une requête de chat (ou l'en-tête indiquant qu'il a déjà été validé).
+    """
+    recaptcha_validated = request.headers.get("X-Recaptcha-Validated")
+    if not request_body.recaptcha_token:
+        # Si le frontend indique que le captcha a déjà été validé, on accepte
+        if recaptcha_validated == "true":
+            return
+        raise HTTPException(status_code=400, detail="reCAPTCHA token required")
+    if not await verify_recaptcha_token(request_body.recaptcha_token):
+        raise HTTPException(status_code=400, detail="Invalid reCAPTCHA token")
+
 #TODO: Passer les constantes de rate limiting dans un fichier de configuration
 @app.post("/chat", response_model=ChatResponse)
 @limiter.limit("10/second; 60/minute; 500/hour")  # Limite par IP (clé par défaut)
@@ -196,46 +266,35 @@ async def chat(request: Request, request_body: ChatRequest, polybot_session_id:
         cp.print_debug(f"[chat] polybot_session_id extrait: {polybot_session_id}")
         
         # Vérification reCAPTCHA
-        recaptcha_validated = request.headers.get("X-Recaptcha-Validated")
-        if not request_body.recaptcha_token:
-            # Si le frontend indique que le captcha a déjà été validé, on accepte
-            if recaptcha_validated == "true":
-                pass
-            else:
-                raise HTTPException(status_code=400, detail="reCAPTCHA token required")
-        elif not await verify_recaptcha_token(request_body.recaptcha_token):
-            raise HTTPException(status_code=400, detail="Invalid reCAPTCHA token")
+        await check_chat_recaptcha(request, request_body)
 
         cp.print_debug(f"User prompt: {request_body.prompt}")
 
         conversation = get_or_create_conversation(session, polybot_session_id)
-        add_message(session, conversation.id, "user", request_body.prompt)
+        chat_history = get_chat_history(session, conversation.id, request_body)
+        question_timestamp = datetime.utcnow()
 
         # ====================================================
         # TEST : Intelligent RAG vs LangGraph vs RAG classique
         # ====================================================
 
         if USE_INTELLIGENT_RAG:
-            chat_history = [
-                {"role": msg.role, "content": msg.content}
-                for msg in request_body.chat_history if msg.role == "assistant" or msg.role == "user"
-            ]
+            # Conversation longue : les anciens messages sont remplacés par leur résumé
+            conversation_summary, recent_history = compact_history(session, conversation.id, chat_history)
             try:
-                response = invoke_intelligent_rag(request_body.prompt, chat_history, False)
+                response = await ainvoke_intelligent_rag(request_body.prompt, recent_history, False, conversation_summary)
             except Exception as e:
-                cp.print_error(f"Error in invoke_intelligent_rag: {e}")
+                cp.print_error(f"Error in ainvoke_intelligent_rag: {e}")
                 raise HTTPException(status_code=500, detail=f"Error in intelligent RAG: {str(e)}")
             answer = response.get("answer", "")
             context = response.get("context", [])
             sources = response.get("sources", [])
+            request.state.rag_intent = metrics.intent_label(response)
         elif USE_LANGGRAPH:
             try:
                 response = invoke_langgraph_rag({
                     "input": request_body.prompt,
-                    "chat_history": [
-                        {"role": msg.role, "content": msg.content}
-                        for msg in request_body.chat_history if msg.role == "assistant" or msg.role == "user"
-                    ],
+                    "chat_history": chat_history,
                 })
             except Exception as e:
                 cp.print_error(f"Error in invoke_langgraph_rag: {e}")
@@ -247,10 +306,7 @@ async def chat(request: Request, request_body: ChatRequest, polybot_session_id:
             try:
                 response = rag_chain.invoke({
                     "input": request_body.prompt,
-                    "chat_history": [
-                        {"role": msg.role, "content": msg.content}
-                        for msg in request_body.chat_history if msg.role == "assistant" or msg.role == "user"
-                    ],
+                    "chat_history": chat_history,
                 })
             except Exception as e:
                 cp.print_error(f"Error in rag_chain.invoke: {e}")
@@ -260,15 +316,20 @@ async def chat(request: Request, request_body: ChatRequest, polybot_session_id:
             sources = get_sources(context) if context else []
 
         try:
-            add_message(session, conversation.id, "assistant", answer, sources)
-            update_rag_conversation(
+            # Messages et statistiques RAG écrits en tâche de fond, le résumé est mis à jour ensuite
+            await write_behind.aenqueue_turn(
+                conversation_id=conversation.id,
+                question=request_body.prompt,
+                answer=answer,
+                sources=sources,
                 invoke_result=response,
-                conversation=conversation,
-                session=session
+                default_session_id=conversation.session_id,
+                question_timestamp=question_timestamp,
+                on_written=after_turn_written(conversation.id, polybot_session_id or "summary")
             )
             
         except Exception as e:
-            cp.print_error(f"Error in add_message: {e}")
+            cp.print_error(f"Error in aenqueue_turn: {e}")
             raise HTTPException(status_code=500, detail=f"Error saving assistant message: {str(e)}")
 
         return ChatResponse(answer=answer, sources=sources)
@@ -278,6 +339,88 @@ async def chat(request: Request, request_body: ChatRequest, polybot_session_id:
         cp.print_error(f"Unexpected error in /chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+# =======================================
+# Endpoint streaming (SSE) : /chat/stream
+# =======================================
+
+def format_sse(event: str, data) -> str:
+    """Formate un événement Server-Sent Events (données encodées en JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+@limiter.limit("10/second; 60/minute; 500/hour")  # Limite par IP (clé par défaut)
+@limiter.limit("1/second; 20/minute; 100/hour", key_func=session_id_key)  # Limite par session_id 
+async def chat_stream(request: Request, request_body: ChatRequest, polybot_session_id: str = Cookie(None), session: Session = Depends(get_session)):
+    """
+    Variante streaming de /chat (Server-Sent Events).
+    Événements émis : "sources" (dès la fin de la récupération), "token" (réponse au fil de l'eau),
+    puis "done" avec la réponse complète une fois le tour mis en file d'écriture.
+    """
+    if not USE_INTELLIGENT_RAG:
+        raise HTTPException(status_code=400, detail="Streaming disponible uniquement avec le RAG intelligent")
+
+    await check_chat_recaptcha(request, request_body)
+    cp.print_debug(f"[chat/stream] User prompt: {request_body.prompt}")
+
+    conversation = get_or_create_conversation(session, polybot_session_id)
+    conversation_id = conversation.id
+    chat_history = get_chat_history(session, conversation_id, request_body)
+    default_session_id = conversation.session_id
+    question_timestamp = datetime.utcnow()
+
+    conversation_summary, recent_history = compact_history(session, conversation_id, chat_history)
+
+    async def event_stream():
+        final_result = None
+        async for event in astream_intelligent_rag(request_body.prompt, recent_history, conversation_summary):
+            if event["event"] == "done":
+                final_result = event["data"]
+                continue
+            yield format_sse(event["event"], event["data"])
+
+        answer = final_result.get("answer", "")
+        sources = final_result.get("sources", [])
+        request.state.rag_intent = metrics.intent_label(final_result)
+
+        # La session de la dépendance est fermée pendant le streaming : écriture par la file différée
+        try:
+            await write_behind.aenqueue_turn(
+                conversation_id=conversation_id,
+                question=request_body.prompt,
+                answer=answer,
+                sources=sources,
+                invoke_result=final_result,
+                default_session_id=default_session_id,
+                question_timestamp=question_timestamp,
+                on_written=after_turn_written(conversation_id, polybot_session_id or "summary")
+            )
+        except Exception as e:
+            cp.print_error(f"[chat/stream] Error saving assistant message: {e}")
+            yield format_sse("error", {"detail": f"Error saving assistant message: {str(e)}"})
+
+        yield format_sse("done", {"answer": answer, "sources": sources})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Pas de buffering nginx
+    )
+
+# ======================================
+# Sonde de readiness (après préchauffage)
+# ======================================
+
+@app.get("/ready")
+def readiness_probe():
+    """
+    Sonde de readiness : 200 uniquement une fois le préchauffage du worker terminé, 503 sinon.
+    """
+    if not USE_INTELLIGENT_RAG:
+        return {"ready": True}
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"ready": False, "warmup": get_warmup_status()})
+    return {"ready": True, "warmup": get_warmup_status()}
+
 # =========================================================
 # Endpoint pour obtenir des informations sur le système RAG
 # =========================================================
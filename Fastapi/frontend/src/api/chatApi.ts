@@ -2,7 +2,12 @@
 // Gestionnaire des appels API pour le chatbot
 // ===========================================
 
-import type { Message, ChatRequest, ChatResponse } from "../types/chatTypes";
+import type {
+  Message,
+  ChatRequest,
+  ChatResponse,
+  ChatStreamHandlers,
+} from "../types/chatTypes";
 
 /* URL de l'API backend */
 const API_URL = import.meta.env.VITE_BACKEND_URL || "/api";
@@ -38,16 +43,14 @@ export async function fetchHistory(): Promise<Message[]> {
     : [];
 }
 
-/* Envoie un message utilisateur et récupère la réponse du bot */
+/* Envoie un message utilisateur et récupère la réponse du bot (historique chargé par le serveur) */
 export async function sendMessage(
   input: string,
-  chat_history: Message[],
   recaptcha_token?: string,
   recaptcha_validated?: boolean
 ): Promise<ChatResponse> {
   const payload: ChatRequest = {
     prompt: input,
-    chat_history,
     recaptcha_token,
   };
   const headers: Record<string, string> = {
@@ -65,3 +68,69 @@ export async function sendMessage(
   });
   return await res.json();
 }
+
+/* Envoie un message utilisateur et reçoit la réponse du bot en streaming (SSE) */
+export async function sendMessageStream(
+  input: string,
+  handlers: ChatStreamHandlers,
+  recaptcha_token?: string,
+  recaptcha_validated?: boolean
+): Promise<ChatResponse> {
+  const payload: ChatRequest = {
+    prompt: input,
+    recaptcha_token,
+  };
+  const headers: Record<string, string> = {
+    "Content-Type": "application/json",
+    Accept: "text/event-stream",
+  };
+  if (!recaptcha_token && recaptcha_validated) {
+    headers["X-Recaptcha-Validated"] = "true";
+  }
+
+  const res = await fetch(`${API_URL}/chat/stream`, {
+    method: "POST",
+    headers,
+    body: JSON.stringify(payload),
+    credentials: "include",
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`Erreur HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let final: ChatResponse = { answer: "", sources: [] };
+
+  /* Lecture des blocs SSE ("event: ...\ndata: ...\n\n") au fil de l'eau */
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator = buffer.indexOf("\n\n");
+    while (separator !== -1) {
+      const block = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      separator = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const parsed = JSON.parse(data);
+
+      if (event === "sources") handlers.onSources?.(parsed);
+      else if (event === "token") handlers.onToken?.(parsed);
+      else if (event === "done") {
+        final = parsed;
+        handlers.onDone?.(parsed);
+      }
+    }
+  }
+  return final;
+}
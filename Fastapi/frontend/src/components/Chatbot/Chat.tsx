@@ -9,7 +9,7 @@ import { useState, useEffect } from "react";
 import type { Message } from "../../types/chatTypes";
 import ChatMessages from "./ChatMessages";
 import ChatInput from "./ChatInput";
-import { fetchHistory, sendMessage } from "../../api/chatApi";
+import { fetchHistory, sendMessageStream } from "../../api/chatApi";
 import useRecaptcha from "../../hooks/useRecaptcha";
 
 /* Message d'introduction */
@@ -54,23 +54,42 @@ export default function Chat() {
     setInput("");
     setLoading(true);
 
+    /* Message du bot vide, complété au fil des tokens reçus */
+    const updateBotMessage = (update: (msg: Message) => Message) =>
+      setMessages((prev) => [
+        ...prev.slice(0, -1),
+        update(prev[prev.length - 1]),
+      ]);
+    setMessages((prev) => [...prev, { role: "assistant", content: "" }]);
+
     try {
-      const data = await sendMessage(
+      await sendMessageStream(
         input,
-        [...messages, newUserMessage],
+        {
+          onSources: (sources) =>
+            updateBotMessage((msg) => ({ ...msg, sources })),
+          onToken: (token) =>
+            updateBotMessage((msg) => ({
+              ...msg,
+              content: msg.content + token,
+            })),
+          /* La réponse finale fait foi (réponse complète et sources définitives) */
+          onDone: (data) =>
+            updateBotMessage((msg) => ({
+              ...msg,
+              content: data.answer,
+              sources: data.sources,
+            })),
+        },
         recaptchaToken,
         recaptchaValidated
       );
-      const botMessage: Message = {
-        role: "assistant",
-        content: data.answer,
-        sources: data.sources,
-      };
-      /* Ajoute la réponse du bot à la liste des messages */
-      setMessages((prev) => [...prev, botMessage]);
     } catch (err) {
       console.error("Erreur lors de l'envoi du message:", err);
-      /* Optionnel : gestion d'erreur utilisateur */
+      /* Retire le message du bot resté vide */
+      setMessages((prev) =>
+        prev[prev.length - 1]?.content ? prev : prev.slice(0, -1)
+      );
     } finally {
       setLoading(false);
     }
@@ -11,9 +11,11 @@ export interface Message {
 }
 
 // Structure de la requête envoyée à l'API /chat
+// L'historique est chargé côté serveur : chat_history n'est lu qu'avec use_client_history
 export interface ChatRequest {
   prompt: string;
-  chat_history: Message[];
+  chat_history?: Message[];
+  use_client_history?: boolean;
   recaptcha_token?: string;
 }
 
@@ -22,3 +24,10 @@ export interface ChatResponse {
   answer: string;
   sources: string[];
 }
+
+// Callbacks appelés au fil des événements de l'API /chat/stream
+export interface ChatStreamHandlers {
+  onSources?: (sources: string[]) => void;
+  onToken?: (token: string) => void;
+  onDone?: (response: ChatResponse) => void;
+}